@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Admission control for SSH session establishment
+Concurrent-connect limits (global, per user, per host) and per-host connect rate
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a connect cannot be admitted (queue full or waited too long)"""
+
+
+class TokenBucket:
+    """rate tokens per second, up to burst"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 = now)"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+
+
+class AdmissionTicket:
+    """A granted connect slot; release() once the handshake is over (success or not)"""
+
+    def __init__(self, controller: 'AdmissionController', user: str, host: str, waited: float):
+        self.controller = controller
+        self.user = user
+        self.host = host
+        self.waited = waited
+        self.granted_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class _Waiter:
+    def __init__(self, user: str, host: str, notify):
+        self.user = user
+        self.host = host
+        self.notify = notify
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.monotonic()
+        self.reported = None
+
+
+class AdmissionController:
+    """Admits SSH connects in FIFO order within global, per-user and per-host limits
+
+    A queued connect waits only on the limit that actually blocks it, so a
+    folder of 60 devices on one jump host does not hold up someone else's
+    single connect. Queued connects are told their position and an ETA
+    (from the recent average handshake time) until they are admitted or
+    time out. Updates go out concurrently and a send taking longer than
+    notify_timeout is dropped, so one stalled websocket delays nobody else.
+    """
+
+    def __init__(self, enabled: bool = True, global_limit: int = 64, per_user_limit: int = 16,
+                 per_host_limit: int = 4, host_rate: float = 2.0, host_burst: float = 4.0,
+                 global_rate: float = 0.0, global_burst: float = 0.0, max_queue: int = 1024,
+                 queue_timeout: float = 120.0, status_interval: float = 1.0, notify_timeout: float = 2.0):
+        self.enabled = enabled
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self.per_host_limit = per_host_limit
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.status_interval = status_interval
+        self.notify_timeout = notify_timeout
+
+        self._global_bucket = TokenBucket(global_rate, global_burst or max(global_rate, 1))
+        self._host_buckets: Dict[str, TokenBucket] = {}
+        self._active = 0
+        self._active_users: Dict[str, int] = {}
+        self._active_hosts: Dict[str, int] = {}
+        self._waiters: Deque[_Waiter] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._reporter: Optional[asyncio.Task] = None
+
+        # Handshake time estimate for ETAs (EWMA, seconds)
+        self.avg_connect_seconds = 1.5
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected_full': 0, 'timed_out': 0, 'cancelled': 0,
+                      'status_timeouts': 0, 'max_wait_seconds': 0.0, 'total_wait_seconds': 0.0}
+
+    async def admit(self, user: Optional[str], host: str,
+                    notify: Optional[Callable[[Dict], Awaitable[None]]] = None) -> AdmissionTicket:
+        """Wait for a connect slot for user -> host"""
+        user = user or ''
+        if not self.enabled:
+            return AdmissionTicket(self, user, host, 0.0)
+
+        if not self._waiters and self._blocked_by(user, host, time.monotonic()) is None:
+            return self._grant(user, host, 0.0)
+
+        if len(self._waiters) >= self.max_queue:
+            self.stats['rejected_full'] += 1
+            raise AdmissionRejected(f"Too many connections waiting ({len(self._waiters)}) - try again shortly")
+
+        waiter = _Waiter(user, host, notify)
+        self._waiters.append(waiter)
+        self.stats['queued'] += 1
+        logger.info(f"SSH connect {user or '-'} -> {host} queued (position {len(self._waiters)})")
+        self._dispatch()
+
+        try:
+            # Inside the try: a cancel while the browser is told its position must still abandon the waiter
+            if not waiter.future.done():
+                await self._report(waiter)
+            self._ensure_reporter()
+            return await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats['timed_out'] += 1
+            self._abandon(waiter)
+            raise AdmissionRejected(f"Waited {self.queue_timeout:.0f}s for a connection slot to {host}")
+        except asyncio.CancelledError:
+            self.stats['cancelled'] += 1
+            self._abandon(waiter)
+            raise
+
+    def _abandon(self, waiter: _Waiter):
+        if waiter.future.done() and not waiter.future.cancelled():
+            # Granted just as we gave up - hand the slot back
+            waiter.future.result().release()
+        else:
+            waiter.future.cancel()
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+        self._dispatch()
+
+    def _blocked_by(self, user: str, host: str, now: float) -> Optional[str]:
+        """Which limit stops user -> host right now (None = admissible)"""
+        if self.global_limit and self._active >= self.global_limit:
+            return 'global'
+        if self.per_user_limit and self._active_users.get(user, 0) >= self.per_user_limit:
+            return 'user'
+        if self.per_host_limit and self._active_hosts.get(host, 0) >= self.per_host_limit:
+            return 'host'
+        if self._global_bucket.wait_time(now) > 0 or self._host_bucket(host).wait_time(now) > 0:
+            return 'rate'
+        return None
+
+    def _host_bucket(self, host: str) -> TokenBucket:
+        bucket = self._host_buckets.get(host)
+        if bucket is None:
+            bucket = self._host_buckets[host] = TokenBucket(self.host_rate, self.host_burst)
+        return bucket
+
+    def _grant(self, user: str, host: str, waited: float) -> AdmissionTicket:
+        now = time.monotonic()
+        self._global_bucket.take(now)
+        self._host_bucket(host).take(now)
+        self._active += 1
+        self._active_users[user] = self._active_users.get(user, 0) + 1
+        self._active_hosts[host] = self._active_hosts.get(host, 0) + 1
+        self.stats['admitted'] += 1
+        self.stats['total_wait_seconds'] += waited
+        self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], waited)
+        return AdmissionTicket(self, user, host, waited)
+
+    def _release(self, ticket: AdmissionTicket):
+        if not self.enabled:
+            return
+        held = time.monotonic() - ticket.granted_at
+        self.avg_connect_seconds = 0.8 * self.avg_connect_seconds + 0.2 * held
+
+        self._active -= 1
+        for counts, key in ((self._active_users, ticket.user), (self._active_hosts, ticket.host)):
+            counts[key] -= 1
+            if counts[key] <= 0:
+                del counts[key]
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant every queued connect whose limits allow it, oldest first"""
+        now = time.monotonic()
+        next_token = None
+        for waiter in list(self._waiters):
+            if waiter.future.done():
+                self._waiters.remove(waiter)
+                continue
+            blocked = self._blocked_by(waiter.user, waiter.host, now)
+            if blocked is None:
+                self._waiters.remove(waiter)
+                waiter.future.set_result(self._grant(waiter.user, waiter.host, now - waiter.queued_at))
+            elif blocked == 'rate':
+                wait = max(self._global_bucket.wait_time(now), self._host_bucket(waiter.host).wait_time(now))
+                next_token = wait if next_token is None else min(next_token, wait)
+
+        # Rate-limited waiters need a wakeup; releases wake the rest
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if next_token is not None:
+            self._timer = asyncio.get_running_loop().call_later(next_token + 0.001, self._dispatch)
+
+        # Idle host buckets that are full again carry no state
+        if len(self._host_buckets) > 1024:
+            for host in [h for h, b in self._host_buckets.items()
+                         if h not in self._active_hosts and b.wait_time(now) == 0 and b.tokens >= b.burst]:
+                del self._host_buckets[host]
+
+    def _estimate(self, waiter: _Waiter, position: int, now: float):
+        """Position among connects competing for the same limit, and a rough ETA"""
+        blocked = self._blocked_by(waiter.user, waiter.host, now) or 'global'
+        earlier = list(self._waiters)[:position]
+        if blocked == 'host':
+            ahead, limit = sum(1 for w in earlier if w.host == waiter.host), self.per_host_limit
+        elif blocked == 'user':
+            ahead, limit = sum(1 for w in earlier if w.user == waiter.user), self.per_user_limit
+        elif blocked == 'rate':
+            bucket = self._host_bucket(waiter.host)
+            ahead = sum(1 for w in earlier if w.host == waiter.host)
+            wait = bucket.wait_time(now) + ahead / bucket.rate if bucket.rate > 0 else 0.0
+            return blocked, ahead, round(max(wait, self._global_bucket.wait_time(now)), 1)
+        else:
+            ahead, limit = position, self.global_limit
+
+        rounds = ahead // max(limit, 1) + 1
+        return blocked, ahead, round(rounds * self.avg_connect_seconds, 1)
+
+    async def _report(self, waiter: _Waiter):
+        if waiter.notify is None or waiter.future.done():
+            return
+        try:
+            position = self._waiters.index(waiter)
+        except ValueError:
+            return
+        blocked, ahead, eta = self._estimate(waiter, position, time.monotonic())
+        report = (blocked, ahead)
+        if report == waiter.reported:
+            return
+        message = {
+            'type': 'connect_queued',
+            'position': ahead + 1,
+            'queue_length': len(self._waiters),
+            'waiting_for': blocked,
+            'eta_seconds': eta,
+            'waited_seconds': round(time.monotonic() - waiter.queued_at, 1),
+            'initial': waiter.reported is None
+        }
+        waiter.reported = report
+        try:
+            await asyncio.wait_for(waiter.notify(message), self.notify_timeout)
+        except asyncio.TimeoutError:
+            self.stats['status_timeouts'] += 1
+            logger.debug(f"Queue status to {waiter.user or '-'} took over {self.notify_timeout}s - dropped")
+        except Exception as e:
+            logger.debug(f"Could not send queue status: {e}")
+
+    def _ensure_reporter(self):
+        if self._reporter is None or self._reporter.done():
+            self._reporter = asyncio.create_task(self._report_positions())
+            self._reporter.set_name("admission_status")
+
+    async def _report_positions(self):
+        """Tell queued connects when their position changes (at most once per interval)"""
+        while self._waiters:
+            await asyncio.sleep(self.status_interval)
+            await asyncio.gather(*(self._report(waiter) for waiter in list(self._waiters)))
+
+    def get_stats(self) -> Dict:
+        admitted = self.stats['admitted']
+        return {
+            'enabled': self.enabled,
+            'limits': {'global': self.global_limit, 'per_user': self.per_user_limit,
+                       'per_host': self.per_host_limit, 'host_rate': self.host_rate,
+                       'host_burst': self.host_burst},
+            'active': self._active,
+            'active_hosts': dict(self._active_hosts),
+            'active_users': len(self._active_users),
+            'queued_now': len(self._waiters),
+            'avg_connect_seconds': round(self.avg_connect_seconds, 3),
+            'avg_wait_seconds': round(self.stats['total_wait_seconds'] / admitted, 3) if admitted else 0.0,
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()},
+        }
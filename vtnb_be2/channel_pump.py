@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Readiness-driven I/O pump for paramiko channels
+Replaces recv_ready()/send_ready() polling with event loop readers (or a selector thread) and send window signals
+"""
+
+import asyncio
+import logging
+import selectors
+import socket
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _SelectorThread(threading.Thread):
+    """Background selector for event loops without add_reader() support (Windows Proactor)"""
+
+    def __init__(self):
+        super().__init__(name="ssh-channel-selector", daemon=True)
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        # fd -> (loop, future) waiting for readability
+        self._waiters: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+    def watch(self, fd: int, loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        """Resolve future on loop the next time fd becomes readable (one-shot)"""
+        with self._lock:
+            self._waiters[fd] = (loop, future)
+            self._selector.register(fd, selectors.EVENT_READ, fd)
+        self._wake()
+
+    def unwatch(self, fd: int):
+        """Stop watching fd if it is still registered"""
+        with self._lock:
+            if self._waiters.pop(fd, None) is not None:
+                try:
+                    self._selector.unregister(fd)
+                except (KeyError, ValueError, OSError):
+                    pass
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def run(self):
+        while True:
+            try:
+                events = self._selector.select()
+            except OSError as e:
+                # A channel was closed between watch() and select()
+                logger.debug(f"Channel selector error: {e}")
+                self._prune_closed()
+                continue
+
+            for key, _ in events:
+                fd = key.data
+                if fd is None:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+
+                with self._lock:
+                    waiter = self._waiters.pop(fd, None)
+                    if waiter is not None:
+                        self._selector.unregister(fd)
+
+                if waiter:
+                    loop, future = waiter
+                    loop.call_soon_threadsafe(_resolve, future)
+
+    def _prune_closed(self):
+        """Wake every waiter; callers re-check readiness so spurious wakeups are harmless"""
+        with self._lock:
+            waiters = list(self._waiters.items())
+            self._waiters.clear()
+            for fd, _ in waiters:
+                try:
+                    self._selector.unregister(fd)
+                except (KeyError, ValueError, OSError):
+                    pass
+
+        for _, (loop, future) in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _SendWindowSignal(threading.Condition):
+    """Stands in for a paramiko channel's out_buffer_cv and also wakes event loop waiters
+
+    paramiko notifies out_buffer_cv (holding the channel lock) when the
+    remote grows the send window and when the channel closes, but has no
+    public hook for either.
+    """
+
+    def __init__(self, lock, previous: threading.Condition):
+        super().__init__(lock)
+        self._previous = previous
+        # (loop, future) waiting for send window; guarded by the channel lock
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def notify_all(self):
+        super().notify_all()
+        # Threads that were already blocked in send() wait on the original condition
+        self._previous.notify_all()
+        waiters, self.waiters = self.waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # Loop already closed
+                pass
+
+
+class ChannelPump:
+    """Waits for paramiko channel readability without polling
+
+    paramiko exposes Channel.fileno() as a pipe that is set while the channel
+    has buffered data and stays set after EOF/close, so a level-triggered
+    reader on it gives zero-cost idle sessions and immediate wakeups.
+    Writers waiting for a full SSH send window are woken by the window
+    adjust itself instead of re-checking send_ready() on a timer.
+    """
+
+    def __init__(self):
+        self._selector_thread: Optional[_SelectorThread] = None
+        self._thread_lock = threading.Lock()
+        self._loop_readers_supported: Optional[bool] = None
+
+    @staticmethod
+    def is_readable(channel) -> bool:
+        """True if recv() would not block: data buffered, EOF received or closed"""
+        return channel.recv_ready() or channel.recv_stderr_ready() or channel.eof_received or channel.closed
+
+    async def wait_readable(self, channel, timeout: Optional[float] = None) -> bool:
+        """Suspend until the channel has data, reached EOF or was closed
+
+        Returns False if timeout (seconds) expired first.
+        """
+        if self.is_readable(channel):
+            return True
+
+        # Channels proxied from an SSH worker process signal readiness themselves
+        if hasattr(channel, 'wait_readable'):
+            return await channel.wait_readable(timeout)
+
+        loop = asyncio.get_running_loop()
+        fd = channel.fileno()
+        future = loop.create_future()
+
+        if self._loop_readers_supported is not False:
+            try:
+                loop.add_reader(fd, _resolve, future)
+                self._loop_readers_supported = True
+            except NotImplementedError:
+                logger.info("Event loop has no add_reader(); using selector thread for SSH channels")
+                self._loop_readers_supported = False
+
+        if self._loop_readers_supported:
+            try:
+                return await self._wait(future, timeout)
+            finally:
+                loop.remove_reader(fd)
+        else:
+            selector = self._get_selector_thread()
+            selector.watch(fd, loop, future)
+            try:
+                return await self._wait(future, timeout)
+            finally:
+                selector.unwatch(fd)
+
+    @staticmethod
+    async def _wait(future: asyncio.Future, timeout: Optional[float]) -> bool:
+        if timeout is None:
+            await future
+            return True
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def wait_writable(self, channel, timeout: Optional[float] = None) -> bool:
+        """Suspend until send_ready(): the remote opened the send window, or the channel closed
+
+        Returns False if timeout (seconds) expired first.
+        """
+        if channel.send_ready():
+            return True
+
+        # Channels proxied from an SSH worker process signal readiness themselves
+        if hasattr(channel, 'wait_writable'):
+            return await channel.wait_writable(timeout)
+
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with channel.lock:
+            signal = channel.out_buffer_cv
+            if not isinstance(signal, _SendWindowSignal):
+                signal = channel.out_buffer_cv = _SendWindowSignal(channel.lock, signal)
+            signal.waiters.append(waiter)
+
+        try:
+            # The window may have opened before the waiter was registered
+            if channel.send_ready():
+                return True
+            return await self._wait(waiter[1], timeout)
+        finally:
+            with channel.lock:
+                if waiter in signal.waiters:
+                    signal.waiters.remove(waiter)
+
+    def _get_selector_thread(self) -> _SelectorThread:
+        with self._thread_lock:
+            if self._selector_thread is None:
+                self._selector_thread = _SelectorThread()
+                self._selector_thread.start()
+            return self._selector_thread
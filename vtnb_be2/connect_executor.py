@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Bounded executor for blocking SSH connection setup
+Keeps paramiko TCP/KEX/auth/shell work off the event loop
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectCancelled(Exception):
+    """Raised inside a connect job once its websocket has gone away"""
+
+
+class CancelToken:
+    """Cancellation handle shared between the event loop and a connect job"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._closers: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def add_closer(self, closer: Callable[[], None]):
+        """Register a callable that aborts blocking work (e.g. SSHClient.close)"""
+        with self._lock:
+            if not self._cancelled:
+                self._closers.append(closer)
+                return
+        # Already cancelled - abort immediately
+        _safe_close(closer)
+
+    def raise_if_cancelled(self):
+        if self._cancelled:
+            raise ConnectCancelled("Connection attempt cancelled")
+
+    def cancel(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            closers, self._closers = self._closers, []
+
+        for closer in closers:
+            _safe_close(closer)
+
+
+def _safe_close(closer: Callable[[], None]):
+    try:
+        closer()
+    except Exception as e:
+        logger.debug(f"Error aborting connect job: {e}")
+
+
+class ConnectExecutor:
+    """Size-limited thread pool for SSH connection setup with queue/in-flight gauges"""
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ssh-connect")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._stats = {
+            'submitted': 0,
+            'started': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'max_queue_depth': 0,
+            'total_queue_wait': 0.0,
+            'max_queue_wait': 0.0,
+        }
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run func(*args, token=CancelToken, **kwargs) in the pool
+
+        Cancelling the awaiting coroutine removes a queued job, or cancels the
+        token of a running job so its registered closers abort the socket.
+        """
+        token = CancelToken()
+        submitted_at = time.monotonic()
+        started = threading.Event()
+
+        def job():
+            with self._lock:
+                self._queued -= 1
+                self._in_flight += 1
+                self._stats['started'] += 1
+                wait = time.monotonic() - submitted_at
+                self._stats['total_queue_wait'] += wait
+                self._stats['max_queue_wait'] = max(self._stats['max_queue_wait'], wait)
+            started.set()
+
+            try:
+                token.raise_if_cancelled()
+                return func(*args, token=token, **kwargs)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+        with self._lock:
+            self._queued += 1
+            self._stats['submitted'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queued)
+
+        future = self._executor.submit(job)
+
+        try:
+            result = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            token.cancel()
+            if not started.is_set() and future.cancel():
+                # Never ran - job() will not decrement the queue for us
+                with self._lock:
+                    self._queued -= 1
+            with self._lock:
+                self._stats['cancelled'] += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._stats['failed'] += 1
+            raise
+
+        with self._lock:
+            self._stats['completed'] += 1
+        return result
+
+    def get_stats(self) -> Dict:
+        """Gauges and counters for sizing the pool"""
+        with self._lock:
+            started = self._stats['started']
+            avg_wait = self._stats['total_queue_wait'] / started if started else 0.0
+            return {
+                'max_workers': self.max_workers,
+                'queue_depth': self._queued,
+                'in_flight': self._in_flight,
+                'submitted': self._stats['submitted'],
+                'completed': self._stats['completed'],
+                'failed': self._stats['failed'],
+                'cancelled': self._stats['cancelled'],
+                'max_queue_depth': self._stats['max_queue_depth'],
+                'avg_queue_wait_ms': round(avg_wait * 1000, 2),
+                'max_queue_wait_ms': round(self._stats['max_queue_wait'] * 1000, 2),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Per-phase SSH connect timing
+Where a slow terminal open spends its time (queue, DNS, TCP, KEX, auth, key parsing, shell), per host and overall
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Phases in connect order. queue is waiting for admission, another window's
+# handshake to the same target or a connect thread; tcp includes DNS when
+# paramiko resolves the name itself (ssh.dial disabled); channel is an extra
+# channel on a pooled (multiplexed) transport; worker is the process/IPC
+# overhead of a connect done in an SSH worker process.
+PHASES = ('queue', 'dns', 'tcp', 'kex', 'auth', 'key', 'shell', 'channel', 'worker')
+
+# Histogram bucket upper bounds (ms); the last bucket is everything above
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 60000)
+
+DEFAULT_SLOW_PHASE_MS = {'queue': 5000, 'dns': 500, 'tcp': 1000, 'kex': 2000, 'auth': 2000,
+                         'key': 200, 'shell': 1000, 'channel': 1000, 'worker': 5000}
+
+
+class ConnectTiming:
+    """Phase durations of one connect attempt
+
+    lap() closes the phase that has run since the previous lap, so the
+    blocking connect code on an executor thread only has to mark phase
+    ends. Only one thread touches it at a time.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._lap = self.started
+        self.phases: Dict[str, float] = {}
+        self.reused = False
+
+    def lap(self, phase: Optional[str] = None):
+        """End the current phase as phase (None = discard the time since the last lap)"""
+        now = time.monotonic()
+        if phase is not None:
+            self.phases[phase] = self.phases.get(phase, 0.0) + (now - self._lap)
+        self._lap = now
+
+    def add(self, phase: str, seconds: float):
+        """Record a phase measured elsewhere (e.g. the admission wait)"""
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def merge(self, phases: Dict[str, float], remainder: str):
+        """End the current phase with laps taken elsewhere; the time they do not cover goes to remainder"""
+        now = time.monotonic()
+        for phase, seconds in phases.items():
+            self.add(phase, seconds)
+        self.add(remainder, max(0.0, now - self._lap - sum(phases.values())))
+        self._lap = now
+
+    @property
+    def total(self) -> float:
+        return self._lap - self.started
+
+    def summary(self) -> Dict:
+        """Compact form for the websocket status message"""
+        return {
+            'total_ms': round(self.total * 1000, 1),
+            'phases': {phase: round(self.phases[phase] * 1000, 1) for phase in PHASES if phase in self.phases},
+            'reused': self.reused
+        }
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (ms); percentiles are bucket upper bounds"""
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        index = 0
+        while index < len(BUCKETS_MS) and ms > BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= wanted:
+                return float(min(BUCKETS_MS[index], self.max_ms)) if index < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def get_stats(self, buckets: bool = False) -> Dict:
+        stats = {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 1) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.5), 1),
+            'p95_ms': round(self.percentile(0.95), 1),
+            'p99_ms': round(self.percentile(0.99), 1),
+            'max_ms': round(self.max_ms, 1),
+        }
+        if buckets:
+            stats['buckets'] = {f'le_{bound}': count for bound, count in zip(BUCKETS_MS, self.counts)}
+            stats['buckets']['inf'] = self.counts[-1]
+        return stats
+
+
+class _PhaseHistograms:
+    def __init__(self):
+        self.phases: Dict[str, Histogram] = {}
+        self.total = Histogram()
+        self.connects = 0
+        self.failures = 0
+        self.reused = 0
+        self.slow = 0
+
+    def observe(self, timing: ConnectTiming, ok: bool, slow: bool):
+        self.connects += 1
+        self.failures += 0 if ok else 1
+        self.reused += 1 if timing.reused else 0
+        self.slow += 1 if slow else 0
+        for phase, seconds in timing.phases.items():
+            histogram = self.phases.get(phase)
+            if histogram is None:
+                histogram = self.phases[phase] = Histogram()
+            histogram.observe(seconds * 1000)
+        if ok:
+            self.total.observe(timing.total * 1000)
+
+    def get_stats(self, buckets: bool = False) -> Dict:
+        return {
+            'connects': self.connects,
+            'failures': self.failures,
+            'reused': self.reused,
+            'slow': self.slow,
+            'total': self.total.get_stats(buckets),
+            'phases': {phase: self.phases[phase].get_stats(buckets) for phase in PHASES if phase in self.phases}
+        }
+
+
+class ConnectTimingStats:
+    """Global and per-host (host:port) phase histograms, and slow-phase logging
+
+    A connect is logged with its host, user, window and full phase
+    breakdown when any phase exceeds its slow_phase_ms threshold or the
+    whole connect exceeds slow_total_ms. The least recently connected
+    hosts are dropped beyond max_hosts.
+    """
+
+    def __init__(self, slow_phase_ms: Optional[Dict[str, float]] = None, slow_total_ms: float = 5000.0,
+                 max_hosts: int = 512):
+        self.slow_phase_ms = {**DEFAULT_SLOW_PHASE_MS, **(slow_phase_ms or {})}
+        self.slow_total_ms = slow_total_ms
+        self.max_hosts = max_hosts
+        self._global = _PhaseHistograms()
+        self._hosts: 'OrderedDict[str, _PhaseHistograms]' = OrderedDict()
+
+    def record(self, timing: ConnectTiming, hostname: str, port: int, ok: bool = True,
+               username: Optional[str] = None, window_id: Optional[str] = None, profile: Optional[str] = None):
+        """Add a finished (or failed) connect to the histograms"""
+        host = f"{hostname}:{port}"
+        slow_phases = [phase for phase, seconds in timing.phases.items()
+                       if self.slow_phase_ms.get(phase) and seconds * 1000 > self.slow_phase_ms[phase]]
+        slow = bool(slow_phases) or (self.slow_total_ms and timing.total * 1000 > self.slow_total_ms)
+
+        self._global.observe(timing, ok, slow)
+        histograms = self._hosts.get(host)
+        if histograms is None:
+            histograms = self._hosts[host] = _PhaseHistograms()
+        self._hosts.move_to_end(host)
+        histograms.observe(timing, ok, slow)
+        while len(self._hosts) > self.max_hosts:
+            self._hosts.popitem(last=False)
+
+        if slow:
+            breakdown = ', '.join(f"{phase} {ms:.0f}ms" for phase, ms in timing.summary()['phases'].items())
+            logger.warning(f"Slow SSH connect to {host} ({'ok' if ok else 'failed'}, "
+                           f"slow: {', '.join(slow_phases) or 'total'}) for {username or '-'} "
+                           f"window {window_id or '-'} profile {profile or '-'}: "
+                           f"total {timing.total * 1000:.0f}ms [{breakdown}]")
+
+    def get_stats(self) -> Dict:
+        """Global histograms (for /api/metrics/ssh)"""
+        return {
+            'slow_total_ms': self.slow_total_ms,
+            'hosts': len(self._hosts),
+            **self._global.get_stats()
+        }
+
+    def get_host_stats(self, host: Optional[str] = None, buckets: bool = True) -> Dict:
+        """Global and per-host histograms, optionally only hosts whose host:port contains host"""
+        return {
+            'buckets_ms': list(BUCKETS_MS),
+            'slow_phase_ms': self.slow_phase_ms,
+            'slow_total_ms': self.slow_total_ms,
+            'global': self._global.get_stats(buckets),
+            'hosts': {name: histograms.get_stats(buckets) for name, histograms in reversed(self._hosts.items())
+                      if host is None or host in name}
+        }
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Connection establishment in front of paramiko
+Async TTL-bounded DNS cache and happy-eyeballs (RFC 8305) TCP dialing; the winning socket goes to paramiko
+"""
+
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from paramiko.ssh_exception import NoValidConnectionsError
+
+logger = logging.getLogger(__name__)
+
+# (family, sockaddr) as returned by getaddrinfo
+Address = Tuple[int, tuple]
+
+
+class _CacheEntry:
+    def __init__(self, addresses: Optional[List[Address]], error: Optional[Exception], ttl: float):
+        self.addresses = addresses
+        self.error = error
+        self.resolved_at = time.monotonic()
+        self.expires_at = self.resolved_at + ttl
+
+
+class DNSCache:
+    """Async getaddrinfo with a TTL-bounded cache
+
+    Concurrent lookups of one name share a single query. An expired entry
+    is still served for up to stale_seconds while a background lookup
+    refreshes it, so a slow resolver only delays the first connect to a
+    host. Failed lookups are cached for negative_ttl.
+    """
+
+    def __init__(self, ttl: float = 300.0, stale_seconds: float = 3600.0, negative_ttl: float = 5.0,
+                 max_entries: int = 1024):
+        self.ttl = ttl
+        self.stale_seconds = stale_seconds
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, int], _CacheEntry]' = OrderedDict()
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.stats = {'lookups': 0, 'hits': 0, 'stale_hits': 0, 'negative_hits': 0, 'misses': 0,
+                      'failures': 0, 'total_resolve_seconds': 0.0, 'max_resolve_seconds': 0.0}
+
+    async def resolve(self, host: str, port: int) -> List[Address]:
+        """Addresses for host:port in getaddrinfo (RFC 6724) order"""
+        literal = _literal_address(host, port)
+        if literal is not None:
+            return [literal]
+
+        key = (host.lower(), port)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if now < entry.expires_at:
+                if entry.error is not None:
+                    self.stats['negative_hits'] += 1
+                    raise entry.error
+                self.stats['hits'] += 1
+                return entry.addresses
+            if entry.addresses and now < entry.expires_at + self.stale_seconds:
+                # Serve the old answer now and refresh behind it
+                self.stats['stale_hits'] += 1
+                self._lookup(key)
+                return entry.addresses
+
+        self.stats['misses'] += 1
+        return await asyncio.shield(self._lookup(key))
+
+    def _lookup(self, key: Tuple[str, int]) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._query(key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._lookup_done(key, done))
+        return future
+
+    def _lookup_done(self, key: Tuple[str, int], future: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not future.cancelled() and future.exception() is not None:
+            # Background refreshes have no awaiter; the error is cached or logged
+            logger.debug(f"DNS lookup for {key[0]} failed: {future.exception()}")
+
+    async def _query(self, key: Tuple[str, int]) -> List[Address]:
+        host, port = key
+        started = time.monotonic()
+        self.stats['lookups'] += 1
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            self.stats['failures'] += 1
+            stale = self._entries.get(key)
+            if stale is not None and stale.addresses:
+                # Resolver trouble: keep using the last good answer until it goes fully stale
+                logger.warning(f"DNS lookup for {host} failed ({e}) - keeping cached addresses")
+                return stale.addresses
+            self._store(key, _CacheEntry(None, e, self.negative_ttl))
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            self.stats['total_resolve_seconds'] += elapsed
+            self.stats['max_resolve_seconds'] = max(self.stats['max_resolve_seconds'], elapsed)
+
+        addresses = []
+        for family, _, _, _, sockaddr in infos:
+            if (family, sockaddr) not in addresses:
+                addresses.append((family, sockaddr))
+        self._store(key, _CacheEntry(addresses, None, self.ttl))
+        return addresses
+
+    def _store(self, key: Tuple[str, int], entry: _CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats['lookups']
+        return {
+            'entries': len(self._entries),
+            'ttl_seconds': self.ttl,
+            **{k: round(v, 4) if isinstance(v, float) else v for k, v in self.stats.items()},
+            'avg_resolve_ms': round(self.stats['total_resolve_seconds'] / lookups * 1000, 2) if lookups else 0.0,
+        }
+
+
+def _literal_address(host: str, port: int) -> Optional[Address]:
+    try:
+        ip = ipaddress.ip_address(host.strip('[]'))
+    except ValueError:
+        return None
+    if ip.version == 6:
+        return socket.AF_INET6, (str(ip), port, 0, 0)
+    return socket.AF_INET, (str(ip), port)
+
+
+def interleave(addresses: List[Address], preferred: Optional[tuple] = None) -> List[Address]:
+    """Alternate address families (RFC 8305 section 4), starting with the preferred address if known"""
+    ordered = list(addresses)
+    if preferred is not None:
+        ordered.sort(key=lambda address: address[1] != preferred)
+    if not ordered:
+        return ordered
+
+    first_family = ordered[0][0]
+    first = [a for a in ordered if a[0] == first_family]
+    other = [a for a in ordered if a[0] != first_family]
+    result = []
+    for index in range(max(len(first), len(other))):
+        result += first[index:index + 1] + other[index:index + 1]
+    return result
+
+
+class HappyEyeballsDialer:
+    """Resolves through a DNSCache and races TCP connects over the candidate addresses
+
+    The first address is tried at once; each further one starts when the
+    previous attempt fails or after attempt_delay, whichever comes first.
+    The first socket to connect wins and the rest are cancelled, so a
+    broken AAAA record costs attempt_delay instead of a full TCP timeout.
+    The address that won last time for a host is tried first.
+    """
+
+    def __init__(self, resolver: Optional[DNSCache] = None, attempt_delay: float = 0.25,
+                 connect_timeout: float = 15.0):
+        self.resolver = resolver or DNSCache()
+        self.attempt_delay = attempt_delay
+        self.connect_timeout = connect_timeout
+        self._preferred: 'OrderedDict[Tuple[str, int], tuple]' = OrderedDict()
+        self.stats = {'dials': 0, 'connected': 0, 'failed': 0, 'attempts': 0, 'fallback_wins': 0,
+                      'total_dial_seconds': 0.0, 'max_dial_seconds': 0.0}
+
+    async def dial(self, host: str, port: int, timing=None) -> socket.socket:
+        """A connected blocking TCP socket to host:port (dns/tcp laps go to timing, a ConnectTiming)"""
+        self.stats['dials'] += 1
+        started = time.monotonic()
+        key = (host.lower(), port)
+        addresses = interleave(await self.resolver.resolve(host, port), self._preferred.get(key))
+        if timing is not None:
+            timing.lap('dns')
+
+        try:
+            sock, index = await asyncio.wait_for(self._race(addresses), self.connect_timeout)
+            if timing is not None:
+                timing.lap('tcp')
+        except asyncio.TimeoutError:
+            self.stats['failed'] += 1
+            raise socket.timeout(f"Timed out connecting to {host}:{port} after {self.connect_timeout:.0f}s")
+        except OSError:
+            self.stats['failed'] += 1
+            raise
+
+        elapsed = time.monotonic() - started
+        self.stats['connected'] += 1
+        self.stats['total_dial_seconds'] += elapsed
+        self.stats['max_dial_seconds'] = max(self.stats['max_dial_seconds'], elapsed)
+        if index:
+            self.stats['fallback_wins'] += 1
+            logger.info(f"Connected to {host}:{port} via {sock.getpeername()[0]} "
+                        f"(candidate {index + 1} of {len(addresses)})")
+
+        self._preferred[key] = sock.getpeername()
+        self._preferred.move_to_end(key)
+        while len(self._preferred) > self.resolver.max_entries:
+            self._preferred.popitem(last=False)
+
+        # paramiko expects a blocking socket; keystrokes should not wait for Nagle
+        sock.setblocking(True)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    async def _race(self, addresses: List[Address]) -> Tuple[socket.socket, int]:
+        loop = asyncio.get_running_loop()
+        attempts: Dict[asyncio.Task, int] = {}
+        errors: Dict[tuple, Exception] = {}
+        remaining = list(enumerate(addresses))
+        winner = None
+
+        try:
+            while remaining or any(not task.done() for task in attempts):
+                if remaining:
+                    index, address = remaining.pop(0)
+                    attempts[asyncio.ensure_future(self._attempt(loop, address))] = index
+
+                pending = [task for task in attempts if not task.done()]
+                done, _ = await asyncio.wait(pending, timeout=self.attempt_delay if remaining else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        return task.result(), attempts[task]
+                    errors[addresses[attempts[task]][1]] = task.exception()
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+                elif task is not winner and not task.cancelled() and task.exception() is None:
+                    # Connected just after the winner
+                    task.result().close()
+
+        raise NoValidConnectionsError(errors) if errors else OSError("No addresses to connect to")
+
+    async def _attempt(self, loop: asyncio.AbstractEventLoop, address: Address) -> socket.socket:
+        family, sockaddr = address
+        self.stats['attempts'] += 1
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.setblocking(False)
+            await loop.sock_connect(sock, sockaddr)
+            return sock
+        except BaseException:
+            sock.close()
+            raise
+
+    def get_stats(self) -> Dict:
+        connected = self.stats['connected']
+        return {
+            'attempt_delay_ms': round(self.attempt_delay * 1000),
+            **{k: round(v, 4) if isinstance(v, float) else v for k, v in self.stats.items()},
+            'avg_dial_ms': round(self.stats['total_dial_seconds'] / connected * 1000, 2) if connected else 0.0,
+            'dns': self.resolver.get_stats(),
+        }
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Per-host health tracking for SSH connects
+Circuit breaker per (host, port) with cached failure reasons, exponential cool-down and half-open probing
+"""
+
+import asyncio
+import errno
+import logging
+import socket
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import paramiko
+from paramiko.ssh_exception import NoValidConnectionsError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Failure categories that say the host itself is not there (auth failures prove it is)
+DEFAULT_TRIP_ON = ('refused', 'timeout', 'unreachable', 'dns')
+
+_UNREACHABLE_ERRNOS = {errno.EHOSTUNREACH, errno.ENETUNREACH, errno.EHOSTDOWN, errno.ENETDOWN}
+
+
+class HostUnavailable(Exception):
+    """Raised instead of connecting while a host's breaker is open"""
+
+    def __init__(self, message: str, state: Dict):
+        super().__init__(message)
+        self.state = state
+
+
+def classify_failure(error: BaseException) -> str:
+    """Failure category of a connect error: auth, refused, timeout, unreachable, dns, protocol or connection"""
+    if isinstance(error, paramiko.AuthenticationException):
+        return 'auth'
+    if isinstance(error, NoValidConnectionsError):
+        # Every address failed: refused only if all of them refused
+        categories = {classify_failure(e) for e in error.errors.values()}
+        if categories == {'refused'}:
+            return 'refused'
+        for category in ('timeout', 'unreachable'):
+            if category in categories:
+                return category
+        return 'connection'
+    if isinstance(error, socket.gaierror):
+        return 'dns'
+    if isinstance(error, ConnectionRefusedError):
+        return 'refused'
+    if isinstance(error, (socket.timeout, asyncio.TimeoutError)):
+        return 'timeout'
+    if isinstance(error, paramiko.SSHException):
+        return 'protocol'
+    if isinstance(error, OSError) and error.errno in _UNREACHABLE_ERRNOS:
+        return 'unreachable'
+    return 'connection'
+
+
+class _HostState:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.cooldown = 0.0
+        self.opened_at = 0.0
+        self.open_until = 0.0
+        self.last_wanted = time.monotonic()
+        self.last_failure: Optional[Dict] = None
+        self.last_success: Optional[float] = None
+        self.recent: Deque[Dict] = deque(maxlen=8)
+        self.failures: Dict[str, int] = {}
+        self.probe_done: Optional[asyncio.Event] = None
+        self.probe_task: Optional[asyncio.Task] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def describe(self, now: float) -> Dict:
+        return {
+            'host': self.host,
+            'port': self.port,
+            'state': self.state,
+            'retry_in_seconds': round(max(0.0, self.open_until - now), 1) if self.state == OPEN else 0.0,
+            'cooldown_seconds': round(self.cooldown, 1),
+            'consecutive_failures': self.consecutive_failures,
+            'last_failure': self.last_failure,
+            'last_success': self.last_success,
+            'failures': dict(self.failures),
+            'recent': list(self.recent)
+        }
+
+
+class _AuthBlock:
+    def __init__(self):
+        self.failures = 0
+        self.until = 0.0
+        self.message = ''
+
+
+class HealthAttempt:
+    """One connect let through the health check; report how it went, then release()"""
+
+    def __init__(self, tracker: 'HostHealthTracker', key: Optional[Tuple[str, int]], credential_key=None,
+                 probe: bool = False):
+        self.tracker = tracker
+        self.key = key
+        self.credential_key = credential_key
+        self.probe = probe
+        self.started = time.monotonic()
+        self.done = False
+
+    def succeeded(self):
+        if not self.done and self.key is not None:
+            self.done = True
+            self.tracker._record_success(self)
+
+    def failed(self, error: BaseException):
+        if not self.done and self.key is not None:
+            self.done = True
+            self.tracker._record_failure(self, classify_failure(error), str(error) or type(error).__name__)
+
+    def release(self):
+        """Finish without an outcome (cancelled): a probe hands its turn to the next connect"""
+        if not self.done and self.key is not None:
+            self.done = True
+            self.tracker._abandon(self)
+
+
+class HostHealthTracker:
+    """Circuit breaker per (host, port) in front of SSH connects
+
+    failure_threshold consecutive refused/timed-out/unreachable/unresolvable
+    connects open a host's breaker: connects then fail at once with the
+    cached reason instead of waiting out another TCP timeout. The cool-down
+    starts at base_cooldown and doubles with every failure up to
+    max_cooldown. When it ends the host is half-open: one probe (a
+    background TCP connect when probe is set, else the next connect) decides
+    whether it closes again, and connects arriving meanwhile wait for it.
+    A rejected login only makes the same credentials to the same host fail
+    fast for auth_cooldown; other users and credentials are not blocked.
+    """
+
+    def __init__(self, enabled: bool = True, failure_threshold: int = 1, trip_on=DEFAULT_TRIP_ON,
+                 base_cooldown: float = 10.0, max_cooldown: float = 300.0, auth_cooldown: float = 10.0,
+                 probe: Optional[Callable[[str, int], Awaitable[None]]] = None, probe_timeout: float = 5.0,
+                 forget_after: float = 3600.0, max_hosts: int = 4096):
+        self.enabled = enabled
+        self.failure_threshold = max(1, failure_threshold)
+        self.trip_on = set(trip_on)
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.auth_cooldown = auth_cooldown
+        self.probe = probe
+        self.probe_timeout = probe_timeout
+        self.forget_after = forget_after
+        self.max_hosts = max_hosts
+        self._hosts: 'OrderedDict[Tuple[str, int], _HostState]' = OrderedDict()
+        self._auth: 'OrderedDict[tuple, _AuthBlock]' = OrderedDict()
+        self.stats = {'fast_failures': 0, 'auth_fast_failures': 0, 'opened': 0, 'closed': 0,
+                      'probes': 0, 'probe_failures': 0, 'probe_waits': 0}
+
+    async def admit(self, hostname: str, port: int, credential_key=None) -> HealthAttempt:
+        """Let a connect to hostname:port through, or raise HostUnavailable with the cached reason"""
+        if not self.enabled:
+            return HealthAttempt(self, None)
+        key = (hostname.lower(), port)
+
+        while True:
+            now = time.monotonic()
+            self._check_auth(credential_key, hostname, port, now)
+            state = self._hosts.get(key)
+            if state is None or state.state == CLOSED:
+                return HealthAttempt(self, key, credential_key)
+
+            state.last_wanted = now
+            if state.state == OPEN:
+                if now < state.open_until:
+                    self.stats['fast_failures'] += 1
+                    failure = state.last_failure or {}
+                    raise HostUnavailable(
+                        f"{hostname}:{port} is unreachable ({failure.get('category')}: {failure.get('message')}) "
+                        f"- not retrying for {state.open_until - now:.0f}s", state.describe(now))
+                # Cool-down over and no background probe: this connect finds out
+                self._half_open(state)
+                return HealthAttempt(self, key, credential_key, probe=True)
+
+            # Half-open: wait for the probe in flight, then look again
+            self.stats['probe_waits'] += 1
+            await state.probe_done.wait()
+
+    def _check_auth(self, credential_key, hostname: str, port: int, now: float):
+        block = self._auth.get(credential_key) if credential_key is not None else None
+        if block is not None and now < block.until:
+            self.stats['auth_fast_failures'] += 1
+            raise HostUnavailable(
+                f"Login to {hostname}:{port} with these credentials was just rejected ({block.message}) "
+                f"- not retrying for {block.until - now:.0f}s", self.get_host(hostname, port))
+
+    def _state(self, key: Tuple[str, int]) -> _HostState:
+        state = self._hosts.get(key)
+        if state is None:
+            state = self._hosts[key] = _HostState(*key)
+        self._hosts.move_to_end(key)
+        while len(self._hosts) > self.max_hosts:
+            _, evicted = self._hosts.popitem(last=False)
+            self._stop_timers(evicted)
+        return state
+
+    def _record_success(self, attempt: HealthAttempt):
+        if attempt.credential_key is not None:
+            self._auth.pop(attempt.credential_key, None)
+        state = self._hosts.get(attempt.key)
+        if state is None:
+            return
+        state.last_success = round(time.time(), 3)
+        if state.state != CLOSED:
+            self._close(state, 'connect succeeded')
+        state.consecutive_failures = 0
+
+    def _record_failure(self, attempt: HealthAttempt, category: str, message: str):
+        now = time.monotonic()
+        state = self._state(attempt.key)
+        failure = {'category': category, 'message': message[:200], 'at': round(time.time(), 3)}
+        state.recent.append(failure)
+        state.failures[category] = state.failures.get(category, 0) + 1
+
+        if category == 'auth':
+            self._block_credentials(attempt.credential_key, message, now)
+        if category not in self.trip_on:
+            # The host answered; a probe that got this far proves it is back
+            if attempt.probe:
+                self._close(state, f'host answered ({category})')
+            return
+
+        state.last_failure = failure
+        if state.state != CLOSED and not attempt.probe and attempt.started < state.opened_at:
+            # Started before the breaker opened - already accounted for
+            return
+        state.consecutive_failures += 1
+        if attempt.probe or state.consecutive_failures >= self.failure_threshold:
+            self._open(state, now)
+
+    def _block_credentials(self, credential_key, message: str, now: float):
+        if credential_key is None or self.auth_cooldown <= 0:
+            return
+        block = self._auth.get(credential_key)
+        if block is None:
+            block = self._auth[credential_key] = _AuthBlock()
+        self._auth.move_to_end(credential_key)
+        block.failures += 1
+        block.message = message[:200]
+        block.until = now + min(self.max_cooldown, self.auth_cooldown * 2 ** (block.failures - 1))
+        while len(self._auth) > self.max_hosts:
+            self._auth.popitem(last=False)
+
+    def _abandon(self, attempt: HealthAttempt):
+        state = self._hosts.get(attempt.key)
+        if attempt.probe and state is not None and state.state == HALF_OPEN:
+            # Back to open with the cool-down already over: the next connect probes
+            state.state = OPEN
+            state.open_until = time.monotonic()
+            state.probe_done.set()
+
+    def _open(self, state: _HostState, now: float):
+        exponent = state.consecutive_failures - self.failure_threshold
+        state.cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** max(0, exponent))
+        was_open = state.state != CLOSED
+        state.state = OPEN
+        state.opened_at = now
+        state.open_until = now + state.cooldown
+        if state.probe_done is not None:
+            state.probe_done.set()
+        if not was_open:
+            self.stats['opened'] += 1
+        logger.warning(f"Host {state.host}:{state.port} marked unreachable for {state.cooldown:.0f}s "
+                       f"({state.last_failure['category']}: {state.last_failure['message']})")
+
+        if state.timer is not None:
+            state.timer.cancel()
+        state.timer = asyncio.get_running_loop().call_later(state.cooldown, self._cooldown_over, state)
+
+    def _close(self, state: _HostState, why: str):
+        if state.state != CLOSED:
+            self.stats['closed'] += 1
+            logger.info(f"Host {state.host}:{state.port} reachable again ({why})")
+        state.state = CLOSED
+        state.consecutive_failures = 0
+        state.cooldown = 0.0
+        if state.probe_done is not None:
+            state.probe_done.set()
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+
+    def _half_open(self, state: _HostState):
+        state.state = HALF_OPEN
+        state.probe_done = asyncio.Event()
+        self.stats['probes'] += 1
+
+    def _cooldown_over(self, state: _HostState):
+        state.timer = None
+        if state.state != OPEN or self._hosts.get((state.host, state.port)) is not state:
+            return
+        if time.monotonic() - state.last_wanted > self.forget_after:
+            # Nobody has tried this host for a long time; stop probing it
+            del self._hosts[(state.host, state.port)]
+            return
+        if self.probe is not None:
+            self._half_open(state)
+            state.probe_task = asyncio.create_task(self._run_probe(state))
+            state.probe_task.set_name(f"host_probe_{state.host}:{state.port}")
+
+    async def _run_probe(self, state: _HostState):
+        attempt = HealthAttempt(self, (state.host, state.port), probe=True)
+        try:
+            await asyncio.wait_for(self.probe(state.host, state.port), self.probe_timeout)
+        except asyncio.CancelledError:
+            attempt.release()
+            raise
+        except Exception as e:
+            self.stats['probe_failures'] += 1
+            attempt.failed(e)
+        else:
+            attempt.succeeded()
+        finally:
+            state.probe_task = None
+
+    def _stop_timers(self, state: _HostState):
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        if state.probe_task is not None:
+            state.probe_task.cancel()
+        if state.probe_done is not None:
+            state.probe_done.set()
+
+    def reset(self, hostname: str, port: int) -> bool:
+        """Forget a host's failures (it is known to be back)"""
+        state = self._hosts.pop((hostname.lower(), port), None)
+        if state is None:
+            return False
+        self._stop_timers(state)
+        logger.info(f"Host {state.host}:{state.port} health reset")
+        return True
+
+    def get_host(self, hostname: str, port: int) -> Dict:
+        state = self._hosts.get((hostname.lower(), port))
+        if state is None:
+            return {'host': hostname.lower(), 'port': port, 'state': CLOSED}
+        return state.describe(time.monotonic())
+
+    def get_hosts(self, unhealthy_only: bool = False) -> List[Dict]:
+        now = time.monotonic()
+        return [state.describe(now) for state in reversed(self._hosts.values())
+                if not unhealthy_only or state.state != CLOSED]
+
+    def get_stats(self) -> Dict:
+        states = [state.state for state in self._hosts.values()]
+        return {
+            'enabled': self.enabled,
+            'tracked_hosts': len(states),
+            'open': states.count(OPEN),
+            'half_open': states.count(HALF_OPEN),
+            'blocked_credentials': sum(1 for block in self._auth.values() if block.until > time.monotonic()),
+            **self.stats
+        }
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Process-wide cache of parsed SSH private keys
+Keyed by (path, mtime, size) so a rotated key file is re-parsed automatically
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Type
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+# Workspace key files, in order of preference
+KEY_FILENAMES = ("id_rsa", "id_ed25519", "id_ecdsa")
+
+KEY_CLASSES = (
+    (paramiko.RSAKey, "RSA"),
+    (paramiko.Ed25519Key, "ED25519"),
+    (paramiko.ECDSAKey, "ECDSA"),
+)
+
+
+class PrivateKeyCache:
+    """Parsed PKey objects shared by every connect, invalidated when the file changes
+
+    Connects run on executor threads, so lookups are locked and a per-path
+    lock makes 40 tabs opened at once parse a key only one time.
+    """
+
+    def __init__(self, base_dir: str = "./workspaces"):
+        self.base_dir = Path(base_dir)
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Tuple[Tuple[int, int], Optional[paramiko.PKey]]] = {}
+        self._key_types: Dict[str, Type[paramiko.PKey]] = {}
+        self._parse_locks: Dict[str, threading.Lock] = {}
+        self._key_dirs: Dict[str, Tuple[int, Optional[str]]] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'parse_seconds': 0.0}
+
+    def find_user_key(self, username: str) -> Optional[str]:
+        """Path of the user's workspace SSH key, re-scanned only when the key dir changes"""
+        key_dir = self.base_dir / username / "ssh_key"
+        try:
+            dir_mtime = os.stat(key_dir).st_mtime_ns
+        except OSError:
+            return None
+
+        cache_key = str(key_dir)
+        with self._lock:
+            cached = self._key_dirs.get(cache_key)
+        if cached and cached[0] == dir_mtime:
+            return cached[1]
+
+        try:
+            names = set(os.listdir(key_dir))
+        except OSError:
+            return None
+        found = next((str(key_dir / name) for name in KEY_FILENAMES if name in names), None)
+
+        with self._lock:
+            self._key_dirs[cache_key] = (dir_mtime, found)
+        return found
+
+    def load(self, path: str) -> Optional[paramiko.PKey]:
+        """Parsed key for path (None if it cannot be used without a passphrase or is not a key)"""
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            logger.warning(f"SSH key {path} not readable: {e}")
+            return None
+        signature = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            cached = self._keys.get(path)
+            if cached and cached[0] == signature:
+                self.stats['hits'] += 1
+                return cached[1]
+            parse_lock = self._parse_locks.setdefault(path, threading.Lock())
+
+        with parse_lock:
+            # Another thread may have parsed it while we waited
+            with self._lock:
+                cached = self._keys.get(path)
+                if cached and cached[0] == signature:
+                    self.stats['hits'] += 1
+                    return cached[1]
+                if cached:
+                    self.stats['invalidations'] += 1
+                    logger.info(f"SSH key {path} changed on disk - re-parsing")
+                self.stats['misses'] += 1
+                known_type = self._key_types.get(path)
+
+            started = time.monotonic()
+            pkey = self._parse(path, known_type)
+            elapsed = time.monotonic() - started
+
+            with self._lock:
+                self.stats['parse_seconds'] += elapsed
+                self._keys[path] = (signature, pkey)
+                if pkey is not None:
+                    self._key_types[path] = type(pkey)
+            return pkey
+
+    def _parse(self, path: str, known_type: Optional[Type[paramiko.PKey]]) -> Optional[paramiko.PKey]:
+        """Try the remembered key type first, then the rest"""
+        key_types = sorted(KEY_CLASSES, key=lambda entry: entry[0] is not known_type)
+
+        for key_class, key_type in key_types:
+            try:
+                pkey = key_class.from_private_key_file(path)
+                logger.info(f"✓ Successfully loaded {key_type} key from {path}")
+                return pkey
+            except paramiko.PasswordRequiredException:
+                logger.warning(f"{key_type} key at {path} requires passphrase (not supported)")
+                return None
+            except paramiko.SSHException as e:
+                logger.debug(f"Not a {key_type} key: {e}")
+            except Exception as e:
+                logger.debug(f"Error loading as {key_type}: {e}")
+
+        logger.warning(f"Failed to load SSH key from {path}")
+        return None
+
+    def forget_user(self, username: str):
+        """Drop every parsed key under the user's workspace (on logout)"""
+        prefix = str(self.base_dir / username) + os.sep
+        with self._lock:
+            for cache in (self._keys, self._key_types, self._parse_locks, self._key_dirs):
+                for path in [p for p in cache if p.startswith(prefix) or p == prefix.rstrip(os.sep)]:
+                    del cache[path]
+        logger.info(f"Dropped cached SSH keys for {username}")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            misses = self.stats['misses']
+            return {
+                'keys': len(self._keys),
+                'hits': self.stats['hits'],
+                'misses': misses,
+                'invalidations': self.stats['invalidations'],
+                'avg_parse_ms': round(self.stats['parse_seconds'] / misses * 1000, 2) if misses else 0.0,
+            }
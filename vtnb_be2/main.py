@@ -5,6 +5,7 @@ Clean separation of concerns with JWT and session authentication
 """
 import asyncio
 import logging
+import os
 import time
 from pathlib import Path
 
@@ -20,6 +21,9 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from routes.auth_module import AuthenticationManager
 from workspace_manager import WorkspaceManager
 from routes.connection_handlers import ConnectionHandlers
+from routes.jwt_handler import jwt_handler
+from server_launcher import launch
+from terminal_protocol import TerminalStream
 
 # Import JWT utilities
 from routes.auth_dependencies import AuthDependencies
@@ -29,6 +33,12 @@ from routes.auth import create_auth_routes
 from routes.sessions import create_sessions_routes
 from routes.netbox import create_netbox_routes
 from routes.system import create_system_routes
+from routes.metrics import create_metrics_routes
+from routes.scrollback import create_scrollback_routes
+from routes.recordings import create_recordings_routes
+from routes.screen import create_screen_routes
+from routes.admin import create_admin_routes
+from routes.hosts import create_hosts_routes
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -111,12 +121,26 @@ class VelociTermBackend:
             version="0.5.0"
         )
 
+        # Load configuration (now includes CORS, auth, etc.)
+        self.auth_config = self.load_auth_config(config_path)
+
         # Initialize core managers
         self.workspace_manager = WorkspaceManager()
-        self.connection_handlers = ConnectionHandlers(self.workspace_manager)
+        self.connection_handlers = ConnectionHandlers(
+            self.workspace_manager,
+            self.auth_config.get('ssh', {}),
+            self.auth_config.get('detach', {}),
+            self.auth_config.get('scrollback', {}),
+            self.auth_config.get('recording', {}),
+            self.auth_config.get('output_scheduler', {}),
+            self.auth_config.get('state', {}),
+            self.auth_config.get('reaper', {})
+        )
 
-        # Load configuration (now includes CORS, auth, etc.)
-        self.auth_config = self.load_auth_config(config_path)
+        # Workers sharing login state must also share a generated JWT signing key
+        if self.connection_handlers.state.backend != 'memory' and not os.getenv("JWT_SECRET_KEY"):
+            jwt_handler.secret_key = self.connection_handlers.state.setdefault('secrets', 'jwt',
+                                                                               jwt_handler.secret_key)
 
         # Initialize auth manager with auth section of config
         auth_section = self.auth_config.get('authentication', {})
@@ -151,12 +175,25 @@ class VelociTermBackend:
         sessions_router = create_sessions_routes(self.workspace_manager, get_current_user_flexible)
         netbox_router = create_netbox_routes(self.workspace_manager, get_current_user_flexible)
         system_router = create_system_routes(self.workspace_manager, get_current_user_flexible)
+        admin_users = (self.auth_config.get('reaper', {}) or {}).get('admin_users')
+        metrics_router = create_metrics_routes(self.connection_handlers, get_current_user_flexible, admin_users)
+        scrollback_router = create_scrollback_routes(self.connection_handlers, get_current_user_flexible)
+        recordings_router = create_recordings_routes(self.connection_handlers, get_current_user_flexible)
+        screen_router = create_screen_routes(self.connection_handlers, get_current_user_flexible)
+        admin_router = create_admin_routes(self.connection_handlers, get_current_user_flexible, admin_users)
+        hosts_router = create_hosts_routes(self.connection_handlers, get_current_user_flexible, admin_users)
 
         # Include routers in the main app
         self.app.include_router(auth_router)
         self.app.include_router(sessions_router)
         self.app.include_router(netbox_router)
         self.app.include_router(system_router)
+        self.app.include_router(metrics_router)
+        self.app.include_router(scrollback_router)
+        self.app.include_router(recordings_router)
+        self.app.include_router(screen_router)
+        self.app.include_router(admin_router)
+        self.app.include_router(hosts_router)
 
     def setup_window_management(self):
         """Setup window management routes (session-based for WebSocket compatibility)"""
@@ -205,28 +242,51 @@ class VelociTermBackend:
             """WebSocket handler for SSH terminals (session-based auth)"""
             logger.info(f"WebSocket connection attempt for window {window_id}")
 
+            # JSON (v1) or binary (v2) framing, negotiated via subprotocol
+            stream = TerminalStream(websocket, output_type='ssh_output', window_id=window_id)
+            detach = False
+
             try:
-                await websocket.accept()
+                await stream.accept()
                 logger.info(f"WebSocket accepted for {window_id}")
 
+                # With several workers, the window's SSH session lives in exactly one of them. Websockets
+                # are not routed between workers, so reattaching only works when it lands on that one.
+                owner_pid = self.connection_handlers.window_tracker.claim_window(window_id)
+                if owner_pid is not None:
+                    logger.info(f"Window {window_id} is held by worker {owner_pid} - refusing reattach here")
+                    await stream.send_json({
+                        'type': 'error',
+                        'message': 'This session is held by another server worker; '
+                                   'reattaching needs a single worker (server.workers: 1)'
+                    })
+                    await websocket.close(code=4409, reason=f"Window served by worker {owner_pid}")
+                    return
+
+                # Workspace user of the login session cookie; windows and their history belong to it
+                session_user = self.connection_handlers.get_websocket_user(websocket)
+
                 # Initialize SSH manager
-                await self.connection_handlers.ssh_manager.create_client(window_id)
+                await self.connection_handlers.ssh_manager.create_client(window_id, stream, session_user)
 
                 # Start output listener
                 listen_task = asyncio.create_task(
-                    self.connection_handlers.ssh_manager.listen_to_ssh_output(window_id, websocket)
+                    self.connection_handlers.ssh_manager.listen_to_ssh_output(window_id, stream)
                 )
 
                 # Send initial status
-                await websocket.send_json({
+                await stream.send_json({
                     'type': 'status',
-                    'message': 'WebSocket connected successfully'
+                    'message': 'WebSocket connected successfully',
+                    'protocol': stream.protocol
                 })
 
                 # Main message loop
                 while True:
                     try:
-                        data = await websocket.receive_json()
+                        data = await stream.receive()
+                        if not data:
+                            continue
 
                         if data.get('type') == 'connect':
                             ssh_username = data.get('username')  # SSH device username
@@ -239,32 +299,30 @@ class VelociTermBackend:
                             # NEW: Get SSH key file path instead of loading bytes
                             ssh_key_path = None
                             if velociterm_user:
-                                from pathlib import Path
-                                key_dir = Path("./workspaces") / velociterm_user / "ssh_key"
-
-                                logger.info(f"Looking for SSH key in: {key_dir}")
-
-                                # Try common key files in order
-                                for key_filename in ["id_rsa", "id_ed25519", "id_ecdsa"]:
-                                    key_path = key_dir / key_filename
-                                    if key_path.exists():
-                                        ssh_key_path = str(key_path)
-                                        logger.info(f"✓ Found SSH key: {ssh_key_path}")
-                                        break
-
-                                if not ssh_key_path:
-                                    logger.info(f"No SSH key found in {key_dir}")
+                                # One stat of the key dir; the listing is cached until it changes
+                                ssh_key_path = self.connection_handlers.key_cache.find_user_key(velociterm_user)
+                                if ssh_key_path:
+                                    logger.info(f"✓ Found SSH key: {ssh_key_path}")
+                                else:
+                                    logger.info(f"No SSH key found for {velociterm_user}")
                             else:
                                 logger.warning("No VelociTerm user provided - cannot locate SSH key")
 
-                            await self.connection_handlers.ssh_manager.connect(
+                            # Connect in the background so a closed websocket cancels it
+                            self.connection_handlers.ssh_manager.start_connect(
                                 window_id,
                                 data.get('hostname'),
                                 data.get('port', 22),
                                 ssh_username,  # SSH device username
                                 data.get('password'),
-                                websocket,
-                                ssh_key_path=ssh_key_path  # Pass PATH instead of bytes
+                                stream,
+                                ssh_key_path=ssh_key_path,  # Pass PATH instead of bytes
+                                # Windows, transports and scrollback belong to the logged-in user only;
+                                # velociterm_user is client-supplied
+                                owner=session_user,
+                                # Algorithm profile: per session, else per device type, else default
+                                profile=data.get('ssh_profile'),
+                                device_type=data.get('device_type')
                             )
 
                         elif data.get('type') == 'input':
@@ -277,8 +335,18 @@ class VelociTermBackend:
                                 window_id, data.get('cols', 80), data.get('rows', 24)
                             )
 
-                    except WebSocketDisconnect:
-                        logger.info(f"WebSocket disconnected for {window_id}")
+                        elif data.get('type') in ('scrollback_fetch', 'scrollback_search'):
+                            await self.connection_handlers.answer_scrollback_request(stream, window_id, data,
+                                                                                     session_user)
+
+                        elif data.get('type') == 'screen_snapshot':
+                            await self.connection_handlers.answer_screen_request(stream, window_id, data,
+                                                                                 session_user)
+
+                    except WebSocketDisconnect as disconnect:
+                        logger.info(f"WebSocket disconnected for {window_id} (code {disconnect.code})")
+                        # Anything but a deliberate close (reload, sleep, proxy timeout) may be resumed
+                        detach = disconnect.code != 1000
                         break
                     except Exception as msg_error:
                         logger.error(f"WebSocket message error: {msg_error}")
@@ -306,9 +374,44 @@ class VelociTermBackend:
                             await listen_task
                         except asyncio.CancelledError:
                             pass
-                    await self.connection_handlers.ssh_manager.disconnect(window_id)
+                    await self.connection_handlers.ssh_manager.release(window_id, stream, detach=detach)
                 except:
                     pass
+
+        @self.app.websocket("/ws/playback/{recording_id}")
+        async def websocket_playback(websocket: WebSocket, recording_id: str):
+            """Replay one of the session user's recordings (session-based auth)"""
+            stream = TerminalStream(websocket, output_type='ssh_output')
+            playback = self.connection_handlers.playback
+            player = None
+
+            try:
+                await stream.accept()
+
+                username = self.connection_handlers.get_websocket_user(websocket)
+                path = playback.recording_path(username, recording_id) if username else None
+                player = await playback.open_player(stream, path, websocket.query_params.get('speed', 1)) \
+                    if path else None
+                if player is None:
+                    await stream.send_json({'type': 'error', 'message': 'Recording not found'})
+                    await stream.close(code=1008)
+                    return
+
+                logger.info(f"Playback of {recording_id} for {username}")
+                await player.start()
+
+                while True:
+                    data = await stream.receive()
+                    if data:
+                        await player.handle(data)
+
+            except WebSocketDisconnect:
+                logger.info(f"Playback websocket for {recording_id} closed")
+            except Exception as e:
+                logger.error(f"Playback of {recording_id} failed: {e}")
+            finally:
+                if player is not None:
+                    await player.close()
     def setup_static_files(self):
         """Setup static file serving for React build"""
         static_dir = Path("static")
@@ -375,7 +478,14 @@ class VelociTermBackend:
                     "sessions": "/api/sessions/*",
                     "netbox": "/api/netbox/*",
                     "system": "/api/system/*",
-                    "websockets": "/ws/terminal/{window_id}"
+                    "metrics": "/api/metrics/*",
+                    "scrollback": "/api/scrollback/*",
+                    "recordings": "/api/recordings/*",
+                    "screen": "/api/screen/{window_id}",
+                    "admin": "/api/admin/resources",
+                    "hosts": "/api/hosts/health",
+                    "websockets": "/ws/terminal/{window_id}",
+                    "playback": "/ws/playback/{recording_id}"
                 }
             }
 
@@ -418,13 +528,22 @@ def create_app() -> FastAPI:
 app = create_app()
 
 
-def run_server():
-    """Run the backend server"""
+def run_server(config_path: str = "config.yaml"):
+    """Run the backend server (production unless server.reload is set)"""
+    import yaml
+
+    config = {}
+    if Path(config_path).exists():
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f) or {}
+    server_config = config.get('server', {}) or {}
+    base_url = f"http://localhost:{server_config.get('port', 8050)}"
+
     print("Starting VelociTerm Backend v0.5.0...")
     print("Authentication: JWT + Session dual support")
-    print("Backend API: http://localhost:8050")
-    print("API Documentation: http://localhost:8050/docs")
-    print("Health Check: http://localhost:8050/api/health")
+    print(f"Backend API: {base_url}")
+    print(f"API Documentation: {base_url}/docs")
+    print(f"Health Check: {base_url}/api/health")
     print("")
     print("JWT Endpoints:")
     print("  Token Login:  POST /api/auth/token")
@@ -436,13 +555,7 @@ def run_server():
     print("  Session Login: POST /api/auth/login")
     print("  Auth Status:   GET /api/auth/status")
 
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8050,
-        reload=True,
-        log_level="info"
-    )
+    launch(config)
 
 
 if __name__ == "__main__":
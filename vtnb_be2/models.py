@@ -193,6 +193,7 @@ class SessionData(BaseModel):
     port: int
     username: Optional[str] = None
     device_type: Optional[str] = "Server"
+    ssh_profile: Optional[str] = None  # SSH algorithm profile; None = by device type
     status: str = "disconnected"
 
     id: Optional[str] = None
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Fair output scheduling across terminal windows sharing one event loop
+Deficit round robin over bulk output, with interactive traffic let straight through
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Queueing-delay samples kept per window (and per traffic class) for percentiles
+DELAY_SAMPLES = 1024
+
+
+def _delay_summary(samples) -> Dict:
+    if not samples:
+        return {'count': 0, 'avg_ms': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    ordered = sorted(samples)
+    count = len(ordered)
+    return {
+        'count': count,
+        'avg_ms': round(sum(ordered) / count * 1000, 3),
+        'p50_ms': round(ordered[count // 2] * 1000, 3),
+        'p99_ms': round(ordered[min(count - 1, int(count * 0.99))] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+class OutputFlow:
+    """One window's share of the output scheduler"""
+
+    def __init__(self, window_id: str, kind: str):
+        self.window_id = window_id
+        self.kind = kind
+        self.deficit = 0
+        self.request = 0
+        self.waiter: Optional[asyncio.Future] = None
+        self.closed = False
+
+        # Recent output rate (bytes/s, decaying) decides whether traffic is interactive
+        self.rate = 0.0
+        self._rate_at = time.monotonic()
+
+        self.delays: Deque[float] = deque(maxlen=DELAY_SAMPLES)
+        self.stats = {'grants': 0, 'bytes': 0, 'interactive_grants': 0, 'interactive_bytes': 0}
+
+    def note(self, size: int, now: float, half_life: float = 0.5):
+        # Exponentially decaying rate: a steady stream of R bytes/s converges to R
+        elapsed = max(0.0, now - self._rate_at)
+        self._rate_at = now
+        self.rate = self.rate * 0.5 ** (elapsed / half_life) + size * math.log(2) / half_life
+
+    def get_stats(self) -> Dict:
+        return {
+            'kind': self.kind,
+            'rate_bytes_per_second': round(self.rate),
+            'deficit': self.deficit,
+            'waiting': self.waiter is not None,
+            **self.stats,
+            'queueing_delay': _delay_summary(self.delays),
+        }
+
+
+class OutputScheduler:
+    """Deficit round robin over windows' output chunks
+
+    Every window's sender asks for a grant before it processes a chunk of
+    output. Small chunks from windows with a low recent output rate (echo,
+    prompts, TUI redraws) are granted at once. Anything else waits for its
+    turn: each round a backlogged window earns quantum bytes of credit and is
+    served for as many chunks as its credit covers, one grant per step with a
+    yield in between, so a window dumping a huge file gets the same byte share as
+    any other busy window and never holds the loop for more than one chunk.
+    """
+
+    def __init__(self, enabled: bool = True, quantum: int = 16384, interactive_bytes: int = 1024,
+                 interactive_rate: int = 65536):
+        self.enabled = enabled
+        self.quantum = quantum
+        self.interactive_bytes = interactive_bytes
+        self.interactive_rate = interactive_rate
+
+        self.flows: Dict[OutputFlow, None] = {}
+        self._active: Deque[OutputFlow] = deque()
+        # Flow whose visit is in progress: served again while its credit lasts
+        self._current: Optional[OutputFlow] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self._interactive_delays: Deque[float] = deque(maxlen=DELAY_SAMPLES)
+        self._bulk_delays: Deque[float] = deque(maxlen=DELAY_SAMPLES)
+        self.stats = {'rounds': 0, 'grants': 0, 'interactive_grants': 0, 'bulk_grants': 0}
+
+    def register(self, window_id: str, kind: str = 'ssh') -> OutputFlow:
+        flow = OutputFlow(window_id, kind)
+        self.flows[flow] = None
+        return flow
+
+    def unregister(self, flow: Optional[OutputFlow]):
+        if flow is None:
+            return
+        flow.closed = True
+        self.flows.pop(flow, None)
+        if self._current is flow:
+            self._current = None
+        if flow in self._active:
+            self._active.remove(flow)
+        if flow.waiter is not None and not flow.waiter.done():
+            flow.waiter.cancel()
+        flow.waiter = None
+
+    async def acquire(self, flow: OutputFlow, size: int):
+        """Wait for flow's turn to process size bytes of output"""
+        now = time.monotonic()
+        interactive = size <= self.interactive_bytes and flow.rate < self.interactive_rate
+        flow.note(size, now)
+
+        if interactive or not self.enabled or flow.closed:
+            self._record(flow, size, 0.0, interactive=True)
+            return
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            self._task.set_name("output_scheduler")
+
+        flow.request = size
+        flow.waiter = asyncio.get_running_loop().create_future()
+        if flow is self._current:
+            # Back for more during its own visit: it stays at the head
+            self._active.appendleft(flow)
+        else:
+            self._active.append(flow)
+        self._wake.set()
+
+        try:
+            await flow.waiter
+        except asyncio.CancelledError:
+            if flow in self._active:
+                self._active.remove(flow)
+            raise
+        finally:
+            flow.waiter = None
+
+        self._record(flow, size, time.monotonic() - now, interactive=False)
+
+    async def _run(self):
+        while True:
+            if not self._active:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            flow = self._active[0]
+            if flow.waiter is None or flow.waiter.done():
+                self._active.popleft()
+                continue
+
+            # One visit = one quantum of credit, spent on as many chunks as it covers
+            if flow is not self._current:
+                self._current = flow
+                flow.deficit += self.quantum
+                self.stats['rounds'] += 1
+            if flow.deficit < flow.request:
+                self._current = None
+                self._active.rotate(-1)
+                continue
+
+            self._active.popleft()
+            # Unused credit is capped so a window cannot bank a burst
+            flow.deficit = min(flow.deficit - flow.request, self.quantum)
+            flow.waiter.set_result(None)
+
+            # Let the granted sender (and anything interactive) run before the next grant
+            await asyncio.sleep(0)
+
+    def _record(self, flow: OutputFlow, size: int, delay: float, interactive: bool):
+        flow.stats['grants'] += 1
+        flow.stats['bytes'] += size
+        flow.delays.append(delay)
+        self.stats['grants'] += 1
+        if interactive:
+            flow.stats['interactive_grants'] += 1
+            flow.stats['interactive_bytes'] += size
+            self.stats['interactive_grants'] += 1
+            self._interactive_delays.append(delay)
+        else:
+            self.stats['bulk_grants'] += 1
+            self._bulk_delays.append(delay)
+
+    def get_window_stats(self) -> List[Dict]:
+        return [{'window_id': flow.window_id, **flow.get_stats()} for flow in self.flows]
+
+    def get_stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'quantum': self.quantum,
+            'windows': len(self.flows),
+            'backlogged': len(self._active),
+            **self.stats,
+            'interactive_delay': _delay_summary(self._interactive_delays),
+            'bulk_delay': _delay_summary(self._bulk_delays),
+        }
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Idle and orphaned window reaping with per-window resource accounting
+One timer wheel covers SSH, TUI and Ansible windows plus the periodic state/temp-file sweeps
+"""
+
+import asyncio
+import logging
+import math
+import time
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Reap reason for an SSH session whose remote shell is gone (the browser was already told)
+SESSION_ENDED = 'SSH session ended'
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule and cancel, one slot visited per tick
+
+    A timer further out than one revolution carries a rounds count and is
+    only due once its slot has come round that many more times. Timers
+    never fire early; they fire up to one tick late.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 512):
+        self.tick = tick
+        self.slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._cursor = 0
+        self.next_tick = time.monotonic() + tick
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+
+    def schedule(self, key: Hashable, delay: float):
+        """(Re)arm key to come due after delay seconds"""
+        self.cancel(key)
+        ticks = max(0, math.ceil((delay - (self.next_tick - time.monotonic())) / self.tick))
+        rounds, offset = divmod(ticks, len(self.slots))
+        slot = (self._cursor + offset) % len(self.slots)
+        self.slots[slot][key] = rounds
+        self._slot_of[key] = slot
+
+    def cancel(self, key: Hashable):
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self.slots[slot].pop(key, None)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Turn the wheel up to now; return the keys that came due"""
+        due = []
+        while now >= self.next_tick:
+            slot = self.slots[self._cursor]
+            for key, rounds in list(slot.items()):
+                if rounds:
+                    slot[key] = rounds - 1
+                else:
+                    del slot[key]
+                    del self._slot_of[key]
+                    due.append(key)
+            self._cursor = (self._cursor + 1) % len(self.slots)
+            self.next_tick += self.tick
+        return due
+
+
+class ResourceReaper:
+    """Closes idle and orphaned windows and accounts for what each one holds
+
+    Every SSH, TUI and Ansible window is armed on the timer wheel when it is
+    created. When its timer comes due the window is inspected once: it is
+    closed if it has been idle past its type's timeout, never got a
+    connected SSH session, lost its process or websocket, or has ended;
+    otherwise it is re-armed for when it could next expire. Windows that
+    are gone are simply forgotten, so the reaper never scans the
+    registries. The same wheel drives the sweeps of expired login
+    sessions, stale window records and leftover Ansible inventories.
+    """
+
+    def __init__(self, handlers, enabled: bool = True, tick: float = 1.0,
+                 idle_timeouts: Optional[Dict[str, float]] = None, connect_timeout: float = 300.0,
+                 orphan_check: float = 60.0, sweep_interval: float = 300.0,
+                 temp_dir: Optional[Path] = None, temp_max_age: float = 3600.0):
+        self.handlers = handlers
+        self.enabled = enabled
+        self.idle_timeouts = {'ssh': 0.0, 'tui': 0.0, 'ansible': 0.0, **(idle_timeouts or {})}
+        self.connect_timeout = connect_timeout
+        self.orphan_check = orphan_check
+        self.sweep_interval = sweep_interval
+        self.temp_dir = temp_dir
+        self.temp_max_age = temp_max_age
+
+        self.wheel = TimerWheel(tick)
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {'checks': 0, 'sweeps': 0, 'sessions_purged': 0, 'temp_files_removed': 0,
+                      'reaped': {'ssh': 0, 'tui': 0, 'ansible': 0}}
+
+    def start(self):
+        """Start the wheel (idempotent; needs a running event loop)"""
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self.wheel.schedule(('job', 'sweep'), self.sweep_interval)
+        self._task = asyncio.create_task(self._run())
+        self._task.set_name("resource_reaper")
+
+    def watch(self, kind: str, window_id: str):
+        """Arm the first check for a new window of kind ssh, tui or ansible"""
+        if not self.enabled:
+            return
+        self.start()
+        first = [t for t in (self.orphan_check, self.idle_timeouts.get(kind, 0.0),
+                             self.connect_timeout if kind == 'ssh' else 0.0) if t]
+        self.wheel.schedule((kind, window_id), min(first) if first else self.orphan_check)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(max(0.0, self.wheel.next_tick - time.monotonic()))
+            for kind, name in self.wheel.advance(time.monotonic()):
+                try:
+                    if kind == 'job':
+                        await self._sweep()
+                        self.wheel.schedule(('job', 'sweep'), self.sweep_interval)
+                    else:
+                        await self._check(kind, name)
+                except Exception as e:
+                    logger.error(f"Reaper check of {kind} {name} failed: {e}")
+
+    async def _check(self, kind: str, window_id: str):
+        self.stats['checks'] += 1
+        inspect = getattr(self, f'_inspect_{kind}')
+        verdict = inspect(window_id, time.monotonic())
+        if verdict is None:
+            # Window closed normally - nothing to track
+            return
+
+        reason, delay = verdict
+        if reason is None:
+            self.wheel.schedule((kind, window_id), delay)
+            return
+
+        logger.info(f"Reaping {kind} window {window_id}: {reason}")
+        if kind == 'ssh':
+            await self.handlers.ssh_manager.reap(window_id, reason, notify=reason != SESSION_ENDED)
+        elif kind == 'tui':
+            await self.handlers.reap_tui(window_id, reason)
+        else:
+            await self.handlers.reap_ansible(window_id, reason)
+        self.stats['reaped'][kind] += 1
+
+    def _next_check(self, *remaining: float) -> Tuple[None, float]:
+        return None, min([self.orphan_check] + [r for r in remaining if r > 0])
+
+    def _idle_verdict(self, kind: str, since: float, now: float, what: str = 'idle'):
+        timeout = self.idle_timeouts.get(kind, 0.0)
+        if timeout:
+            idle = now - since
+            if idle >= timeout:
+                return f"{what} for {idle:.0f}s (limit {timeout:.0f}s)", 0.0
+            return self._next_check(timeout - idle)
+        return self._next_check()
+
+    def _inspect_ssh(self, window_id: str, now: float):
+        ssh = self.handlers.ssh_manager
+        client_data = ssh.clients.get(window_id)
+        if client_data is None:
+            # Detached sessions are closed by their detach grace timer
+            return self._next_check() if window_id in ssh.detached else None
+
+        if not client_data.get('connected'):
+            connect_task = client_data.get('connect_task')
+            if connect_task is not None and not connect_task.done():
+                # Queued or mid-handshake: admission and connect timeouts bound this
+                return self._next_check()
+            waited = now - client_data['created_at']
+            if self.connect_timeout and waited >= self.connect_timeout:
+                return f"no SSH session after {waited:.0f}s", 0.0
+            return self._next_check(self.connect_timeout - waited if self.connect_timeout else 0)
+
+        pipeline = client_data.get('pipeline')
+        if pipeline is not None and pipeline.done():
+            return SESSION_ENDED, 0.0
+
+        return self._idle_verdict('ssh', client_data['last_activity'], now)
+
+    def _inspect_tui(self, window_id: str, now: float):
+        entry = self.handlers.tui_processes.get(window_id)
+        if entry is None or 'output' not in entry:
+            return None
+        if not entry['process'].isalive():
+            return "process exited", 0.0
+        if entry.get('handler') is None and 'detach_timer' not in entry:
+            return "no websocket attached", 0.0
+        return self._idle_verdict('tui', entry['last_activity'], now)
+
+    def _inspect_ansible(self, key: str, now: float):
+        entry = self.handlers.tui_processes.get(key)
+        if entry is None:
+            return None
+        if not entry['process'].isalive():
+            return "playbook finished", 0.0
+        # A playbook run has no input - its timeout is a run time limit
+        return self._idle_verdict('ansible', entry['created_at'], now, what='running')
+
+    async def _sweep(self):
+        """Purge expired login sessions and window records, remove leftover inventories"""
+        self.stats['sweeps'] += 1
+        self.stats['sessions_purged'] += self.handlers.window_tracker.cleanup_stale_windows()
+        removed = await asyncio.to_thread(self._remove_temp_files)
+        self.stats['temp_files_removed'] += removed
+        if removed:
+            logger.info(f"Removed {removed} leftover Ansible inventory file(s)")
+
+    def _remove_temp_files(self) -> int:
+        if self.temp_dir is None or not self.temp_dir.is_dir():
+            return 0
+        running = {key[len('ansible_'):] for key in list(self.handlers.tui_processes) if key.startswith('ansible_')}
+        cutoff = time.time() - self.temp_max_age
+        removed = 0
+        for path in self.temp_dir.glob('inventory_*.yml'):
+            if path.stem[len('inventory_'):] in running:
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    # --- accounting ---
+
+    def _account_ssh(self, window_id: str, client_data: Dict, detached: bool, now: float) -> Dict:
+        channel = client_data.get('channel')
+        pooled = client_data.get('pooled')
+        output = client_data.get('output')
+        output_queue = client_data.get('output_queue')
+        coalescer = client_data.get('coalescer')
+        writer = client_data.get('input_writer')
+        pipeline = client_data.get('pipeline')
+        # Proxy channels from an SSH worker process hold no local descriptors
+        worker = getattr(channel, 'worker', None)
+
+        if detached:
+            state = 'detached'
+        elif not client_data.get('connected'):
+            state = 'connecting'
+        elif pipeline is not None and pipeline.done():
+            state = 'ended'
+        else:
+            state = 'connected'
+
+        transport = None
+        if pooled is not None:
+            transport = {'id': f"{id(pooled):x}", 'target': pooled.describe(), 'windows': pooled.refcount,
+                         'alive': pooled.is_alive()}
+        elif worker is not None:
+            transport = {'id': f"worker-{worker.index}", 'target': f"{client_data.get('username')}@"
+                                                                 f"{client_data.get('hostname')}",
+                         'windows': None, 'alive': worker.alive}
+
+        return {
+            'window_id': window_id,
+            'type': 'ssh',
+            'user': client_data.get('owner'),
+            'state': state,
+            'target': f"{client_data.get('username')}@{client_data.get('hostname')}"
+            if client_data.get('hostname') else None,
+            'age_seconds': round(now - client_data['created_at'], 1),
+            'idle_seconds': round(now - client_data['last_activity'], 1),
+            # paramiko backs Channel.fileno() (used by the channel pump) with a pipe pair
+            'fds': 2 if getattr(channel, '_pipe', None) is not None else 0,
+            'buffered_bytes': ((output_queue.queued_bytes if output_queue else 0)
+                               + (coalescer.pending_bytes if coalescer else 0)
+                               + (output.get_stats()['buffered_bytes'] if output else 0)
+                               + (writer.get_stats()['pending_bytes'] if writer else 0)),
+            'child_pids': [worker.process.pid] if worker is not None and worker.process else [],
+            'transport': transport,
+        }
+
+    def _account_process(self, key: str, entry: Dict, now: float) -> Dict:
+        child = entry['process']
+        alive = child.isalive()
+        output = entry.get('output')
+        if entry['tool'] == 'ansible_web_runner':
+            kind, window_id = 'ansible', key[len('ansible_'):]
+            state = 'running' if alive else 'finished'
+        else:
+            kind, window_id = 'tui', key
+            state = 'exited' if not alive else 'detached' if entry.get('handler') is None else 'attached'
+        return {
+            'window_id': window_id,
+            'type': kind,
+            'user': entry.get('owner'),
+            'state': state,
+            'target': entry['tool'],
+            'age_seconds': round(now - entry['created_at'], 1),
+            'idle_seconds': round(now - entry.get('last_activity', entry['created_at']), 1),
+            # The pty master
+            'fds': 1 if alive else 0,
+            'buffered_bytes': output.get_stats()['buffered_bytes'] if output else 0,
+            'child_pids': [child.pid] if alive else [],
+            'transport': None,
+        }
+
+    def snapshot(self, user: Optional[str] = None) -> Dict:
+        """What every user (or just user) holds: windows, descriptors, buffers, processes, transports"""
+        now = time.monotonic()
+        ssh = self.handlers.ssh_manager
+        windows = [self._account_ssh(wid, data, False, now) for wid, data in list(ssh.clients.items())]
+        windows += [self._account_ssh(wid, data, True, now) for wid, data in list(ssh.detached.items())]
+        windows += [self._account_process(key, entry, now) for key, entry in list(self.handlers.tui_processes.items())
+                    if 'created_at' in entry]
+
+        sessions: Dict[str, int] = {}
+        for _, session in self.handlers.state.items('sessions'):
+            sessions[session['username']] = sessions.get(session['username'], 0) + 1
+
+        users: Dict[str, Dict] = {}
+        for window in windows:
+            name = window['user'] or '-'
+            if user is not None and name != user:
+                continue
+            users.setdefault(name, {'windows': []})['windows'].append(window)
+        for name, count in sessions.items():
+            if user is None or name == user:
+                users.setdefault(name, {'windows': []})['login_sessions'] = count
+
+        for name, held in users.items():
+            held.setdefault('login_sessions', 0)
+            held['totals'] = self._totals(held['windows'])
+
+        return {
+            'process': self._process_stats(),
+            'totals': self._totals([w for held in users.values() for w in held['windows']]),
+            'users': users,
+        }
+
+    @staticmethod
+    def _totals(windows: List[Dict]) -> Dict:
+        transports = {w['transport']['id']: w['transport'] for w in windows if w['transport']}
+        # Each in-process transport holds one socket, shared by its windows
+        local_transports = sum(1 for t in transports.values() if not t['id'].startswith('worker-'))
+        totals = {'windows': len(windows), 'by_type': {}, 'fds': local_transports, 'buffered_bytes': 0,
+                  'child_pids': [], 'transports': len(transports)}
+        for window in windows:
+            totals['by_type'][window['type']] = totals['by_type'].get(window['type'], 0) + 1
+            totals['fds'] += window['fds']
+            totals['buffered_bytes'] += window['buffered_bytes']
+            totals['child_pids'] += [pid for pid in window['child_pids'] if pid not in totals['child_pids']]
+        return totals
+
+    @staticmethod
+    def _process_stats() -> Dict:
+        process = psutil.Process()
+        try:
+            open_fds = process.num_fds()
+        except AttributeError:
+            # Windows has handles, not descriptors
+            open_fds = None
+        return {'pid': process.pid, 'open_fds': open_fds, 'rss_bytes': process.memory_info().rss,
+                'children': len(process.children())}
+
+    def get_stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'tick_seconds': self.wheel.tick,
+            'idle_timeouts': dict(self.idle_timeouts),
+            'connect_timeout': self.connect_timeout,
+            'timers': len(self.wheel),
+            **self.stats,
+        }
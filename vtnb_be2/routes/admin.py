@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+routes/admin.py
+Admin Routes - what each user's windows hold on this worker
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends
+import logging
+
+from .connection_handlers import ConnectionHandlers
+
+logger = logging.getLogger(__name__)
+
+
+def create_admin_routes(connection_handlers: ConnectionHandlers, get_current_user,
+                        admin_users: Optional[List[str]] = None):
+    """Factory function to create admin routes with dependencies
+
+    Only admin_users see every user's resources; everyone else (everyone, when
+    none are configured) only sees their own.
+    """
+
+    router = APIRouter(prefix="/api/admin", tags=["admin"])
+    admins = set(admin_users or [])
+
+    @router.get("/resources")
+    async def get_resources(user: Optional[str] = None, username: str = Depends(get_current_user)):
+        """Get per-user windows, descriptors, buffered bytes, child processes and transports"""
+        if username not in admins:
+            user = username
+        return {
+            **connection_handlers.reaper.snapshot(user),
+            'reaper': connection_handlers.reaper.get_stats()
+        }
+
+    return router
@@ -13,7 +13,8 @@ import logging
 import time
 import secrets
 import yaml
-from typing import Dict, Optional, Set
+from functools import partial
+from typing import Dict, Optional, Set, Tuple
 from pathlib import Path
 from urllib.parse import parse_qs
 
@@ -23,37 +24,65 @@ import pexpect
 from models import *
 from workspace_manager import WorkspaceManager
 from ssh_manager import SSHClientManager
+from terminal_protocol import TerminalStream
+from terminal_input import ResizeDebouncer, join_input
+from terminal_output import DetachableOutput
+from scrollback_store import ScrollbackStore
+from session_recorder import SessionRecorder
+from session_playback import PlaybackService
+from key_cache import PrivateKeyCache
+from output_scheduler import OutputScheduler
+from resource_reaper import ResourceReaper
+from state_store import MemoryStateStore, StateStore, create_state_store, process_alive
 
 logger = logging.getLogger(__name__)
 
 import io
 
+# Inventories for Ansible runs (they hold device credentials)
+ANSIBLE_TEMP_DIR = Path("./temp_ansible")
+
+
 class SimpleWindowTracker:
-    """Simplified window tracking without session authentication"""
+    """Simplified window tracking without session authentication
+
+    Windows live in the shared state store so any worker can see them;
+    the windows this worker serves are also kept locally, so the per-message
+    access check does not touch the store. A window is pinned to the worker
+    holding its SSH session until that session closes.
+    """
 
-    def __init__(self):
-        # window_id -> window_info
+    # last_activity is written back to the store at most this often
+    ACTIVITY_PERSIST_SECONDS = 60
+    WINDOW_TTL_SECONDS = 24 * 3600
+
+    def __init__(self, state: Optional[StateStore] = None):
+        self.state = state or MemoryStateStore()
+        # window_id -> window_info for windows served by this worker
         self.active_windows: Dict[str, dict] = {}
+        self.worker_pid = os.getpid()
 
     def register_window(self, window_id: str, client_ip: str, user_agent: str = None):
         """Register window with basic client info for security"""
-        self.active_windows[window_id] = {
+        window = {
             'window_id': window_id,
             'client_ip': client_ip,
             'user_agent': user_agent or '',
             'created_at': time.time(),
             'last_activity': time.time()
         }
+        self.active_windows[window_id] = window
+        self.state.set('windows', window_id, window, ttl=self.WINDOW_TTL_SECONDS)
         logger.info(f"Registered window {window_id} for client {client_ip}")
         return True
 
     def validate_access(self, window_id: str, client_ip: str) -> bool:
         """Validate window access - same IP address"""
-        if window_id not in self.active_windows:
+        window = self.active_windows.get(window_id) or self.state.get('windows', window_id)
+        if window is None:
             logger.warning(f"Window {window_id} not found")
             return False
-
-        window = self.active_windows[window_id]
+        self.active_windows[window_id] = window
 
         # Basic security: same IP address
         if window['client_ip'] != client_ip:
@@ -61,17 +90,20 @@ class SimpleWindowTracker:
             return False
 
         # Update activity timestamp
-        window['last_activity'] = time.time()
+        now = time.time()
+        if now - window['last_activity'] >= self.ACTIVITY_PERSIST_SECONDS:
+            self.state.set('windows', window_id, {**window, 'last_activity': now}, ttl=self.WINDOW_TTL_SECONDS)
+        window['last_activity'] = now
         return True
 
     def cleanup_window(self, window_id: str):
         """Remove window from tracking"""
-        if window_id in self.active_windows:
-            del self.active_windows[window_id]
+        self.state.delete('windows', window_id)
+        if self.active_windows.pop(window_id, None) is not None:
             logger.info(f"Cleaned up window {window_id}")
 
-    def cleanup_stale_windows(self, max_age_hours: int = 24):
-        """Clean up windows older than max_age_hours"""
+    def cleanup_stale_windows(self, max_age_hours: int = 24) -> int:
+        """Clean up windows older than max_age_hours; return how many expired store entries were purged"""
         cutoff_time = time.time() - (max_age_hours * 3600)
         stale_windows = [
             wid for wid, info in self.active_windows.items()
@@ -81,84 +113,104 @@ class SimpleWindowTracker:
         for window_id in stale_windows:
             self.cleanup_window(window_id)
 
+        # Other workers' windows (and idle login sessions) expire from the shared store by TTL
+        purged = self.state.purge_expired()
+
         if stale_windows:
             logger.info(f"Cleaned up {len(stale_windows)} stale windows")
+        return purged
 
+    def claim_window(self, window_id: str) -> Optional[int]:
+        """Pin window_id to this worker; return the owning worker's pid if another live worker holds it"""
+        owner = self.state.setdefault('window_workers', window_id, self.worker_pid, ttl=self.WINDOW_TTL_SECONDS)
+        if owner == self.worker_pid:
+            return None
+        if process_alive(owner):
+            return owner
 
-class WindowRegistry:
-    """Secure window ownership registry - kept for compatibility"""
+        # Owner crashed - its SSH session is gone, take the window over
+        logger.info(f"Window {window_id} was pinned to dead worker {owner} - claiming it")
+        self.state.set('window_workers', window_id, self.worker_pid, ttl=self.WINDOW_TTL_SECONDS)
+        return None
 
-    def __init__(self):
-        # session_id -> set of window_ids
-        self.session_windows: Dict[str, Set[str]] = {}
-        # window_id -> session_id
-        self.window_owners: Dict[str, str] = {}
+    def release_window(self, window_id: str):
+        """Unpin a window whose SSH session has closed on this worker"""
+        if self.state.get('window_workers', window_id) == self.worker_pid:
+            self.state.delete('window_workers', window_id)
 
-    def register_window(self, session_id: str, window_id: str) -> bool:
-        """Register a window for a session"""
-        # Remove from previous owner if exists
-        if window_id in self.window_owners:
-            old_session = self.window_owners[window_id]
-            if old_session in self.session_windows:
-                self.session_windows[old_session].discard(window_id)
 
-        # Register with new session
-        if session_id not in self.session_windows:
-            self.session_windows[session_id] = set()
+class WindowRegistry:
+    """Secure window ownership registry - kept for compatibility"""
 
-        self.session_windows[session_id].add(window_id)
-        self.window_owners[window_id] = session_id
+    def __init__(self, state: Optional[StateStore] = None, ttl: float = 3600):
+        self.state = state or MemoryStateStore()
+        self.ttl = ttl
 
+    def register_window(self, session_id: str, window_id: str) -> bool:
+        """Register a window for a session (replacing any previous owner)"""
+        self.state.set('window_sessions', window_id, session_id, ttl=self.ttl)
         logger.info(f"Registered window {window_id} for session {session_id}")
         return True
 
     def validate_window_access(self, session_id: str, window_id: str) -> bool:
         """Validate that session owns the window"""
-        return self.window_owners.get(window_id) == session_id
+        return session_id is not None and self.state.get('window_sessions', window_id) == session_id
 
     def cleanup_session(self, session_id: str):
         """Clean up all windows for a session"""
-        if session_id in self.session_windows:
-            windows = self.session_windows[session_id].copy()
-            for window_id in windows:
-                self.window_owners.pop(window_id, None)
-            del self.session_windows[session_id]
+        windows = [window_id for window_id, owner in self.state.items('window_sessions') if owner == session_id]
+        for window_id in windows:
+            self.state.delete('window_sessions', window_id)
+        if windows:
             logger.info(f"Cleaned up {len(windows)} windows for session {session_id}")
 
 
 class SessionManager:
-    """Session management - kept for login compatibility"""
+    """Session management - kept for login compatibility
 
-    def __init__(self):
-        self.active_sessions: Dict[str, SessionInfo] = {}
-        self.window_registry = WindowRegistry()
+    Sessions live in the state store, so with a shared backend a cookie
+    issued by one worker is valid on all of them.
+    """
+
+    # last_activity is written back to the store at most this often
+    ACTIVITY_PERSIST_SECONDS = 10
+
+    def __init__(self, state: Optional[StateStore] = None, session_ttl: float = 3600):
+        self.state = state or MemoryStateStore()
+        self.session_ttl = session_ttl
+        self.window_registry = WindowRegistry(self.state, session_ttl)
 
     def create_session(self, username: str) -> str:
         """Create a new session for a user"""
         session_id = secrets.token_urlsafe(32)
-        self.active_sessions[session_id] = SessionInfo(
+        session = SessionInfo(
             username=username,
             created_at=time.time(),
             last_activity=time.time(),
             session_id=session_id
         )
+        self.state.set('sessions', session_id, session.dict(), ttl=self.session_ttl)
         logger.info(f"Created session {session_id} for user {username}")
         return session_id
 
     def get_session_info(self, session_id: str) -> Optional[SessionInfo]:
         """Get session info and update activity"""
-        if not session_id or session_id not in self.active_sessions:
+        data = self.state.get('sessions', session_id) if session_id else None
+        if data is None:
             return None
 
-        session = self.active_sessions[session_id]
+        session = SessionInfo(**data)
 
-        # Session timeout (1 hour)
-        if time.time() - session.last_activity > 3600:
+        # Session timeout (idle for session_ttl)
+        now = time.time()
+        if now - session.last_activity > self.session_ttl:
             self.invalidate_session(session_id)
             return None
 
-        # Update activity
-        session.last_activity = time.time()
+        # Update activity (sliding expiry)
+        if now - session.last_activity >= self.ACTIVITY_PERSIST_SECONDS:
+            session.last_activity = now
+            self.state.set('sessions', session_id, session.dict(), ttl=self.session_ttl)
         return session
 
     def get_session_user(self, session_id: str) -> Optional[str]:
@@ -168,52 +220,247 @@ class SessionManager:
 
     def invalidate_session(self, session_id: str):
         """Remove a session and cleanup windows"""
-        if session_id in self.active_sessions:
+        if self.state.get('sessions', session_id) is not None:
             self.window_registry.cleanup_session(session_id)
-            del self.active_sessions[session_id]
+            self.state.delete('sessions', session_id)
             logger.info(f"Invalidated session {session_id}")
 
 
 class ConnectionHandlers:
     """Hybrid WebSocket connection handlers - keeps session manager but simplifies WebSocket auth"""
 
-    def __init__(self, workspace_manager: WorkspaceManager):
+    def __init__(self, workspace_manager: WorkspaceManager, ssh_config: Optional[Dict] = None,
+                 detach_config: Optional[Dict] = None, scrollback_config: Optional[Dict] = None,
+                 recording_config: Optional[Dict] = None, scheduler_config: Optional[Dict] = None,
+                 state_config: Optional[Dict] = None, reaper_config: Optional[Dict] = None):
         self.workspace_manager = workspace_manager
-        self.session_manager = SessionManager()  # Keep for login compatibility
-        self.window_tracker = SimpleWindowTracker()  # Use for WebSocket connections
-        self.ssh_manager = SSHClientManager()
+        # Login sessions and window ownership: per process, or shared by all uvicorn workers
+        state_config = state_config or {}
+        self.state = create_state_store(state_config, workspace_manager.base_dir)
+        self.session_manager = SessionManager(  # Keep for login compatibility
+            self.state, session_ttl=float(state_config.get('session_ttl_seconds', 3600))
+        )
+        self.window_tracker = SimpleWindowTracker(self.state)  # Use for WebSocket connections
+        # Earlier versions cached private keys in the (possibly shared, on-disk) store
+        for username, _ in self.state.items('ssh_keys'):
+            self.state.delete('ssh_keys', username)
+        self.scrollback = self._create_scrollback_store(scrollback_config or {})
+        self.key_cache = PrivateKeyCache(workspace_manager.base_dir)
+        # username -> (private key bytes, expires_at); kept out of the state store
+        self.user_ssh_keys: Dict[str, Tuple[bytes, float]] = {}
+        self.recorder = self._create_recorder(recording_config or {})
+        self.playback = self._create_playback((recording_config or {}).get('playback') or {})
+        self.output_scheduler = self._create_output_scheduler(scheduler_config or {})
+        self.ssh_manager = SSHClientManager(ssh_config, detach_config, self.scrollback, self.key_cache,
+                                            self.recorder, self.output_scheduler)
+        # A window stays pinned to this worker until its SSH session is really gone
+        self.ssh_manager.on_session_closed = self.window_tracker.release_window
         self.tui_processes: Dict[str, any] = {}
-        self._cleanup_task = None
-        self.user_ssh_keys: Dict[str, bytes] = {}
+
+        # TUI processes survive a dropped websocket for this long (0 = off)
+        detach_config = detach_config or {}
+        self.detach_grace = float(detach_config.get('grace_seconds', 0))
+        self.detach_buffer_bytes = int(detach_config.get('buffer_bytes', 1048576))
+
+        # Idle/orphaned windows of every type are closed from one timer wheel
+        self.reaper = self._create_reaper(reaper_config or {})
+        self.ssh_manager.on_client_created = partial(self.reaper.watch, 'ssh')
+
+    def _create_scrollback_store(self, config: Dict) -> Optional[ScrollbackStore]:
+        """Server-side scrollback for terminal windows (None when disabled)"""
+        if not config.get('enabled', True):
+            return None
+        return ScrollbackStore(
+            self.workspace_manager.base_dir,
+            memory_budget_bytes=int(config.get('memory_budget_bytes', 67108864)),
+            segment_bytes=int(config.get('segment_bytes', 262144)),
+            spill_bytes=int(config.get('spill_bytes_per_window', 67108864)),
+            compression=config.get('compression', 'auto')
+        )
+
+    def _create_recorder(self, config: Dict) -> Optional[SessionRecorder]:
+        """Opt-in session recording for audit (None when disabled)"""
+        if not config.get('enabled', False):
+            return None
+        return SessionRecorder(
+            self.workspace_manager.base_dir,
+            segment_bytes=int(config.get('segment_bytes', 16777216)),
+            compression=config.get('compression', 'auto'),
+            queue_events=int(config.get('queue_events', 65536)),
+            flush_interval=float(config.get('flush_interval_ms', 500)) / 1000,
+            record_input=bool(config.get('record_input', True))
+        )
+
+    def _create_playback(self, config: Dict) -> PlaybackService:
+        """Playback of existing recordings works even with recording turned off"""
+        return PlaybackService(
+            self.workspace_manager.base_dir,
+            keyframe_interval=float(config.get('keyframe_interval_seconds', 30)),
+            keyframe_bytes=int(config.get('keyframe_bytes', 1048576)),
+            max_speed=float(config.get('max_speed', 64)),
+            idle_limit=float(config.get('idle_limit_seconds', 2)),
+            cached_indexes=int(config.get('cached_indexes', 16))
+        )
+
+    def _create_output_scheduler(self, config: Dict) -> OutputScheduler:
+        """One fair output scheduler shared by SSH, TUI and Ansible windows"""
+        return OutputScheduler(
+            enabled=bool(config.get('enabled', True)),
+            quantum=int(config.get('quantum_bytes', 16384)),
+            interactive_bytes=int(config.get('interactive_max_bytes', 1024)),
+            interactive_rate=int(config.get('interactive_rate_bytes', 65536))
+        )
+
+    def _create_reaper(self, config: Dict) -> ResourceReaper:
+        """Idle-window reaper and periodic sweeps from the reaper config"""
+        idle = config.get('idle_timeouts', {}) or {}
+        return ResourceReaper(
+            self,
+            enabled=bool(config.get('enabled', True)),
+            tick=float(config.get('tick_ms', 1000)) / 1000,
+            idle_timeouts={kind: float(seconds) for kind, seconds in idle.items()},
+            connect_timeout=float(config.get('connect_timeout_seconds', 300)),
+            orphan_check=float(config.get('orphan_check_seconds', 60)),
+            sweep_interval=float(config.get('sweep_interval_seconds', 300)),
+            temp_dir=ANSIBLE_TEMP_DIR,
+            temp_max_age=float(config.get('temp_file_max_age_seconds', 3600))
+        )
 
     def start_background_tasks(self):
         """Start background tasks - call this after the event loop is running"""
-        if self._cleanup_task is None:
-            self._cleanup_task = asyncio.create_task(self._periodic_cleanup())
-
-    async def _periodic_cleanup(self):
-        """Periodically clean up stale windows"""
-        while True:
+        self.reaper.start()
+
+    async def reap_tui(self, window_id: str, reason: str):
+        """Close a TUI window the reaper found idle or orphaned"""
+        entry = self.tui_processes.get(window_id)
+        if entry is None:
+            return
+        handler = entry.get('handler')
+        # An exited process already told its websocket
+        notify = handler is not None and entry['process'].isalive()
+        timer = entry.pop('detach_timer', None)
+        if timer:
+            timer.cancel()
+        await self._close_tui(window_id, entry['process'], entry.get('output_task'))
+
+        if notify:
             try:
-                await asyncio.sleep(3600)  # Every hour
-                self.window_tracker.cleanup_stale_windows()
+                await handler.send_json({'type': 'error', 'message': f'Session closed by server: {reason}'})
+                await handler.close(code=1000, reason=reason[:120])
             except Exception as e:
-                logger.error(f"Cleanup task error: {e}")
+                logger.debug(f"Could not notify reaped TUI window {window_id}: {e}")
+
+    async def reap_ansible(self, key: str, reason: str):
+        """Drop a finished playbook run (or stop one past its run time limit) and its inventory"""
+        entry = self.tui_processes.pop(key, None)
+        if entry is None:
+            return
+        child = entry['process']
+        if child.isalive():
+            try:
+                await entry['handler'].send_json({'type': 'error', 'message': f'Playbook stopped: {reason}'})
+            except Exception:
+                pass
+            child.terminate(force=True)
+        self._remove_inventory(entry.get('inventory'))
+
+    @staticmethod
+    def _remove_inventory(inventory_file: Optional[Path]):
+        if inventory_file is not None:
+            try:
+                inventory_file.unlink()
+            except FileNotFoundError:
+                pass
 
     def set_user_ssh_key(self, username: str, key_data: bytes):
-        """Store SSH key for user's session"""
-        self.user_ssh_keys[username] = key_data
+        """Store SSH key for user's session (process memory only, never the shared state store)"""
+        self.user_ssh_keys[username] = (key_data, time.time() + self.session_manager.session_ttl)
         logger.info(f"Cached SSH key for user {username}")
 
     def get_user_ssh_key(self, username: str) -> Optional[bytes]:
         """Retrieve cached SSH key for user"""
-        return self.user_ssh_keys.get(username)
+        entry = self.user_ssh_keys.get(username)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self.user_ssh_keys[username]
+            return None
+        return entry[0]
 
     def clear_user_ssh_key(self, username: str):
         """Clear SSH key from cache (on logout)"""
-        if username in self.user_ssh_keys:
-            del self.user_ssh_keys[username]
+        if self.user_ssh_keys.pop(username, None) is not None:
             logger.info(f"Cleared SSH key for user {username}")
+        # Parsed keys and authenticated transports kept around for quick reopen go with the login
+        self.ssh_manager.forget_user(username)
+
+    def register_window(self, session_id: str, window_id: str) -> bool:
+        """Record that a login session owns window_id"""
+        return self.session_manager.window_registry.register_window(session_id, window_id)
+
+    def validate_window_access(self, session_id: str, window_id: str) -> bool:
+        """True if the login session owns window_id"""
+        return self.session_manager.window_registry.validate_window_access(session_id, window_id)
+
+    def user_window_ids(self, username: str) -> Set[str]:
+        """Ids of the SSH, TUI and Ansible windows (live or detached) that belong to username"""
+        ssh = self.ssh_manager
+        window_ids = {window_id for window_id, client_data in list(ssh.clients.items()) + list(ssh.detached.items())
+                      if client_data.get('owner') == username}
+        for key, entry in list(self.tui_processes.items()):
+            if entry.get('owner') == username:
+                window_ids.add(key[len('ansible_'):] if entry.get('tool') == 'ansible_web_runner' else key)
+        return window_ids
+
+    def get_websocket_user(self, websocket: WebSocket) -> Optional[str]:
+        """Workspace user of the login session cookie sent with the websocket, if any"""
+        session_id = websocket.cookies.get("session")
+        return self.session_manager.get_session_user(session_id) if session_id else None
+
+    async def answer_scrollback_request(self, stream: TerminalStream, window_id: str, request: Dict,
+                                        username: Optional[str]):
+        """Serve scrollback_fetch / scrollback_search messages from a terminal websocket (owner only)"""
+        window = self.scrollback.get(window_id) if self.scrollback else None
+        request_id = request.get('id')
+
+        try:
+            # Same answer for another user's window as for none, like the REST endpoint
+            if window is None or username is None or window.owner != username:
+                raise ValueError("No scrollback for this window")
+
+            if request.get('type') == 'scrollback_fetch':
+                result = await asyncio.to_thread(
+                    window.fetch, request.get('start'), request.get('count', 200), bool(request.get('ansi'))
+                )
+                reply = {'type': 'scrollback_lines', 'id': request_id, **result}
+            else:
+                result = await asyncio.to_thread(
+                    window.search, request.get('pattern', ''), bool(request.get('ignore_case')),
+                    request.get('max_matches', 500), request.get('start'), request.get('end')
+                )
+                reply = {'type': 'scrollback_results', 'id': request_id, **result}
+
+        except (ValueError, TypeError) as e:
+            reply = {'type': 'scrollback_error', 'id': request_id, 'message': str(e)}
+
+        await stream.send_json(reply)
+
+    async def answer_screen_request(self, stream: TerminalStream, window_id: str, request: Dict,
+                                    username: Optional[str]):
+        """Serve a screen_snapshot message from a terminal websocket (owner only)"""
+        try:
+            # owner=None would skip the ownership check, so no session means no screen
+            snapshot = self.ssh_manager.get_screen_snapshot(
+                window_id, username, scrollback_lines=request.get('scrollback', 0), ansi=bool(request.get('ansi'))
+            ) if username else None
+        except (ValueError, TypeError):
+            snapshot = None
+
+        if snapshot is None:
+            reply = {'type': 'screen_error', 'id': request.get('id'), 'message': 'No screen for this window'}
+        else:
+            reply = {'type': 'screen', 'id': request.get('id'), **snapshot}
+        await stream.send_json(reply)
 
     def get_client_ip(self, websocket: WebSocket) -> str:
         """Extract client IP from WebSocket"""
@@ -239,15 +486,18 @@ class ConnectionHandlers:
         websocket._ping_interval = 20  # More frequent pings
         websocket._ping_timeout = 10
 
-        await websocket.accept()
+        stream = TerminalStream(websocket, output_type='ssh_output', window_id=window_id)
+        await stream.accept()
         logger.info(f"Game-optimized Terminal WebSocket connected: {window_id} from {client_ip}")
 
-        # Create SSH client
-        await self.ssh_manager.create_client(window_id)
+        # Create SSH client, owned by the login session's user (never a client-supplied name)
+        session_user = self.get_websocket_user(websocket)
+        await self.ssh_manager.create_client(window_id, stream, session_user)
+        detach = False
 
         # Start output listener task with higher priority
         listen_task = asyncio.create_task(
-            self.ssh_manager.listen_to_ssh_output(window_id, websocket)
+            self.ssh_manager.listen_to_ssh_output(window_id, stream)
         )
 
         # OPTIMIZED: Set task priority if possible
@@ -258,7 +508,9 @@ class ConnectionHandlers:
 
         try:
             while True:
-                data = await websocket.receive_json()
+                data = await stream.receive()
+                if not data:
+                    continue
 
                 # Validate access on each message
                 if not self.window_tracker.validate_access(window_id, client_ip):
@@ -267,14 +519,15 @@ class ConnectionHandlers:
                     break
 
                 if data.get('type') == 'connect':
-                    # Start SSH connection using SSH manager
-                    await self.ssh_manager.connect(
+                    # Start SSH connection in the background so disconnects can cancel it
+                    self.ssh_manager.start_connect(
                         window_id,
                         data.get('hostname'),
                         data.get('port', 22),
                         data.get('username'),
                         data.get('password'),
-                        websocket
+                        stream,
+                        owner=session_user
                     )
 
                 elif data.get('type') == 'input':
@@ -289,8 +542,9 @@ class ConnectionHandlers:
                         max(data.get('rows', 24), 24)  # Minimum 24 rows
                     )
 
-        except WebSocketDisconnect:
+        except WebSocketDisconnect as disconnect:
             logger.info(f"Terminal WebSocket disconnected: {window_id}")
+            detach = disconnect.code != 1000
         except Exception as e:
             logger.error(f"Terminal WebSocket error for {window_id}: {e}")
         finally:
@@ -301,7 +555,7 @@ class ConnectionHandlers:
             except asyncio.CancelledError:
                 pass
 
-            await self.ssh_manager.disconnect(window_id)
+            await self.ssh_manager.release(window_id, stream, detach=detach)
             self.window_tracker.cleanup_window(window_id)
 
 
@@ -314,15 +568,17 @@ class ConnectionHandlers:
         # Register window with simple tracking
         self.window_tracker.register_window(window_id, client_ip, user_agent)
 
-        await websocket.accept()
+        stream = TerminalStream(websocket, output_type='tui_output', window_id=window_id)
+        await stream.accept()
         logger.info(f"TUI WebSocket connected: {window_id} from {client_ip}")
 
         child = None
         output_task = None
+        detach = False
 
         try:
             # Get tool configuration
-            data = await websocket.receive_json()
+            data = await stream.receive() or {}
 
             # Validate access
             if not self.window_tracker.validate_access(window_id, client_ip):
@@ -336,6 +592,9 @@ class ConnectionHandlers:
                 tool_type = data.get('tool', 'htop')
                 config = data
 
+            # Reconnect of a detached window: reuse its process
+            resumed = self._resume_tui(window_id, tool_type, client_ip)
+
             # Build command based on tool type
             cmd = self._build_tool_command(tool_type, config)
 
@@ -361,60 +620,128 @@ class ConnectionHandlers:
                 env.pop(var, None)
 
             try:
-                # Start process with proper encoding
-                child = pexpect.spawn(
-                    cmd[0],
-                    args=cmd[1:] if len(cmd) > 1 else [],
-                    dimensions=(24, 80),
-                    env=env,
-                    encoding='utf-8',
-                    codec_errors='replace',
-                    timeout=None
-                )
+                if resumed:
+                    child = resumed['process']
+                    output_task = resumed['output_task']
+                    resumed['handler'] = stream
+                    resumed['last_activity'] = time.monotonic()
+                    await resumed['output'].attach(stream)
 
-                logger.info(f"TUI process started for {window_id} with PID: {child.pid}")
+                    await websocket.send_json({
+                        'type': 'status',
+                        'message': f'Resumed {tool_type}',
+                        'pid': child.pid,
+                        'resumed': True
+                    })
+                    logger.info(f"TUI window {window_id} reattached to PID {child.pid}")
+                else:
+                    # Start process with proper encoding
+                    child = pexpect.spawn(
+                        cmd[0],
+                        args=cmd[1:] if len(cmd) > 1 else [],
+                        dimensions=(24, 80),
+                        env=env,
+                        encoding='utf-8',
+                        codec_errors='replace',
+                        timeout=None
+                    )
 
-                # Store process reference
-                self.tui_processes[window_id] = {
-                    'process': child,
-                    'tool': tool_type
-                }
+                    logger.info(f"TUI process started for {window_id} with PID: {child.pid}")
 
-                # Start output reading
-                output_task = asyncio.create_task(
-                    self._read_tui_output_fixed(child, websocket, window_id)
-                )
+                    # Output goes to the current websocket, or is buffered while detached
+                    buffer_bytes = self.detach_buffer_bytes if self.detach_grace else 0
+                    output = DetachableOutput(stream, buffer_bytes)
 
-                await websocket.send_json({
-                    'type': 'status',
-                    'message': f'Started {tool_type}',
-                    'pid': child.pid
-                })
+                    # Server-side history, searchable over REST/websocket
+                    scrollback = None
+                    if self.scrollback:
+                        scrollback = self.scrollback.open(window_id, self.get_websocket_user(websocket))
+
+                    # Opt-in audit recording
+                    recording = None
+                    if self.recorder:
+                        recording = self.recorder.start(window_id, self.get_websocket_user(websocket), 'tui',
+                                                        title=tool_type)
+
+                    # Start output reading
+                    output_task = asyncio.create_task(
+                        self._read_tui_output_fixed(child, output, window_id, scrollback, recording)
+                    )
+
+                    # Store process reference
+                    self.tui_processes[window_id] = {
+                        'process': child,
+                        'tool': tool_type,
+                        'output': output,
+                        'output_task': output_task,
+                        'scrollback': scrollback,
+                        'recording': recording,
+                        'client_ip': client_ip,
+                        'handler': stream,
+                        'owner': self.get_websocket_user(websocket),
+                        'created_at': time.monotonic(),
+                        'last_activity': time.monotonic()
+                    }
+                    self.reaper.watch('tui', window_id)
+
+                    await websocket.send_json({
+                        'type': 'status',
+                        'message': f'Started {tool_type}',
+                        'pid': child.pid
+                    })
+
+                entry = self.tui_processes.get(window_id, {})
+                recording = entry.get('recording')
+
+                def apply_resize(cols, rows):
+                    child.setwinsize(rows, cols)
+                    if recording:
+                        recording.resize(cols, rows)
+
+                # Window drags send bursts of resizes; apply the latest per interval
+                resize = ResizeDebouncer(apply_resize, self.ssh_manager.resize_interval)
 
                 # Handle input from WebSocket
                 while True:
                     try:
-                        data = await websocket.receive_json()
+                        data = await stream.receive()
+                        if not data:
+                            continue
 
                         # Validate access on each message
                         if not self.window_tracker.validate_access(window_id, client_ip):
                             break
 
                         if data['type'] == 'input':
-                            input_data = data['data']
-                            child.send(input_data)
+                            entry['last_activity'] = time.monotonic()
+                            # Binary frames carry UTF-8, batched JSON frames a list; the child expects str
+                            input_data = join_input(data['data']).decode('utf-8', errors='replace')
+                            if recording:
+                                recording.input(input_data)
+                            if len(input_data) > self.ssh_manager.paste_threshold:
+                                # A big paste can fill the pty - write it off the event loop
+                                await asyncio.to_thread(child.send, input_data)
+                            else:
+                                child.send(input_data)
 
                         elif data['type'] == 'resize':
-                            rows = data['rows']
-                            cols = data['cols']
-                            child.setwinsize(rows, cols)
+                            resize.request(data['cols'], data['rows'])
 
+                        elif data['type'] in ('scrollback_fetch', 'scrollback_search'):
+                            await self.answer_scrollback_request(stream, window_id, data)
+
+                    except WebSocketDisconnect as disconnect:
+                        # Anything but a deliberate close may be resumed
+                        detach = disconnect.code != 1000
+                        break
                     except asyncio.CancelledError:
                         break
                     except Exception as e:
                         logger.error(f"Error handling TUI WebSocket message for {window_id}: {e}")
                         break
 
+                resize.cancel()
+
             except Exception as e:
                 logger.error(f"Failed to start TUI process for {window_id}: {e}")
                 await websocket.send_json({
@@ -429,27 +756,76 @@ class ConnectionHandlers:
             logger.error(f"TUI WebSocket error for {window_id}: {e}")
         finally:
             # Cleanup
-            if window_id in self.tui_processes:
-                del self.tui_processes[window_id]
+            entry = self.tui_processes.get(window_id)
+            if entry is not None and entry.get('handler') is not stream:
+                # A newer websocket has taken this window over
+                pass
+            elif not (detach and self._detach_tui(window_id, entry)):
+                await self._close_tui(window_id, child, output_task)
 
-            if child and child.isalive():
-                try:
-                    child.terminate(force=False)
-                    child.wait()
-                except:
-                    try:
-                        child.kill(signal.SIGKILL)
-                    except:
-                        pass
+            self.window_tracker.cleanup_window(window_id)
 
-            if output_task and not output_task.done():
-                output_task.cancel()
+    def _resume_tui(self, window_id: str, tool_type: str, client_ip: str) -> Optional[Dict]:
+        """Return the live TUI entry for this window if the reconnect may take it over"""
+        entry = self.tui_processes.get(window_id)
+        if not entry or 'output' not in entry:
+            return None
+
+        if entry['tool'] != tool_type or entry['client_ip'] != client_ip or not entry['process'].isalive():
+            return None
+
+        timer = entry.pop('detach_timer', None)
+        if timer:
+            timer.cancel()
+
+        # Attached to a websocket that has not noticed it is dead yet
+        entry['output'].detach()
+        return entry
+
+    def _detach_tui(self, window_id: str, entry: Optional[Dict]) -> bool:
+        """Keep a TUI process running without a websocket for detach_grace seconds"""
+        if not self.detach_grace or not entry or 'output' not in entry or not entry['process'].isalive():
+            return False
+
+        entry['output'].detach()
+        entry['handler'] = None
+        entry['detach_timer'] = asyncio.create_task(self._expire_tui(window_id, entry))
+
+        logger.info(f"Detached TUI window {window_id} (grace {self.detach_grace:.0f}s)")
+        return True
+
+    async def _expire_tui(self, window_id: str, entry: Dict):
+        """Stop a detached TUI process nobody came back for"""
+        await asyncio.sleep(self.detach_grace)
+        if self.tui_processes.get(window_id) is entry and entry['output'].detached:
+            logger.info(f"Detach grace expired for TUI window {window_id}")
+            entry.pop('detach_timer', None)
+            await self._close_tui(window_id, entry['process'], entry['output_task'])
+
+    async def _close_tui(self, window_id: str, child, output_task):
+        """Terminate a TUI process and its output reader"""
+        entry = self.tui_processes.pop(window_id, None)
+        if entry and entry.get('scrollback'):
+            self.scrollback.close(entry['scrollback'])
+        if entry and entry.get('recording'):
+            entry['recording'].close()
+
+        if child and child.isalive():
+            try:
+                child.terminate(force=False)
+                child.wait()
+            except:
                 try:
-                    await output_task
-                except asyncio.CancelledError:
+                    child.kill(signal.SIGKILL)
+                except:
                     pass
 
-            self.window_tracker.cleanup_window(window_id)
+        if output_task and not output_task.done():
+            output_task.cancel()
+            try:
+                await output_task
+            except asyncio.CancelledError:
+                pass
 
     async def websocket_ansible(self, websocket: WebSocket, window_id: str):
         """Handle Ansible execution WebSocket connections - simplified auth"""
@@ -502,9 +878,8 @@ class ConnectionHandlers:
                         inventory_content = self._generate_ansible_inventory(credentials, devices)
 
                         # Create temporary inventory file
-                        temp_dir = Path("./temp_ansible")
-                        temp_dir.mkdir(exist_ok=True)
-                        inventory_file = temp_dir / f"inventory_{window_id}.yml"
+                        ANSIBLE_TEMP_DIR.mkdir(exist_ok=True)
+                        inventory_file = ANSIBLE_TEMP_DIR / f"inventory_{window_id}.yml"
 
                         with open(inventory_file, 'w') as f:
                             f.write(inventory_content)
@@ -552,8 +927,13 @@ class ConnectionHandlers:
                         # Store process reference
                         self.tui_processes[f"ansible_{window_id}"] = {
                             'process': child,
-                            'tool': 'ansible_web_runner'
+                            'tool': 'ansible_web_runner',
+                            'handler': websocket,
+                            'inventory': inventory_file,
+                            'owner': self.get_websocket_user(websocket),
+                            'created_at': time.monotonic()
                         }
+                        self.reaper.watch('ansible', f"ansible_{window_id}")
 
                         # Start output reading task with enhanced formatting
                         output_task = asyncio.create_task(
@@ -579,8 +959,9 @@ class ConnectionHandlers:
             logger.error(f"Ansible WebSocket error for {window_id}: {e}")
         finally:
             # Cleanup
-            if f"ansible_{window_id}" in self.tui_processes:
-                del self.tui_processes[f"ansible_{window_id}"]
+            entry = self.tui_processes.pop(f"ansible_{window_id}", None)
+            if entry is not None:
+                self._remove_inventory(entry.get('inventory'))
 
             if child and child.isalive():
                 try:
@@ -602,36 +983,41 @@ class ConnectionHandlers:
             self.window_tracker.cleanup_window(window_id)
 
     # Helper methods remain the same as original
-    async def _read_tui_output_fixed(self, child, websocket: WebSocket, window_id: str):
+    async def _read_tui_output_fixed(self, child, output: DetachableOutput, window_id: str, scrollback=None,
+                                     recording=None):
         """Fixed TUI output reading"""
-        while child.isalive():
-            try:
-                # Read with pexpect handling UTF-8
-                data = child.read_nonblocking(size=1024, timeout=0.01)
-
-                if data:
-                    # Convert string back to bytes then base64
-                    data_bytes = data.encode('utf-8', errors='replace')
-                    encoded_data = base64.b64encode(data_bytes).decode('ascii')
-
-                    await websocket.send_json({
-                        'type': 'tui_output',
-                        'data': encoded_data
-                    })
-
-            except pexpect.TIMEOUT:
-                await asyncio.sleep(0.01)
-                continue
-            except pexpect.EOF:
-                break
-            except Exception as e:
-                logger.error(f"TUI output read error for {window_id}: {e}")
-                break
+        flow = self.output_scheduler.register(window_id, 'tui')
+        try:
+            while child.isalive():
+                try:
+                    # Read with pexpect handling UTF-8 (timeout=0: never block the event loop in select)
+                    data = child.read_nonblocking(size=1024, timeout=0)
+
+                    if data:
+                        # Convert string back to bytes for the terminal stream
+                        data = data.encode('utf-8', errors='replace')
+                        await self.output_scheduler.acquire(flow, len(data))
+                        if scrollback:
+                            scrollback.append(data)
+                        if recording:
+                            recording.output(data)
+                        await output.send_output(data)
+
+                except pexpect.TIMEOUT:
+                    await asyncio.sleep(0.01)
+                    continue
+                except pexpect.EOF:
+                    break
+                except Exception as e:
+                    logger.error(f"TUI output read error for {window_id}: {e}")
+                    break
+        finally:
+            self.output_scheduler.unregister(flow)
 
         # Process ended
         exit_code = child.exitstatus if child.exitstatus is not None else child.signalstatus
         try:
-            await websocket.send_json({
+            await output.send_json({
                 'type': 'process_ended',
                 'code': exit_code or 0
             })
@@ -640,32 +1026,38 @@ class ConnectionHandlers:
 
     async def _read_ansible_output(self, child, websocket: WebSocket, window_id: str):
         """Read Ansible output with enhanced formatting"""
-        while child.isalive():
-            try:
-                output = child.read_nonblocking(size=1024, timeout=0.1)
+        flow = self.output_scheduler.register(window_id, 'ansible')
+        try:
+            while child.isalive():
+                try:
+                    # timeout=0: an idle playbook must not block the event loop in select
+                    output = child.read_nonblocking(size=1024, timeout=0)
 
-                if output:
-                    # Format each line with Ansible-specific styling
-                    formatted_output = self._format_ansible_output(output)
+                    if output:
+                        await self.output_scheduler.acquire(flow, len(output))
+                        # Format each line with Ansible-specific styling
+                        formatted_output = self._format_ansible_output(output)
 
-                    # Convert to bytes for base64 encoding
-                    output_bytes = formatted_output.encode('utf-8', errors='replace')
-                    encoded_data = base64.b64encode(output_bytes).decode('ascii')
+                        # Convert to bytes for base64 encoding
+                        output_bytes = formatted_output.encode('utf-8', errors='replace')
+                        encoded_data = base64.b64encode(output_bytes).decode('ascii')
 
-                    await websocket.send_json({
-                        'type': 'ansible_output',
-                        'data': encoded_data
-                    })
+                        await websocket.send_json({
+                            'type': 'ansible_output',
+                            'data': encoded_data
+                        })
 
-            except pexpect.TIMEOUT:
-                await asyncio.sleep(0.01)
-                continue
-            except pexpect.EOF:
-                logger.info(f"Ansible process ended for {window_id}")
-                break
-            except Exception as e:
-                logger.error(f"Ansible output read error for {window_id}: {e}")
-                break
+                except pexpect.TIMEOUT:
+                    await asyncio.sleep(0.01)
+                    continue
+                except pexpect.EOF:
+                    logger.info(f"Ansible process ended for {window_id}")
+                    break
+                except Exception as e:
+                    logger.error(f"Ansible output read error for {window_id}: {e}")
+                    break
+        finally:
+            self.output_scheduler.unregister(flow)
 
         # Process ended
         exit_code = child.exitstatus if child.exitstatus is not None else child.signalstatus
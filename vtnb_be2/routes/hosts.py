@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+routes/hosts.py
+Host Health Routes - which SSH targets are known to be unreachable
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+import logging
+
+from .connection_handlers import ConnectionHandlers
+
+logger = logging.getLogger(__name__)
+
+
+def create_hosts_routes(connection_handlers: ConnectionHandlers, get_current_user,
+                        admin_users: Optional[List[str]] = None):
+    """Factory function to create host health routes with dependencies
+
+    A breaker is shared by every user connecting to that host, so only
+    admin_users may reset one (nobody, when none are configured).
+    """
+
+    router = APIRouter(prefix="/api/hosts", tags=["hosts"])
+    admins = set(admin_users or [])
+
+    @router.get("/health")
+    async def get_hosts_health(unhealthy_only: bool = False, username: str = Depends(get_current_user)):
+        """Get circuit breaker state of every tracked host:port (open/half_open = known dead)"""
+        health = connection_handlers.ssh_manager.host_health
+        return {**health.get_stats(), 'hosts': health.get_hosts(unhealthy_only)}
+
+    @router.get("/health/{host}")
+    async def get_host_health(host: str, port: int = 22, username: str = Depends(get_current_user)):
+        """Get one host's breaker state, recent failures and retry time"""
+        return connection_handlers.ssh_manager.host_health.get_host(host, port)
+
+    @router.delete("/health/{host}")
+    async def reset_host_health(host: str, port: int = 22, username: str = Depends(get_current_user)):
+        """Forget a host's failures so the next connect is attempted at once"""
+        if username not in admins:
+            logger.warning(f"Host health reset for {host}:{port} refused for non-admin {username}")
+            raise HTTPException(status_code=403, detail="Only admin users can reset host health")
+        reset = connection_handlers.ssh_manager.host_health.reset(host, port)
+        logger.info(f"Host health for {host}:{port} reset by {username}")
+        return {'success': True, 'reset': reset}
+
+    return router
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+routes/metrics.py
+Runtime Metrics Routes - SSH layer gauges and counters
+"""
+from fastapi import APIRouter, Depends
+from typing import List, Optional
+import logging
+
+from .connection_handlers import ConnectionHandlers
+
+logger = logging.getLogger(__name__)
+
+
+def create_metrics_routes(connection_handlers: ConnectionHandlers, get_current_user,
+                          admin_users: Optional[List[str]] = None):
+    """Factory function to create metrics routes with dependencies
+
+    Per-window stats name window ids and targets, so only admin_users see
+    everyone's windows; everyone else only sees their own.
+    """
+
+    router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+    admins = set(admin_users or [])
+
+    @router.get("/ssh")
+    async def get_ssh_metrics(username: str = Depends(get_current_user)):
+        """Get SSH connection executor and session gauges"""
+        return connection_handlers.ssh_manager.get_metrics()
+
+    @router.get("/ssh/windows")
+    async def get_ssh_window_metrics(username: str = Depends(get_current_user)):
+        """Get per-window SSH connection and output stats (own windows unless an admin)"""
+        return connection_handlers.ssh_manager.get_active_connections(None if username in admins else username)
+
+    @router.get("/connect")
+    async def get_connect_timing_metrics(host: Optional[str] = None, username: str = Depends(get_current_user)):
+        """Get per-phase SSH connect time histograms, global and per host:port (host filters by substring)"""
+        return connection_handlers.ssh_manager.connect_timing.get_host_stats(host)
+
+    @router.get("/output")
+    async def get_output_scheduler_metrics(username: str = Depends(get_current_user)):
+        """Get output scheduler fairness stats and per-window queueing delay (own windows unless an admin)"""
+        scheduler = connection_handlers.output_scheduler
+        windows = scheduler.get_window_stats()
+        if username not in admins:
+            own = connection_handlers.user_window_ids(username)
+            windows = [window for window in windows if window['window_id'] in own]
+        return {**scheduler.get_stats(), 'windows': windows}
+
+    return router
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+routes/recordings.py
+Recording Routes - list recorded sessions and inspect the screen at any point in time
+"""
+from fastapi import APIRouter, HTTPException, Depends, Query
+import logging
+
+from .connection_handlers import ConnectionHandlers
+
+logger = logging.getLogger(__name__)
+
+
+def create_recordings_routes(connection_handlers: ConnectionHandlers, get_current_user):
+    """Factory function to create recording routes with dependencies"""
+
+    router = APIRouter(prefix="/api/recordings", tags=["recordings"])
+
+    def get_recording(recording_id: str, username: str):
+        path = connection_handlers.playback.recording_path(username, recording_id)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Recording not found")
+        return path
+
+    @router.get("")
+    async def list_recordings(username: str = Depends(get_current_user)):
+        """List the user's recordings, newest first"""
+        playback = connection_handlers.playback
+        return {"recordings": playback.list_recordings(username), "playback": playback.get_stats()}
+
+    @router.get("/{recording_id}")
+    async def get_recording_info(recording_id: str, username: str = Depends(get_current_user)):
+        """Recording metadata plus its keyframe index summary (builds the index if needed)"""
+        path = get_recording(recording_id, username)
+        index = await connection_handlers.playback.get_index(path)
+        if index is None:
+            raise HTTPException(status_code=404, detail="Recording has no readable segments")
+        return {**index.meta, "index": index.get_stats()}
+
+    @router.get("/{recording_id}/screen")
+    async def get_recording_screen(
+            recording_id: str,
+            time: float = Query(..., ge=0, description="Seconds from the start of the session"),
+            username: str = Depends(get_current_user)
+    ):
+        """Screen contents (text and ANSI repaint) at a point in the recording"""
+        path = get_recording(recording_id, username)
+        screen = await connection_handlers.playback.screen_at(path, time)
+        if screen is None:
+            raise HTTPException(status_code=404, detail="Recording has no readable segments")
+        return screen
+
+    return router
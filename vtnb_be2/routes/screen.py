@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+routes/screen.py
+Screen Routes - what is currently on an SSH window's screen, from the server-side screen model
+"""
+from fastapi import APIRouter, HTTPException, Depends, Query
+import logging
+
+from .connection_handlers import ConnectionHandlers
+
+logger = logging.getLogger(__name__)
+
+
+def create_screen_routes(connection_handlers: ConnectionHandlers, get_current_user):
+    """Factory function to create screen routes with dependencies"""
+
+    router = APIRouter(prefix="/api/screen", tags=["screen"])
+
+    @router.get("/{window_id}")
+    async def get_screen(
+            window_id: str,
+            scrollback: int = Query(0, ge=0, description="Recent scrollback lines to include"),
+            ansi: bool = Query(False, description="Include an ANSI repaint of the screen"),
+            username: str = Depends(get_current_user)
+    ):
+        """Visible lines, cursor, title and alt-screen state of a live or detached window"""
+        snapshot = connection_handlers.ssh_manager.get_screen_snapshot(window_id, username, scrollback, ansi)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="No screen for this window")
+        return snapshot
+
+    return router
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+routes/scrollback.py
+Scrollback Routes - range fetch and regex search over server-side terminal history
+"""
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+import asyncio
+import logging
+
+from .connection_handlers import ConnectionHandlers
+
+logger = logging.getLogger(__name__)
+
+
+def create_scrollback_routes(connection_handlers: ConnectionHandlers, get_current_user):
+    """Factory function to create scrollback routes with dependencies"""
+
+    router = APIRouter(prefix="/api/scrollback", tags=["scrollback"])
+
+    def get_window(window_id: str, username: str):
+        store = connection_handlers.scrollback
+        window = store.get(window_id) if store else None
+        if window is None or window.owner != username:
+            raise HTTPException(status_code=404, detail="No scrollback for this window")
+        return window
+
+    @router.get("")
+    async def list_scrollback(username: str = Depends(get_current_user)):
+        """List the user's windows with scrollback, plus store-wide stats"""
+        store = connection_handlers.scrollback
+        if store is None:
+            return {"enabled": False, "windows": {}}
+
+        windows = {window.window_id: window.get_stats() for window in store.list_windows(username)}
+        return {"enabled": True, "store": store.get_stats(), "windows": windows}
+
+    @router.get("/{window_id}/lines")
+    async def get_scrollback_lines(
+            window_id: str,
+            start: Optional[int] = Query(None, description="First line; omit for the newest lines"),
+            count: int = Query(200, ge=1, le=5000),
+            ansi: bool = Query(False, description="Keep escape sequences"),
+            username: str = Depends(get_current_user)
+    ):
+        """Fetch a range of scrollback lines"""
+        window = get_window(window_id, username)
+        return await asyncio.to_thread(window.fetch, start, count, ansi)
+
+    @router.get("/{window_id}/search")
+    async def search_scrollback(
+            window_id: str,
+            pattern: str = Query(..., min_length=1, max_length=1000),
+            ignore_case: bool = False,
+            max_matches: int = Query(500, ge=1, le=10000),
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+            username: str = Depends(get_current_user)
+    ):
+        """Regex search over a window's scrollback"""
+        window = get_window(window_id, username)
+        try:
+            return await asyncio.to_thread(window.search, pattern, ignore_case, max_matches, start, end)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return router
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""
+Lightweight server-side VT100/xterm screen model
+Tracks the visible screen, cursor, SGR attributes, scroll region, alternate
+screen and a bounded scrollback from a raw terminal output stream, and
+renders the state back to an ANSI repaint or plain text. Covers what shells,
+pagers, network device CLIs and curses tools use - not a full xterm.
+"""
+
+import codecs
+import re
+import unicodedata
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+_TOKEN = re.compile(
+    r'(?P<text>[^\x00-\x1f\x7f-\x9f]+)'
+    r'|(?P<csi>\x1b\[(?P<params>[0-?]*)(?P<inter>[ -/]*)(?P<final>[@-~]))'
+    r'|(?P<osc>\x1b\](?P<osc_body>[^\x07\x1b]*)(?:\x07|\x1b\\))'
+    r'|(?P<string>\x1b[P_^X][^\x07\x1b]*(?:\x07|\x1b\\))'
+    r'|(?P<esc>\x1b[ -/]*(?![\[\]P_^X])[0-~])'
+    r'|(?P<ctrl>[\x00-\x1f\x7f-\x9f])'
+)
+
+# Deferred output: trimmed to its last lines once this much is waiting...
+_DEFER_TRIM_BYTES = 65536
+# ...and emulated anyway once this much cannot be trimmed (too few newlines)
+_DEFER_MAX_BYTES = 262144
+# State set by skipped output that outlives the lines it came with
+_SKIPPED_MODE = re.compile(rb'\x1b\[\?(?:1049|1047|47)[hl]|\x1bc')
+_SKIPPED_SGR = re.compile(rb'\x1b\[[0-9;:]*m')
+
+# An escape sequence cut off by the end of a chunk
+_PARTIAL = re.compile(r'\x1b(?:\[[0-?]*[ -/]*|[\]P_^X][^\x07\x1b]*\x1b?|[ -/]*)?\Z')
+_MAX_PARTIAL = 4096
+
+# Combining marks and East Asian wide ranges - text without them is one cell per char
+_SPECIAL_WIDTH = re.compile(
+    '[\u0300-\u036f\u0483-\u0489\u0591-\u05bd\u0610-\u061a\u064b-\u065f\u0e31-\u0e3a'
+    '\u1ab0-\u1aff\u1dc0-\u1dff\u200b-\u200f\u20d0-\u20ff\ufe00-\ufe0f\ufe20-\ufe2f'
+    '\u1100-\u115f\u231a-\u231b\u2329-\u232a\u23e9-\u23ec\u25fd-\u25fe\u2614-\u2615'
+    '\u2648-\u2653\u26aa-\u26ab\u26bd-\u26be\u26c4-\u26c5\u26f2-\u26fa\u2705\u270a-\u270b'
+    '\u2728\u274c\u2753-\u2755\u2795-\u2797\u2b1b-\u2b1c\u2b50\u2b55'
+    '\u2e80-\u303e\u3041-\u33ff\u3400-\u4dbf\u4e00-\u9fff\ua000-\ua4cf\ua960-\ua97f'
+    '\uac00-\ud7a3\uf900-\ufaff\ufe10-\ufe19\ufe30-\ufe6f\uff00-\uff60\uffe0-\uffe6'
+    '\U0001f000-\U0001faff\U00020000-\U0003fffd]'
+)
+
+_FLAG_CODES = {1: 'bold', 2: 'dim', 3: 'italic', 4: 'underline', 5: 'blink', 7: 'inverse', 8: 'hidden', 9: 'strike'}
+_FLAG_SGR = {'bold': '1', 'dim': '2', 'italic': '3', 'underline': '4', 'blink': '5',
+             'inverse': '7', 'hidden': '8', 'strike': '9'}
+_FLAG_RESETS = {22: ('bold', 'dim'), 23: ('italic',), 24: ('underline',), 25: ('blink',),
+                27: ('inverse',), 28: ('hidden',), 29: ('strike',)}
+
+
+def _last_match(pattern, data: bytes, start: int = 0) -> Optional[bytes]:
+    match = None
+    for match in pattern.finditer(data, max(0, start)):
+        pass
+    return match.group() if match else None
+
+
+def _char_width(ch: str) -> int:
+    if unicodedata.combining(ch):
+        return 0
+    return 2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1
+
+
+class _Buffer:
+    """One screen's cells; attrs hold the SGR parameter string of each cell"""
+
+    __slots__ = ('chars', 'attrs')
+
+    def __init__(self, cols: int, rows: int):
+        self.chars = [[' '] * cols for _ in range(rows)]
+        self.attrs = [[''] * cols for _ in range(rows)]
+
+
+class ScreenModel:
+    """Emulated terminal screen fed with raw output bytes"""
+
+    def __init__(self, cols: int = 80, rows: int = 24, scrollback: int = 1000):
+        self.cols = max(1, cols)
+        self.rows = max(1, rows)
+        self.scrollback: Deque[Tuple[List[str], List[str]]] = deque(maxlen=max(0, scrollback))
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._partial = ''
+        self.title = ''
+        self.bytes_fed = 0
+        self.bytes_skipped = 0
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self.reset()
+
+    def reset(self):
+        self.main = _Buffer(self.cols, self.rows)
+        self.alt: Optional[_Buffer] = None
+        self.buffer = self.main
+        self.x = self.y = 0
+        self.wrap_pending = False
+        self.autowrap = True
+        self.cursor_visible = True
+        self.top, self.bottom = 0, self.rows - 1
+        self._sgr_flags = set()
+        self._fg: Optional[str] = None
+        self._bg: Optional[str] = None
+        self.attr = ''
+        self._saved = (0, 0, '', frozenset(), None, None)
+
+    # --- input ---
+
+    def feed(self, data):
+        """Feed raw output (bytes or str)"""
+        if isinstance(data, bytes):
+            self.bytes_fed += len(data)
+            data = self._decoder.decode(data)
+        if self._partial:
+            data = self._partial + data
+            self._partial = ''
+
+        pos, end = 0, len(data)
+        match = _TOKEN.match
+        while pos < end:
+            m = match(data, pos)
+            kind = m.lastgroup
+            if kind == 'text':
+                self._write_text(m.group())
+            elif kind == 'csi':
+                self._csi(m.group('params'), m.group('inter'), m.group('final'))
+            elif kind == 'ctrl':
+                ch = m.group()
+                if ch == '\x1b':
+                    rest = data[pos:]
+                    if len(rest) < _MAX_PARTIAL and _PARTIAL.match(rest):
+                        self._partial = rest
+                        return
+                else:
+                    self._control(ch)
+            elif kind == 'esc':
+                self._esc(m.group()[1:])
+            elif kind == 'osc':
+                self._osc(m.group('osc_body'))
+            pos = m.end()
+
+    def defer(self, data: bytes):
+        """Queue output without emulating it; every reader syncs first
+
+        Waiting output is cut at a newline so only the lines that can still
+        be on screen or in scrollback are ever emulated - a flood of any
+        size costs a few screens of work per read. Alternate-screen switches
+        and the last SGR of the skipped part are kept.
+        """
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        if self._pending_bytes >= _DEFER_TRIM_BYTES:
+            self._trim_pending()
+            if self._pending_bytes >= _DEFER_MAX_BYTES:
+                self.sync()
+
+    def sync(self):
+        """Emulate deferred output"""
+        if not self._pending:
+            return
+        self._trim_pending()
+        data = b''.join(self._pending)
+        self._pending, self._pending_bytes = [], 0
+        self.feed(data)
+
+    def _trim_pending(self):
+        data = b''.join(self._pending)
+        cut = len(data)
+        for _ in range(self.rows + (self.scrollback.maxlen or 0)):
+            cut = data.rfind(b'\n', 0, cut)
+            if cut < 0:
+                self._pending = [data]
+                return
+
+        skipped = data[:cut + 1]
+        keep = [_last_match(_SKIPPED_MODE, skipped), _last_match(_SKIPPED_SGR, skipped, len(skipped) - 65536)]
+
+        # The cut is on a line boundary, so nothing half-decoded carries over
+        self._decoder.reset()
+        self._partial = ''
+        self.bytes_fed += len(skipped)
+        self.bytes_skipped += len(skipped)
+        tail = b''.join(filter(None, keep)) + data[cut + 1:]
+        self._pending, self._pending_bytes = [tail], len(tail)
+
+    def resize(self, cols: int, rows: int):
+        """Resize both buffers, keeping the bottom of the screen like xterm"""
+        cols, rows = max(1, cols), max(1, rows)
+        if (cols, rows) == (self.cols, self.rows):
+            return
+        self.sync()
+
+        for buf in filter(None, (self.main, self.alt)):
+            for line in (buf.chars, buf.attrs):
+                fill = ' ' if line is buf.chars else ''
+                for i, row in enumerate(line):
+                    line[i] = (row + [fill] * (cols - len(row)))[:cols]
+            if rows < self.rows:
+                # Rows below the cursor go first, then the top rows scroll away
+                excess = self.rows - rows
+                below = min(excess, self.rows - 1 - self.y) if buf is self.buffer else excess
+                del buf.chars[self.rows - below:], buf.attrs[self.rows - below:]
+                excess -= below
+                if excess:
+                    if buf is self.main:
+                        for chars, attrs in zip(buf.chars[:excess], buf.attrs[:excess]):
+                            self.scrollback.append((chars, attrs))
+                    del buf.chars[:excess], buf.attrs[:excess]
+                    if buf is self.buffer:
+                        self.y -= excess
+            else:
+                for _ in range(rows - self.rows):
+                    buf.chars.append([' '] * cols)
+                    buf.attrs.append([''] * cols)
+
+        self.cols, self.rows = cols, rows
+        self.top, self.bottom = 0, rows - 1
+        self.x = min(self.x, cols - 1)
+        self.y = max(0, min(self.y, rows - 1))
+        self.wrap_pending = False
+
+    # --- text ---
+
+    def _write_text(self, text: str):
+        i, n = 0, len(text)
+        narrow = text.isascii() or not _SPECIAL_WIDTH.search(text)
+        while i < n:
+            if self.wrap_pending:
+                self.wrap_pending = False
+                if self.autowrap:
+                    self.x = 0
+                    self._index()
+                else:
+                    self.x = self.cols - 1
+
+            space = self.cols - self.x
+            if narrow:
+                chunk = text[i:i + space]
+                y, x = self.y, self.x
+                self.buffer.chars[y][x:x + len(chunk)] = chunk
+                self.buffer.attrs[y][x:x + len(chunk)] = [self.attr] * len(chunk)
+                i += len(chunk)
+                if x + len(chunk) >= self.cols:
+                    self.x = self.cols - 1
+                    self.wrap_pending = True
+                else:
+                    self.x = x + len(chunk)
+            else:
+                self._write_char(text[i])
+                i += 1
+
+    def _write_char(self, ch: str):
+        width = _char_width(ch)
+        chars, attrs = self.buffer.chars[self.y], self.buffer.attrs[self.y]
+        if width == 0:
+            # Combining mark joins the previous cell
+            x = self.x if self.wrap_pending else max(0, self.x - 1)
+            chars[x] += ch
+            return
+        if width == 2 and self.x == self.cols - 1:
+            if not self.autowrap or self.cols < 2:
+                return
+            chars[self.x] = ' '
+            self.x = 0
+            self._index()
+            chars, attrs = self.buffer.chars[self.y], self.buffer.attrs[self.y]
+
+        chars[self.x] = ch
+        attrs[self.x] = self.attr
+        if width == 2:
+            chars[self.x + 1] = ''
+            attrs[self.x + 1] = self.attr
+        if self.x + width >= self.cols:
+            self.x = self.cols - 1
+            self.wrap_pending = True
+        else:
+            self.x += width
+
+    def _control(self, ch: str):
+        if ch == '\r':
+            self.x = 0
+        elif ch in '\n\x0b\x0c':
+            self._index()
+        elif ch == '\b':
+            self.x = max(0, self.x - 1)
+        elif ch == '\t':
+            self.x = min(self.cols - 1, (self.x // 8 + 1) * 8)
+        else:
+            return
+        self.wrap_pending = False
+
+    # --- scrolling ---
+
+    def _blank_row(self) -> Tuple[List[str], List[str]]:
+        erase = self._erase_attr()
+        return [' '] * self.cols, [erase] * self.cols
+
+    def _scroll_up(self, count: int = 1):
+        buf = self.buffer
+        count = min(count, self.bottom - self.top + 1)
+        for _ in range(count):
+            chars = buf.chars.pop(self.top)
+            attrs = buf.attrs.pop(self.top)
+            if buf is self.main and self.top == 0:
+                self.scrollback.append((chars, attrs))
+            blank_chars, blank_attrs = self._blank_row()
+            buf.chars.insert(self.bottom, blank_chars)
+            buf.attrs.insert(self.bottom, blank_attrs)
+
+    def _scroll_down(self, count: int = 1):
+        buf = self.buffer
+        count = min(count, self.bottom - self.top + 1)
+        for _ in range(count):
+            del buf.chars[self.bottom], buf.attrs[self.bottom]
+            blank_chars, blank_attrs = self._blank_row()
+            buf.chars.insert(self.top, blank_chars)
+            buf.attrs.insert(self.top, blank_attrs)
+
+    def _index(self):
+        if self.y == self.bottom:
+            self._scroll_up(1)
+        elif self.y < self.rows - 1:
+            self.y += 1
+
+    def _reverse_index(self):
+        if self.y == self.top:
+            self._scroll_down(1)
+        elif self.y > 0:
+            self.y -= 1
+
+    # --- escape sequences ---
+
+    def _esc(self, seq: str):
+        if seq == '7':
+            self._save_cursor()
+        elif seq == '8':
+            self._restore_cursor()
+        elif seq == 'D':
+            self._index()
+            self.wrap_pending = False
+        elif seq == 'M':
+            self._reverse_index()
+            self.wrap_pending = False
+        elif seq == 'E':
+            self.x = 0
+            self._index()
+            self.wrap_pending = False
+        elif seq == 'c':
+            self.scrollback.clear()
+            self.reset()
+
+    def _osc(self, body: str):
+        code, _, value = body.partition(';')
+        if code in ('0', '2'):
+            self.title = value
+
+    def _csi(self, params: str, inter: str, final: str):
+        private = params[:1] in ('?', '>', '=', '<')
+        if private:
+            marker, params = params[0], params[1:]
+        if inter:
+            return
+
+        args = [int(p) if p.isdigit() else 0 for p in params.split(';')] if params else []
+
+        def arg(index: int = 0, default: int = 1) -> int:
+            value = args[index] if index < len(args) else 0
+            return value or default
+
+        if private:
+            if marker == '?' and final in 'hl':
+                self._dec_mode(args, final == 'h')
+            return
+
+        if final == 'm':
+            self._sgr(params)
+            return
+
+        self.wrap_pending = False
+        buf = self.buffer
+        if final == 'A':
+            self.y = max(self.top if self.y >= self.top else 0, self.y - arg())
+        elif final == 'B':
+            self.y = min(self.bottom if self.y <= self.bottom else self.rows - 1, self.y + arg())
+        elif final in 'Ca':
+            self.x = min(self.cols - 1, self.x + arg())
+        elif final == 'D':
+            self.x = max(0, self.x - arg())
+        elif final == 'E':
+            self.x, self.y = 0, min(self.rows - 1, self.y + arg())
+        elif final == 'F':
+            self.x, self.y = 0, max(0, self.y - arg())
+        elif final in 'G`':
+            self.x = min(self.cols - 1, arg() - 1)
+        elif final in 'Hf':
+            self.y = min(self.rows - 1, arg(0) - 1)
+            self.x = min(self.cols - 1, arg(1) - 1)
+        elif final == 'd':
+            self.y = min(self.rows - 1, arg() - 1)
+        elif final == 'e':
+            self.y = min(self.rows - 1, self.y + arg())
+        elif final == 'J':
+            self._erase_display(args[0] if args else 0)
+        elif final == 'K':
+            self._erase_line(args[0] if args else 0)
+        elif final == 'X':
+            self._erase_cells(self.y, self.x, min(self.cols, self.x + arg()))
+        elif final == '@':
+            count = min(arg(), self.cols - self.x)
+            erase = self._erase_attr()
+            for line, fill in ((buf.chars[self.y], ' '), (buf.attrs[self.y], erase)):
+                line[self.x:self.x] = [fill] * count
+                del line[self.cols:]
+        elif final == 'P':
+            count = min(arg(), self.cols - self.x)
+            erase = self._erase_attr()
+            for line, fill in ((buf.chars[self.y], ' '), (buf.attrs[self.y], erase)):
+                del line[self.x:self.x + count]
+                line.extend([fill] * count)
+        elif final in 'LM':
+            if self.top <= self.y <= self.bottom:
+                saved_top, self.top = self.top, self.y
+                (self._scroll_down if final == 'L' else self._scroll_up)(arg())
+                self.top = saved_top
+                self.x = 0
+        elif final == 'S':
+            self._scroll_up(arg())
+        elif final == 'T':
+            self._scroll_down(arg())
+        elif final == 'r':
+            top, bottom = arg(0) - 1, arg(1, self.rows) - 1
+            if 0 <= top < bottom <= self.rows - 1:
+                self.top, self.bottom = top, bottom
+                self.x = self.y = 0
+        elif final == 's':
+            self._save_cursor()
+        elif final == 'u':
+            self._restore_cursor()
+
+    def _dec_mode(self, args: List[int], enable: bool):
+        for mode in args:
+            if mode == 25:
+                self.cursor_visible = enable
+            elif mode == 7:
+                self.autowrap = enable
+            elif mode in (47, 1047, 1049):
+                if mode == 1049 and enable:
+                    self._save_cursor()
+                self._switch_alt(enable)
+                if mode == 1049 and not enable:
+                    self._restore_cursor()
+
+    def _switch_alt(self, enable: bool):
+        if enable and self.alt is None:
+            self.alt = _Buffer(self.cols, self.rows)
+            self.buffer = self.alt
+        elif not enable and self.alt is not None:
+            self.alt = None
+            self.buffer = self.main
+        self.wrap_pending = False
+
+    def _save_cursor(self):
+        self._saved = (self.x, self.y, self.attr, frozenset(self._sgr_flags), self._fg, self._bg)
+
+    def _restore_cursor(self):
+        x, y, self.attr, flags, self._fg, self._bg = self._saved
+        self._sgr_flags = set(flags)
+        self.x, self.y = min(x, self.cols - 1), min(y, self.rows - 1)
+        self.wrap_pending = False
+
+    # --- erasing ---
+
+    def _erase_attr(self) -> str:
+        return f"{self._bg}" if self._bg else ''
+
+    def _erase_cells(self, y: int, start: int, end: int):
+        if start >= end:
+            return
+        erase = self._erase_attr()
+        self.buffer.chars[y][start:end] = [' '] * (end - start)
+        self.buffer.attrs[y][start:end] = [erase] * (end - start)
+
+    def _erase_line(self, mode: int):
+        if mode == 0:
+            self._erase_cells(self.y, self.x, self.cols)
+        elif mode == 1:
+            self._erase_cells(self.y, 0, self.x + 1)
+        elif mode == 2:
+            self._erase_cells(self.y, 0, self.cols)
+
+    def _erase_display(self, mode: int):
+        if mode == 0:
+            self._erase_line(0)
+            rows = range(self.y + 1, self.rows)
+        elif mode == 1:
+            self._erase_line(1)
+            rows = range(0, self.y)
+        elif mode == 2:
+            rows = range(self.rows)
+        else:
+            if self.buffer is self.main:
+                self.scrollback.clear()
+            return
+        for y in rows:
+            self._erase_cells(y, 0, self.cols)
+
+    # --- attributes ---
+
+    def _sgr(self, params: str):
+        codes = [int(p) if p.isdigit() else 0 for p in params.replace(':', ';').split(';')] if params else [0]
+        i = 0
+        while i < len(codes):
+            code = codes[i]
+            if code == 0:
+                self._sgr_flags.clear()
+                self._fg = self._bg = None
+            elif code in _FLAG_CODES:
+                self._sgr_flags.add(_FLAG_CODES[code])
+            elif code in _FLAG_RESETS:
+                self._sgr_flags.difference_update(_FLAG_RESETS[code])
+            elif 30 <= code <= 37 or 90 <= code <= 97:
+                self._fg = str(code)
+            elif 40 <= code <= 47 or 100 <= code <= 107:
+                self._bg = str(code)
+            elif code == 39:
+                self._fg = None
+            elif code == 49:
+                self._bg = None
+            elif code in (38, 48):
+                # 38;5;n or 38;2;r;g;b (and the 48 background forms)
+                if i + 1 < len(codes) and codes[i + 1] == 5 and i + 2 < len(codes):
+                    color, i = f"{code};5;{codes[i + 2]}", i + 2
+                elif i + 1 < len(codes) and codes[i + 1] == 2 and i + 4 < len(codes):
+                    color, i = f"{code};2;{codes[i + 2]};{codes[i + 3]};{codes[i + 4]}", i + 4
+                else:
+                    break
+                if code == 38:
+                    self._fg = color
+                else:
+                    self._bg = color
+            i += 1
+
+        parts = [_FLAG_SGR[flag] for flag in sorted(self._sgr_flags)]
+        if self._fg:
+            parts.append(self._fg)
+        if self._bg:
+            parts.append(self._bg)
+        self.attr = ';'.join(parts)
+
+    # --- output ---
+
+    @staticmethod
+    def _row_ansi(chars: List[str], attrs: List[str]) -> str:
+        end = len(chars)
+        while end and chars[end - 1] == ' ' and not attrs[end - 1]:
+            end -= 1
+        out = []
+        current = ''
+        for ch, attr in zip(chars[:end], attrs[:end]):
+            if attr != current:
+                out.append(f"\x1b[0;{attr}m" if attr else "\x1b[0m")
+                current = attr
+            out.append(ch)
+        if current:
+            out.append("\x1b[0m")
+        return ''.join(out)
+
+    @staticmethod
+    def _row_text(chars: List[str]) -> str:
+        return ''.join(chars).rstrip()
+
+    def render_ansi(self, scrollback_lines: int = 0) -> str:
+        """ANSI that repaints this state on a fresh terminal of the same size
+
+        Up to scrollback_lines of history are printed first so they end up
+        in the viewer's own scrollback.
+        """
+        self.sync()
+        history = list(self.scrollback)[-scrollback_lines:] if scrollback_lines else []
+        rows = [self._row_ansi(c, a) for c, a in history]
+        rows += [self._row_ansi(c, a) for c, a in zip(self.main.chars, self.main.attrs)]
+
+        out = ["\x1bc\x1b[0m\x1b[H\x1b[2J", "\r\n".join(rows)]
+        if self.alt is not None:
+            # The viewer's main-screen cursor comes back when the app leaves the alt screen
+            saved_x, saved_y = self._saved[:2]
+            out.append(f"\x1b[{saved_y + 1};{saved_x + 1}H\x1b[?1049h\x1b[H\x1b[2J")
+            for y, (chars, attrs) in enumerate(zip(self.alt.chars, self.alt.attrs)):
+                out.append(f"\x1b[{y + 1};1H{self._row_ansi(chars, attrs)}")
+
+        if (self.top, self.bottom) != (0, self.rows - 1):
+            out.append(f"\x1b[{self.top + 1};{self.bottom + 1}r")
+        if not self.autowrap:
+            out.append("\x1b[?7l")
+        if self.title:
+            out.append(f"\x1b]2;{self.title}\x07")
+        out.append(f"\x1b[{self.y + 1};{self.x + 1}H")
+        out.append(f"\x1b[0;{self.attr}m" if self.attr else "\x1b[0m")
+        if not self.cursor_visible:
+            out.append("\x1b[?25l")
+        return ''.join(out)
+
+    @property
+    def in_alt_screen(self) -> bool:
+        self.sync()
+        return self.alt is not None
+
+    def text(self) -> List[str]:
+        """Visible screen as plain text lines"""
+        self.sync()
+        return [self._row_text(chars) for chars in self.buffer.chars]
+
+    def snapshot(self, scrollback_lines: int = 0, ansi: bool = False) -> Dict:
+        """Screen state for 'what is on screen' queries and viewer catch-up"""
+        self.sync()
+        snapshot = {
+            'cols': self.cols,
+            'rows': self.rows,
+            'cursor': {'x': self.x, 'y': self.y, 'visible': self.cursor_visible},
+            'alt_screen': self.in_alt_screen,
+            'title': self.title,
+            'lines': self.text(),
+            'scrollback': [self._row_text(chars) for chars, _ in list(self.scrollback)[-scrollback_lines:]]
+            if scrollback_lines else [],
+        }
+        if ansi:
+            snapshot['ansi'] = self.render_ansi(scrollback_lines)
+        return snapshot
@@ -0,0 +1,578 @@
+#!/usr/bin/env python3
+"""
+Server-side terminal scrollback - a compressed segment ring per window
+Recent segments stay in memory under a global budget; older ones spill to an
+mmap'd ring file in the owner's workspace. Range fetch and regex search run
+against the compressed history so the browser never has to hold it.
+"""
+
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from itertools import chain
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from state_store import process_alive
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# CSI / OSC / two-byte escape sequences - stripped for text views and search
+ANSI_ESCAPE = re.compile(rb'\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-Z\\-_]')
+
+MAX_PATTERN_LENGTH = 1000
+MAX_FETCH_LINES = 5000
+
+_SAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def _safe_name(name: str) -> str:
+    """One path component that cannot leave its directory (no separators, not . or ..)"""
+    name = _SAFE_NAME.sub('_', name)
+    return name.replace('.', '_') if name.strip('.') == '' else name
+
+
+class _Codec:
+    """zstd when the zstandard package is installed, zlib otherwise"""
+
+    def __init__(self, name: str = 'auto', level: Optional[int] = None):
+        if name == 'auto':
+            name = 'zstd' if zstandard is not None else 'zlib'
+        if name == 'zstd' and zstandard is None:
+            logger.warning("zstandard not installed - scrollback falls back to zlib")
+            name = 'zlib'
+
+        self.name = name
+        if name == 'zstd':
+            self.level = 3 if level is None else level
+            self._compressor = zstandard.ZstdCompressor(level=self.level)
+        else:
+            self.level = 1 if level is None else level
+
+    def compress(self, data: bytes) -> bytes:
+        if self.name == 'zstd':
+            return self._compressor.compress(data)
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.name == 'zstd':
+            # Decompressor objects are not thread-safe; they are cheap to create
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+
+class Segment:
+    """A sealed, compressed run of output held in memory or in the spill ring"""
+
+    __slots__ = ('first_line', 'line_count', 'raw_bytes', 'starts_mid_line',
+                 'data', 'spill_offset', 'spill_length', 'evicted')
+
+    def __init__(self, first_line: int, line_count: int, raw_bytes: int, starts_mid_line: bool, data: bytes):
+        self.first_line = first_line
+        self.line_count = line_count
+        self.raw_bytes = raw_bytes
+        self.starts_mid_line = starts_mid_line
+        self.data: Optional[bytes] = data
+        self.spill_offset = 0
+        self.spill_length = 0
+        self.evicted = False
+
+    @property
+    def resident(self) -> bool:
+        return self.data is not None
+
+    @property
+    def end_line(self) -> int:
+        return self.first_line + self.line_count
+
+
+class WindowScrollback:
+    """Scrollback history for one terminal window
+
+    Output is appended to an open buffer and sealed into compressed
+    segments at line boundaries. Mutation happens on the event loop;
+    fetch/search may run on worker threads, so both sides take _lock.
+    """
+
+    def __init__(self, store: 'ScrollbackStore', window_id: str, owner: Optional[str],
+                 spill_path: Optional[Path]):
+        self.store = store
+        self.window_id = window_id
+        self.owner = owner
+        self.created_at = time.time()
+
+        self._lock = threading.Lock()
+        self._segments: Deque[Segment] = deque()
+        self._open = bytearray()
+        self._open_newlines = 0
+        self._next_line = 0
+        self._ends_mid_line = False
+        self._closed = False
+
+        self._spill_path = spill_path
+        self._spill_file = None
+        self._spill_map: Optional[mmap.mmap] = None
+        self._spill_head = 0
+
+        self.stats = {
+            'bytes_in': 0,
+            'segments_sealed': 0,
+            'compressed_bytes': 0,
+            'segments_spilled': 0,
+            'segments_dropped': 0,
+            'lines_dropped': 0,
+            'bytes_dropped': 0,
+        }
+
+    # --- writing (event loop) ---
+
+    def append(self, data: bytes):
+        """Record a chunk of terminal output"""
+        if not data or self._closed:
+            return
+
+        with self._lock:
+            self._open += data
+            self._open_newlines += data.count(b'\n')
+            self.stats['bytes_in'] += len(data)
+
+        if len(self._open) >= self.store.segment_bytes:
+            self._seal()
+
+    def _seal(self):
+        """Compress the open buffer (up to its last newline) into a segment"""
+        with self._lock:
+            cut = self._open.rfind(b'\n') + 1
+            if cut < self.store.segment_bytes // 2:
+                # Very long line - seal everything rather than grow without bound
+                cut = len(self._open)
+
+            raw = bytes(self._open[:cut])
+            del self._open[:cut]
+
+            lines = raw.count(b'\n')
+            self._open_newlines -= lines
+
+            segment = Segment(self._next_line, lines, len(raw), self._ends_mid_line,
+                              self.store.codec.compress(raw))
+            self._segments.append(segment)
+            self._next_line += lines
+            self._ends_mid_line = not raw.endswith(b'\n')
+
+            self.stats['segments_sealed'] += 1
+            self.stats['compressed_bytes'] += len(segment.data)
+
+        self.store._admit(self, segment)
+
+    def _spill(self, segment: Segment):
+        """Move a resident segment into the mmap ring (or drop it if spilling is off)"""
+        with self._lock:
+            if segment.evicted or segment.data is None:
+                return
+
+            size = len(segment.data)
+            if self._closed or size > self.store.spill_bytes or not self._open_spill():
+                self._evict_through(segment)
+                return
+
+            start = self._spill_head
+            if start + size > self.store.spill_bytes:
+                # Wrap: whatever still sits past the head is the oldest data
+                self._evict_spilled(lambda s: s.spill_offset >= start)
+                start = 0
+
+            end = start + size
+            self._evict_spilled(lambda s: s.spill_offset < end and s.spill_offset + s.spill_length > start)
+
+            self._spill_map[start:end] = segment.data
+            self.store._forget(segment)
+            segment.spill_offset = start
+            segment.spill_length = size
+            segment.data = None
+            self._spill_head = end
+            self.stats['segments_spilled'] += 1
+
+    def _open_spill(self) -> bool:
+        if self._spill_map is not None:
+            return True
+        if self._spill_path is None or not self.store.spill_bytes:
+            return False
+
+        try:
+            self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+            self._spill_file = open(self._spill_path, 'w+b')
+            self._spill_file.truncate(self.store.spill_bytes)
+            self._spill_map = mmap.mmap(self._spill_file.fileno(), self.store.spill_bytes)
+            logger.info(f"Scrollback for {self.window_id} spilling to {self._spill_path}")
+            return True
+        except OSError as e:
+            logger.error(f"Cannot open scrollback spill file {self._spill_path}: {e}")
+            self._spill_path = None
+            self._close_spill()
+            return False
+
+    def _evict_spilled(self, overlaps):
+        """Drop the oldest spilled segments while they occupy the ring space being reused"""
+        while self._segments and not self._segments[0].resident and overlaps(self._segments[0]):
+            self._drop(self._segments.popleft())
+
+    def _evict_through(self, segment: Segment):
+        """Drop segments up to and including segment (history is contiguous)"""
+        while self._segments:
+            oldest = self._segments.popleft()
+            if oldest.resident:
+                self.store._forget(oldest)
+            self._drop(oldest)
+            if oldest is segment:
+                break
+
+    def _drop(self, segment: Segment):
+        segment.evicted = True
+        segment.data = None
+        self.stats['segments_dropped'] += 1
+        self.stats['lines_dropped'] += segment.line_count
+        self.stats['bytes_dropped'] += segment.raw_bytes
+
+    def close(self):
+        """Release memory and delete the spill file"""
+        with self._lock:
+            self._closed = True
+            for segment in self._segments:
+                if segment.resident:
+                    self.store._forget(segment)
+                segment.evicted = True
+                segment.data = None
+            self._segments.clear()
+            self._open = bytearray()
+            self._close_spill()
+
+    def _close_spill(self):
+        if self._spill_map is not None:
+            self._spill_map.close()
+            self._spill_map = None
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            try:
+                self._spill_path.unlink()
+            except (OSError, AttributeError):
+                pass
+
+    # --- reading (any thread) ---
+
+    @property
+    def first_line(self) -> int:
+        with self._lock:
+            return self._segments[0].first_line if self._segments else self._next_line
+
+    @property
+    def total_lines(self) -> int:
+        """Lines seen so far, counting a trailing partial line"""
+        with self._lock:
+            return self._next_line + self._open_newlines + (1 if self._open and not self._open.endswith(b'\n') else 0)
+
+    def _snapshot(self, from_line: Optional[int] = None) -> Tuple[List[Segment], bytes, int]:
+        """Segments holding from_line onwards (whole history if None), the open buffer and its first line"""
+        with self._lock:
+            segments = list(self._segments)
+            pending = bytes(self._open)
+            pending_line = self._next_line
+            pending_mid_line = self._ends_mid_line
+
+        if from_line is not None:
+            index = len(segments)
+            for position, segment in enumerate(segments):
+                if segment.end_line >= from_line:
+                    index = position
+                    break
+            # Back up to where the requested line actually begins
+            while index > 0 and (segments[index].starts_mid_line if index < len(segments) else pending_mid_line):
+                index -= 1
+            segments = segments[index:]
+
+        return segments, pending, pending_line
+
+    def _read_segment(self, segment: Segment) -> Optional[bytes]:
+        """Decompressed bytes of a segment, or None if it was evicted meanwhile"""
+        with self._lock:
+            if segment.evicted:
+                return None
+            if segment.data is not None:
+                blob = segment.data
+            else:
+                blob = self._spill_map[segment.spill_offset:segment.spill_offset + segment.spill_length]
+
+        try:
+            return self.store.codec.decompress(blob)
+        except Exception as e:
+            logger.debug(f"Scrollback segment for {self.window_id} unreadable: {e}")
+            return None
+
+    def _iter_blocks(self, from_line: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+        """Yield (first line number, bytes of whole lines joined by newlines) per stored chunk"""
+        segments, pending, pending_line = self._snapshot(from_line)
+        chunks = ((segment.first_line, self._read_segment(segment)) for segment in segments)
+        carry = b''
+        next_line = None
+
+        for first_line, raw in chain(chunks, [(pending_line, pending)]):
+            if raw is None:
+                continue
+            if first_line != next_line:
+                # Start, or a gap left by segments evicted while we were reading
+                carry = b''
+                next_line = first_line
+
+            block = carry + raw
+            cut = block.rfind(b'\n')
+            if cut < 0:
+                carry = block
+                continue
+
+            body, carry = block[:cut], block[cut + 1:]
+            yield next_line, body
+            next_line += body.count(b'\n') + 1
+
+        if carry:
+            yield next_line, carry
+
+    def iter_lines(self, from_line: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+        """Yield (line number, raw line bytes) from the retained history"""
+        for first_line, body in self._iter_blocks(from_line):
+            for offset, line in enumerate(body.split(b'\n')):
+                yield first_line + offset, line
+
+    def fetch(self, start: Optional[int] = None, count: int = 200, ansi: bool = False) -> Dict:
+        """Lines [start, start + count); the newest count lines when start is None"""
+        count = max(1, min(int(count), MAX_FETCH_LINES))
+        total = self.total_lines
+        if start is None:
+            start = max(0, total - count)
+        start = max(int(start), self.first_line)
+
+        lines = []
+        for line_no, line in self.iter_lines(start):
+            if line_no < start:
+                continue
+            if line_no >= start + count:
+                break
+            lines.append(_render_line(line, ansi))
+
+        return {
+            'window_id': self.window_id,
+            'first_line': self.first_line,
+            'total_lines': total,
+            'start': start,
+            'lines': lines,
+        }
+
+    def search(self, pattern: str, ignore_case: bool = False, max_matches: int = 500,
+               start: Optional[int] = None, end: Optional[int] = None) -> Dict:
+        """Regex search over the history (escape sequences stripped)"""
+        if not pattern or len(pattern) > MAX_PATTERN_LENGTH:
+            raise ValueError(f"Pattern must be 1-{MAX_PATTERN_LENGTH} characters")
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        try:
+            regex = re.compile(pattern, flags)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+
+        started = time.monotonic()
+        max_matches = max(1, min(int(max_matches), 10000))
+        matches = []
+        scanned = 0
+        truncated = False
+
+        # One regex pass per decompressed block; hits are mapped back to lines
+        for first_line, body in self._iter_blocks(start):
+            text = _render_line(body, ansi=False)
+            line_no = first_line
+            line_start = 0
+            position = 0
+
+            while len(matches) < max_matches:
+                found = regex.search(text, position)
+                if not found:
+                    break
+
+                line_no += text.count('\n', line_start, found.start())
+                line_start = text.rfind('\n', 0, found.start()) + 1
+                line_end = text.find('\n', found.start())
+                if line_end < 0:
+                    line_end = len(text)
+
+                if end is not None and line_no >= end:
+                    break
+                if start is None or line_no >= start:
+                    matches.append({
+                        'line': line_no,
+                        'text': text[line_start:line_end],
+                        'span': [found.start() - line_start, min(found.end(), line_end) - line_start]
+                    })
+
+                # Next line - one hit per line
+                position = line_start = line_end + 1
+                line_no += 1
+                if position > len(text):
+                    break
+
+            scanned += body.count(b'\n') + 1
+            if len(matches) >= max_matches:
+                truncated = True
+                break
+            if end is not None and first_line + body.count(b'\n') >= end:
+                break
+
+        return {
+            'window_id': self.window_id,
+            'pattern': pattern,
+            'matches': matches,
+            'truncated': truncated,
+            'scanned_lines': scanned,
+            'first_line': self.first_line,
+            'total_lines': self.total_lines,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+        }
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            resident = [s for s in self._segments if s.resident]
+            spilled = [s for s in self._segments if not s.resident]
+            raw_sealed = sum(s.raw_bytes for s in self._segments)
+            stored = sum(len(s.data) for s in resident) + sum(s.spill_length for s in spilled)
+            return {
+                'owner': self.owner,
+                'first_line': self._segments[0].first_line if self._segments else self._next_line,
+                'sealed_lines': self._next_line,
+                'open_bytes': len(self._open),
+                'resident_segments': len(resident),
+                'resident_bytes': sum(len(s.data) for s in resident),
+                'spilled_segments': len(spilled),
+                'spilled_bytes': sum(s.spill_length for s in spilled),
+                'compression_ratio': round(raw_sealed / stored, 2) if stored else None,
+                **self.stats,
+            }
+
+
+def _render_line(line: bytes, ansi: bool) -> str:
+    if not ansi:
+        line = ANSI_ESCAPE.sub(b'', line).replace(b'\r', b'')
+    return line.decode('utf-8', errors='replace')
+
+
+class ScrollbackStore:
+    """All windows' scrollback under one resident-memory budget
+
+    Segments are admitted in seal order; once compressed resident bytes
+    exceed memory_budget_bytes the oldest segments (across all windows)
+    move to their window's spill ring, or are dropped when the window has
+    no workspace to spill into.
+    """
+
+    def __init__(self, base_dir: Path, memory_budget_bytes: int = 67108864, segment_bytes: int = 262144,
+                 spill_bytes: int = 67108864, compression: str = 'auto', level: Optional[int] = None):
+        self.base_dir = Path(base_dir)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.segment_bytes = segment_bytes
+        self.spill_bytes = spill_bytes
+        self.codec = _Codec(compression, level)
+
+        self._windows: Dict[str, WindowScrollback] = {}
+        self._resident: Deque[Tuple[WindowScrollback, Segment]] = deque()
+        self.resident_bytes = 0
+        self.stats = {'segments_spilled': 0, 'segments_dropped': 0}
+
+        self._remove_stale_spill_files()
+        logger.info(f"Scrollback store using {self.codec.name} (level {self.codec.level}), "
+                    f"memory budget {memory_budget_bytes} bytes")
+
+    def _remove_stale_spill_files(self):
+        """Spill rings only live as long as their window - clear leftovers from a crash
+
+        Rings live under a directory per process (pid), so several uvicorn
+        workers sharing the workspace only clear those of processes that are
+        gone (or of an earlier process that had this pid).
+        """
+        for directory in self.base_dir.glob('*/scrollback/*'):
+            if not directory.is_dir() or not directory.name.isdigit():
+                continue
+            pid = int(directory.name)
+            if pid != os.getpid() and process_alive(pid):
+                continue
+            for path in directory.glob('*.ring'):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            try:
+                directory.rmdir()
+            except OSError:
+                pass
+
+    def open(self, window_id: str, owner: Optional[str]) -> WindowScrollback:
+        """Start a fresh history for window_id (replacing any previous one)"""
+        existing = self._windows.get(window_id)
+        if existing is not None:
+            self.close(existing)
+
+        spill_path = None
+        if owner:
+            spill_path = (self.base_dir / _safe_name(owner) / 'scrollback' / str(os.getpid())
+                          / f"{_safe_name(window_id)}.ring")
+
+        window = WindowScrollback(self, window_id, owner, spill_path)
+        self._windows[window_id] = window
+        return window
+
+    def get(self, window_id: str) -> Optional[WindowScrollback]:
+        return self._windows.get(window_id)
+
+    def list_windows(self, owner: Optional[str] = None) -> List[WindowScrollback]:
+        return [w for w in self._windows.values() if owner is None or w.owner == owner]
+
+    def close(self, window: WindowScrollback):
+        """Discard a window's history"""
+        if self._windows.get(window.window_id) is window:
+            del self._windows[window.window_id]
+        window.close()
+        self._resident = deque(entry for entry in self._resident if entry[0] is not window)
+
+    def _admit(self, window: WindowScrollback, segment: Segment):
+        self._resident.append((window, segment))
+        self.resident_bytes += len(segment.data)
+
+        while self.resident_bytes > self.memory_budget_bytes and self._resident:
+            oldest_window, oldest = self._resident.popleft()
+            if not oldest.resident:
+                continue
+            # _spill() calls _forget() for whatever leaves memory
+            oldest_window._spill(oldest)
+            if oldest.evicted:
+                self.stats['segments_dropped'] += 1
+            else:
+                self.stats['segments_spilled'] += 1
+
+    def _forget(self, segment: Segment):
+        """A resident segment left memory other than through _admit's eviction"""
+        if segment.data is not None:
+            self.resident_bytes -= len(segment.data)
+
+    def get_stats(self) -> Dict:
+        return {
+            'windows': len(self._windows),
+            'compression': self.codec.name,
+            'memory_budget_bytes': self.memory_budget_bytes,
+            'resident_bytes': self.resident_bytes,
+            'spill_bytes_per_window': self.spill_bytes,
+            **self.stats,
+        }
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Server launcher driven by the config.yaml server section
+Development reload, uvicorn multi-worker, or a pre-fork supervisor over one bound socket
+"""
+
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import httptools
+except ImportError:
+    httptools = None
+
+logger = logging.getLogger(__name__)
+
+APP = "main:app"
+
+
+def _resolve_loop(name: str) -> str:
+    if name == 'uvloop' and uvloop is None:
+        logger.warning("server.loop is uvloop but uvloop is not installed - using asyncio")
+        return 'asyncio'
+    return name
+
+
+def _resolve_http(name: str) -> str:
+    if name == 'httptools' and httptools is None:
+        logger.warning("server.http is httptools but httptools is not installed - using h11")
+        return 'h11'
+    return name
+
+
+def build_uvicorn_options(server_config: Dict) -> Dict:
+    """uvicorn.Config keyword arguments for production from the server section"""
+    limit_concurrency = int(server_config.get('limit_concurrency', 0))
+    limit_max_requests = int(server_config.get('limit_max_requests', 0))
+    return {
+        'host': server_config.get('host', '0.0.0.0'),
+        'port': int(server_config.get('port', 8050)),
+        # auto picks uvloop/httptools when they are installed
+        'loop': _resolve_loop(server_config.get('loop', 'auto')),
+        'http': _resolve_http(server_config.get('http', 'auto')),
+        'backlog': int(server_config.get('backlog', 2048)),
+        'timeout_keep_alive': int(server_config.get('timeout_keep_alive', 5)),
+        'timeout_graceful_shutdown': int(server_config.get('timeout_graceful_shutdown', 10)),
+        'limit_concurrency': limit_concurrency or None,
+        'limit_max_requests': limit_max_requests or None,
+        'ws_ping_interval': float(server_config.get('ws_ping_interval', 20)),
+        'ws_ping_timeout': float(server_config.get('ws_ping_timeout', 20)),
+        'ws_max_size': int(server_config.get('ws_max_size', 16777216)),
+        'ws_max_queue': int(server_config.get('ws_max_queue', 32)),
+        'ws_per_message_deflate': bool(server_config.get('ws_per_message_deflate', True)),
+        'proxy_headers': bool(server_config.get('proxy_headers', True)),
+        'forwarded_allow_ips': server_config.get('forwarded_allow_ips', '127.0.0.1'),
+        'access_log': bool(server_config.get('access_log', False)),
+        'log_level': server_config.get('log_level', 'info'),
+    }
+
+
+def _bind_socket(host: str, port: int, backlog: int, reuse_port: bool = False) -> socket.socket:
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkSupervisor:
+    """Forks uvicorn workers that serve one pre-bound socket and restarts any that die
+
+    Forking skips the interpreter start and imports uvicorn's spawn-based
+    workers pay on every (re)start. With reuse_port each worker binds its
+    own SO_REUSEPORT socket and the kernel spreads new connections evenly
+    instead of waking every worker for each accept.
+    """
+
+    def __init__(self, workers: int, options: Dict, reuse_port: bool = False):
+        self.workers = workers
+        self.options = options
+        self.reuse_port = reuse_port
+        self.children: Dict[int, int] = {}  # pid -> worker index
+        self.started: Dict[int, float] = {}  # worker index -> last start time
+        self.crashes: Dict[int, int] = {}  # worker index -> fast exits in a row
+        self.stopping = False
+        self._sock: Optional[socket.socket] = None
+
+    def run(self):
+        options = self.options
+        if not self.reuse_port:
+            self._sock = _bind_socket(options['host'], options['port'], options['backlog'])
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        logger.info(f"Pre-forking {self.workers} workers on {options['host']}:{options['port']}"
+                    f"{' (SO_REUSEPORT)' if self.reuse_port else ''}")
+        for index in range(self.workers):
+            self._spawn(index)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            self._restart(index, pid, status)
+
+        logger.info("All workers stopped")
+
+    def _restart(self, index: int, pid: int, status: int):
+        # Back off a worker that keeps dying right after start (bad config, port clash)
+        if time.time() - self.started.get(index, 0) < 5:
+            self.crashes[index] = self.crashes.get(index, 0) + 1
+        else:
+            self.crashes[index] = 0
+        delay = min(2 ** self.crashes[index], 30) if self.crashes[index] else 0
+
+        logger.error(f"Worker {index} (pid {pid}) exited with status {status} - restarting in {delay}s")
+        if delay:
+            time.sleep(delay)
+        if not self.stopping:
+            self._spawn(index)
+
+    def _spawn(self, index: int):
+        self.started[index] = time.time()
+        pid = os.fork()
+        if pid:
+            self.children[pid] = index
+            return
+
+        # Child: uvicorn installs its own graceful-shutdown handlers
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            options = self.options
+            sock = self._sock or _bind_socket(options['host'], options['port'], options['backlog'], reuse_port=True)
+            server = uvicorn.Server(uvicorn.Config(APP, **options))
+            server.run(sockets=[sock])
+        except BaseException as e:
+            logger.error(f"Worker {index} failed: {e!r}")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f"Stopping {len(self.children)} workers")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def launch(config: Dict):
+    """Start the backend the way the server section asks"""
+    server_config = dict(config.get('server', {}) or {})
+    # Deployment environment wins over the file
+    for key, env in (('host', 'VELOCITERM_HOST'), ('port', 'VELOCITERM_PORT'), ('workers', 'VELOCITERM_WORKERS')):
+        if os.getenv(env):
+            server_config[key] = os.getenv(env)
+    host = server_config.get('host', '0.0.0.0')
+    port = int(server_config.get('port', 8050))
+
+    if server_config.get('reload', False):
+        # Development: file watcher and a single process
+        uvicorn.run(APP, host=host, port=port, reload=True, log_level=server_config.get('log_level', 'info'))
+        return
+
+    options = build_uvicorn_options(server_config)
+    workers = int(server_config.get('workers', 1)) or os.cpu_count() or 1
+
+    state_backend = (config.get('state') or {}).get('backend', 'memory')
+    if workers > 1 and state_backend == 'memory':
+        logger.warning(f"{workers} workers with state.backend=memory - cookie sessions and window pins "
+                       f"are per worker; use state.backend: sqlite")
+
+    logger.info(f"Production server: {workers} worker(s), loop={options['loop']}, http={options['http']}, "
+                f"backlog={options['backlog']}, limit_concurrency={options['limit_concurrency']}")
+
+    if workers > 1 and server_config.get('prefork', False) and hasattr(os, 'fork'):
+        PreforkSupervisor(workers, options, reuse_port=bool(server_config.get('reuse_port', False))).run()
+    else:
+        uvicorn.run(APP, workers=workers, **options)
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Seekable playback of recorded sessions
+A keyframe index (screen state every N seconds or N bytes of output, built
+once with the server-side emulator and kept next to the recording) turns a
+seek into: restore the nearest earlier keyframe, emulate the few events up to
+the target, send one repaint. Playback streams the recorded output to a
+terminal websocket at 1x-64x with idle gaps capped.
+"""
+
+import asyncio
+import bisect
+import gzip
+import io
+import json
+import logging
+import os
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from screen_model import ScreenModel
+from session_recorder import META_FILE, list_recordings, recordings_dir
+from terminal_input import join_input
+from terminal_protocol import TerminalStream
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'keyframes.json.gz'
+INDEX_VERSION = 1
+
+# Output due within one frame is sent as one websocket message
+FRAME_SECONDS = 0.016
+
+# Key bindings while a playback window has focus
+KEY_SEEK_SECONDS = 10.0
+
+
+def _open_segment(path: Path):
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise RuntimeError(f"zstandard not installed - cannot read {path.name}")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return gzip.open(path, 'rb')
+
+
+def _skip(f, count: int):
+    """Advance a decompressing reader by count bytes"""
+    while count > 0:
+        chunk = f.read(min(count, 1048576))
+        if not chunk:
+            break
+        count -= len(chunk)
+
+
+def iter_events(path: Path, segments: List[Dict], segment: int = 0,
+                offset: int = 0) -> Iterator[Tuple[float, str, str, int, int, int]]:
+    """(time, code, data, segment, line_offset, next_offset) for events from a position
+
+    Offsets are uncompressed byte offsets within a segment. A live recording's
+    last segment may end mid-line or mid-stream; reading stops there.
+    """
+    for index in range(segment, len(segments)):
+        position = offset if index == segment else 0
+        base = segments[index].get('offset', 0.0)
+        try:
+            with _open_segment(path / segments[index]['file']) as f:
+                _skip(f, position)
+                for line in f:
+                    start = position
+                    position += len(line)
+                    if not line.endswith(b'\n'):
+                        return
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    # Segment headers are objects, events are [time, code, data]
+                    if isinstance(event, list) and len(event) >= 3:
+                        yield base + event[0], event[1], event[2], index, start, position
+        except (EOFError, OSError, zlib.error) as e:
+            logger.debug(f"Recording segment {segments[index]['file']} ends early: {e}")
+            return
+
+
+def _read_header(path: Path, segments: List[Dict]) -> Dict:
+    try:
+        with _open_segment(path / segments[0]['file']) as f:
+            return json.loads(f.readline())
+    except (EOFError, OSError, ValueError, zlib.error, IndexError):
+        return {}
+
+
+def _parse_size(data: str) -> Tuple[int, int]:
+    cols, rows = (int(v) for v in data.split('x'))
+    return cols, rows
+
+
+class KeyframeIndex:
+    """Screen keyframes of one recording, for seeking"""
+
+    def __init__(self, path: Path, meta: Dict, keyframes: List[Dict], signature: List):
+        self.path = path
+        self.meta = meta
+        self.segments = meta.get('segments') or []
+        self.keyframes = keyframes
+        self.signature = signature
+        self._times = [keyframe['time'] for keyframe in keyframes]
+
+    @property
+    def duration(self) -> float:
+        return float(self.meta.get('duration') or 0.0)
+
+    def seek(self, target: float) -> Tuple[ScreenModel, int, int]:
+        """Screen at target plus the position of the first event after it"""
+        keyframe = self.keyframes[max(0, bisect.bisect_right(self._times, target) - 1)]
+        model = ScreenModel(keyframe['cols'], keyframe['rows'], scrollback=0)
+        model.feed(keyframe['screen'])
+
+        segment, offset = keyframe['segment'], keyframe['offset']
+        for t, code, data, index, start, end in iter_events(self.path, self.segments, segment, offset):
+            if t > target:
+                return model, index, start
+            if code == 'o':
+                model.feed(data)
+            elif code == 'r':
+                model.resize(*_parse_size(data))
+            segment, offset = index, end
+        return model, segment, offset
+
+    def get_stats(self) -> Dict:
+        return {
+            'keyframes': len(self.keyframes),
+            'duration': self.duration,
+            'segments': len(self.segments),
+        }
+
+
+class PlaybackService:
+    """Recording lookup, keyframe indexes (built once, cached) and websocket players"""
+
+    def __init__(self, base_dir: Path, keyframe_interval: float = 30.0, keyframe_bytes: int = 1048576,
+                 max_speed: float = 64.0, idle_limit: float = 2.0, cached_indexes: int = 16):
+        self.base_dir = Path(base_dir)
+        self.keyframe_interval = keyframe_interval
+        self.keyframe_bytes = keyframe_bytes
+        self.max_speed = max_speed
+        self.idle_limit = idle_limit
+        self.cached_indexes = cached_indexes
+        self._indexes: 'OrderedDict[str, KeyframeIndex]' = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.players = 0
+        self.stats = {'indexes_built': 0, 'indexes_loaded': 0, 'index_hits': 0, 'seeks': 0,
+                      'build_seconds': 0.0}
+
+    # --- recordings ---
+
+    def list_recordings(self, owner: str) -> List[Dict]:
+        return list_recordings(self.base_dir, owner)
+
+    def recording_path(self, owner: str, recording_id: str) -> Optional[Path]:
+        """owner's recording directory, or None if the id is not one of theirs"""
+        if not owner or not recording_id or recording_id in ('.', '..') or '/' in recording_id \
+                or '\\' in recording_id:
+            return None
+        path = recordings_dir(self.base_dir, owner) / recording_id
+        return path if (path / META_FILE).is_file() else None
+
+    def load_meta(self, path: Path) -> Optional[Dict]:
+        try:
+            with open(path / META_FILE) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable recording metadata in {path}: {e}")
+            return None
+
+    # --- keyframe index ---
+
+    def _signature(self, path: Path, meta: Dict) -> List:
+        signature = [self.keyframe_interval, self.keyframe_bytes]
+        for segment in meta.get('segments') or []:
+            try:
+                size = (path / segment['file']).stat().st_size
+            except OSError:
+                size = -1
+            signature.append([segment['file'], size])
+        return signature
+
+    async def get_index(self, path: Path) -> Optional[KeyframeIndex]:
+        """Keyframe index for a recording; built in a thread on first use"""
+        meta = await asyncio.to_thread(self.load_meta, path)
+        if not meta or not meta.get('segments'):
+            return None
+
+        key = str(path)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            signature = await asyncio.to_thread(self._signature, path, meta)
+            index = self._indexes.get(key)
+            if index is not None and index.signature == signature:
+                self._indexes.move_to_end(key)
+                self.stats['index_hits'] += 1
+                return index
+
+            index = await asyncio.to_thread(self._load_or_build, path, meta, signature)
+            self._indexes[key] = index
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.cached_indexes:
+                self._indexes.popitem(last=False)
+            return index
+
+    def _load_or_build(self, path: Path, meta: Dict, signature: List) -> KeyframeIndex:
+        index_path = path / INDEX_FILE
+        try:
+            with gzip.open(index_path, 'rt') as f:
+                stored = json.load(f)
+            if stored.get('version') == INDEX_VERSION and stored.get('signature') == signature:
+                self.stats['indexes_loaded'] += 1
+                return KeyframeIndex(path, meta, stored['keyframes'], signature)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, EOFError, KeyError) as e:
+            logger.warning(f"Rebuilding unreadable keyframe index {index_path}: {e}")
+
+        started = time.monotonic()
+        keyframes = self._build_keyframes(path, meta)
+        elapsed = time.monotonic() - started
+        self.stats['indexes_built'] += 1
+        self.stats['build_seconds'] += elapsed
+        logger.info(f"Built {len(keyframes)} keyframes for {path.name} in {elapsed:.2f}s")
+
+        # Live recordings keep growing; only finished ones are worth persisting
+        if meta.get('ended_at'):
+            try:
+                tmp = path / (INDEX_FILE + '.tmp')
+                with gzip.open(tmp, 'wt') as f:
+                    json.dump({'version': INDEX_VERSION, 'signature': signature, 'keyframes': keyframes}, f)
+                os.replace(tmp, index_path)
+            except OSError as e:
+                logger.warning(f"Could not save keyframe index {index_path}: {e}")
+
+        return KeyframeIndex(path, meta, keyframes, signature)
+
+    def _build_keyframes(self, path: Path, meta: Dict) -> List[Dict]:
+        segments = meta['segments']
+        header = _read_header(path, segments)
+        model = ScreenModel(header.get('width', 80), header.get('height', 24), scrollback=0)
+
+        # Keyframe 0 is the empty screen at the start of the first segment
+        keyframes = [{'time': 0.0, 'segment': 0, 'offset': 0, 'cols': model.cols, 'rows': model.rows,
+                      'screen': ''}]
+        last_time, pending_bytes = 0.0, 0
+        for t, code, data, index, _, end in iter_events(path, segments):
+            if code == 'o':
+                model.feed(data)
+                pending_bytes += len(data)
+            elif code == 'r':
+                model.resize(*_parse_size(data))
+            else:
+                continue
+
+            if t - last_time >= self.keyframe_interval or pending_bytes >= self.keyframe_bytes:
+                keyframes.append({'time': t, 'segment': index, 'offset': end, 'cols': model.cols,
+                                  'rows': model.rows, 'screen': model.render_ansi()})
+                last_time, pending_bytes = t, 0
+        return keyframes
+
+    async def screen_at(self, path: Path, target: float) -> Optional[Dict]:
+        """Screen contents of a recording at a session time"""
+        index = await self.get_index(path)
+        if index is None:
+            return None
+        self.stats['seeks'] += 1
+        model, _, _ = await asyncio.to_thread(index.seek, max(0.0, target))
+        return {'time': target, **model.snapshot(ansi=True)}
+
+    # --- players ---
+
+    async def open_player(self, stream: TerminalStream, path: Path, speed: float = 1.0) -> Optional['PlaybackPlayer']:
+        index = await self.get_index(path)
+        if index is None:
+            return None
+        return PlaybackPlayer(self, stream, index, speed)
+
+    def get_stats(self) -> Dict:
+        return {'cached_indexes': len(self._indexes), 'players': self.players, **self.stats}
+
+
+class PlaybackPlayer:
+    """Streams one recording to a websocket; seek/speed/pause via control messages or keys"""
+
+    def __init__(self, service: PlaybackService, stream: TerminalStream, index: KeyframeIndex, speed: float = 1.0):
+        self.service = service
+        self.stream = stream
+        self.index = index
+        self.speed = self._clamp_speed(speed)
+        self.position = 0.0
+        self.paused = False
+        self.ended = False
+        self._resume = asyncio.Event()
+        self._resume.set()
+        self._task: Optional[asyncio.Task] = None
+        self._status_task: Optional[asyncio.Task] = None
+
+    def _clamp_speed(self, speed) -> float:
+        try:
+            return min(max(float(speed), 1.0), self.service.max_speed)
+        except (TypeError, ValueError):
+            return 1.0
+
+    async def start(self):
+        self.service.players += 1
+        await self.stream.send_json({'type': 'playback_info', 'recording_id': self.index.meta.get('recording_id'),
+                                     'title': self.index.meta.get('title'), 'duration': self.index.duration,
+                                     'keyframes': len(self.index.keyframes)})
+        self._task = asyncio.create_task(self._play(0.0))
+        self._status_task = asyncio.create_task(self._report_status())
+
+    async def handle(self, message: Dict):
+        """Apply a client message: playback_control, or keys typed into the window"""
+        kind = message.get('type')
+        if kind == 'playback_control':
+            action = message.get('action')
+            if action == 'seek':
+                await self.seek(message.get('time', 0.0))
+            elif action == 'speed':
+                self.speed = self._clamp_speed(message.get('speed', 1.0))
+            elif action == 'pause':
+                self.set_paused(True)
+            elif action == 'resume':
+                self.set_paused(False)
+        elif kind == 'input':
+            keys = join_input(message.get('data', ''))
+            if keys == b' ':
+                self.set_paused(not self.paused)
+            elif keys in (b'+', b'='):
+                self.speed = self._clamp_speed(self.speed * 2)
+            elif keys == b'-':
+                self.speed = self._clamp_speed(self.speed / 2)
+            elif keys in (b'\x1b[C', b'\x1bOC'):
+                await self.seek(self.position + KEY_SEEK_SECONDS)
+            elif keys in (b'\x1b[D', b'\x1bOD'):
+                await self.seek(self.position - KEY_SEEK_SECONDS)
+            else:
+                return
+        else:
+            return
+        await self._send_status()
+
+    def set_paused(self, paused: bool):
+        self.paused = bool(paused)
+        if self.paused:
+            self._resume.clear()
+        else:
+            self._resume.set()
+
+    async def seek(self, target):
+        try:
+            target = min(max(float(target), 0.0), self.index.duration)
+        except (TypeError, ValueError):
+            return
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.service.stats['seeks'] += 1
+        self._task = asyncio.create_task(self._play(target))
+
+    async def _play(self, start: float):
+        self.ended = False
+        segment, offset = 0, 0
+        if start > 0:
+            # Nearest earlier keyframe plus a short emulation, then one repaint
+            model, segment, offset = await asyncio.to_thread(self.index.seek, start)
+            await self.stream.send_json({'type': 'playback_resize', 'cols': model.cols, 'rows': model.rows})
+            await self.stream.send_output(model.render_ansi().encode('utf-8'))
+        else:
+            keyframe = self.index.keyframes[0]
+            await self.stream.send_json({'type': 'playback_resize', 'cols': keyframe['cols'],
+                                         'rows': keyframe['rows']})
+            await self.stream.send_output(b'\x1bc')
+        self.position = start
+
+        events = iter_events(self.index.path, self.index.segments, segment, offset)
+        pending = bytearray()
+        owed = 0.0
+        try:
+            while True:
+                await self._resume.wait()
+                # Decompression and JSON parsing stay off the event loop
+                batch = await asyncio.to_thread(_next_batch, events)
+                if not batch:
+                    break
+                for t, code, data in batch:
+                    owed += min(max(t - self.position, 0.0), self.service.idle_limit) / self.speed
+                    if owed >= FRAME_SECONDS:
+                        if pending:
+                            await self.stream.send_output(bytes(pending))
+                            pending.clear()
+                        await asyncio.sleep(owed)
+                        owed = 0.0
+                        await self._resume.wait()
+                    self.position = max(self.position, t)
+
+                    if code == 'o':
+                        pending += data.encode('utf-8')
+                    elif code in ('r', 'm'):
+                        if pending:
+                            await self.stream.send_output(bytes(pending))
+                            pending.clear()
+                        if code == 'r':
+                            cols, rows = _parse_size(data)
+                            await self.stream.send_json({'type': 'playback_resize', 'cols': cols, 'rows': rows})
+                        else:
+                            await self.stream.send_json({'type': 'playback_marker', 'time': t, 'message': data})
+            if pending:
+                await self.stream.send_output(bytes(pending))
+            self.position = self.index.duration
+            self.ended = True
+            await self._send_status()
+        finally:
+            try:
+                events.close()
+            except ValueError:
+                # Still running in the reader thread after a cancel; it is dropped with the task
+                pass
+
+    async def _report_status(self):
+        while True:
+            await asyncio.sleep(1.0)
+            if not self.ended:
+                await self._send_status()
+
+    async def _send_status(self):
+        await self.stream.send_json({
+            'type': 'playback_status',
+            'time': round(self.position, 3),
+            'duration': self.index.duration,
+            'speed': self.speed,
+            'paused': self.paused,
+            'ended': self.ended,
+        })
+
+    async def close(self):
+        for task in (self._task, self._status_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._task = self._status_task = None
+        self.service.players -= 1
+
+
+def _next_batch(events: Iterator, size: int = 512) -> List[Tuple[float, str, str]]:
+    batch = []
+    for t, code, data, _, _, _ in events:
+        if code != 'i':
+            batch.append((t, code, data))
+            if len(batch) >= size:
+                break
+    return batch
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Session recording - asciicast v2 segments in the owner's workspace
+Terminals only enqueue events; one background thread batches, encodes,
+compresses and rotates files. When the disk cannot keep up the bounded
+queue drops events (counted, and marked in the recording) instead of
+stalling terminal output.
+"""
+
+import atexit
+import codecs
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from terminal_input import join_input
+
+logger = logging.getLogger(__name__)
+
+_SAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+
+META_FILE = 'recording.json'
+
+
+def recordings_dir(base_dir: Path, owner: str) -> Path:
+    """Directory holding owner's recordings"""
+    return Path(base_dir) / _SAFE_NAME.sub('_', owner) / 'recordings'
+
+
+def list_recordings(base_dir: Path, owner: str) -> List[Dict]:
+    """Metadata of owner's recordings, newest first"""
+    recordings = []
+    for meta_path in recordings_dir(base_dir, owner).glob(f'*/{META_FILE}'):
+        try:
+            with open(meta_path) as f:
+                recordings.append(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.debug(f"Skipping unreadable recording metadata {meta_path}: {e}")
+    return sorted(recordings, key=lambda meta: meta.get('started_at') or 0, reverse=True)
+
+
+class Recording:
+    """One window's recording; output/input/resize are cheap enqueue-only calls"""
+
+    def __init__(self, recorder: 'SessionRecorder', recording_id: str, path: Path, window_id: str,
+                 owner: str, kind: str, width: int, height: int, title: Optional[str]):
+        self.recorder = recorder
+        self.recording_id = recording_id
+        self.path = path
+        self.window_id = window_id
+        self.owner = owner
+        self.kind = kind
+        self.width = width
+        self.height = height
+        self.title = title
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.ended_at: Optional[float] = None
+        self.closed = False
+
+        # Enqueue side (event loop) counters
+        self.accepted = 0
+        self.dropped = 0
+
+        # Writer thread state
+        self.processed = 0
+        self.marked_dropped = 0
+        self.segments: List[Dict] = []
+        self._file = None
+        self._raw = None
+        self._segment_offset = 0.0
+        self._last_time = 0.0
+        self._decoders = {
+            'o': codecs.getincrementaldecoder('utf-8')(errors='replace'),
+            'i': codecs.getincrementaldecoder('utf-8')(errors='replace'),
+        }
+
+    def output(self, data: bytes):
+        self.recorder._enqueue(self, 'o', data)
+
+    def input(self, data):
+        if self.recorder.record_input:
+            self.recorder._enqueue(self, 'i', data)
+
+    def resize(self, cols: int, rows: int):
+        self.recorder._enqueue(self, 'r', f"{cols}x{rows}")
+
+    def close(self):
+        self.recorder.finish(self)
+
+    def get_stats(self) -> Dict:
+        return {
+            'recording_id': self.recording_id,
+            'events': self.accepted,
+            'dropped_events': self.dropped,
+            'segments': len(self.segments) + (1 if self._file else 0),
+        }
+
+
+class SessionRecorder:
+    """Shared background writer for all session recordings"""
+
+    def __init__(self, base_dir: Path, segment_bytes: int = 16777216, compression: str = 'auto',
+                 level: Optional[int] = None, queue_events: int = 65536, flush_interval: float = 0.5,
+                 record_input: bool = True):
+        self.base_dir = Path(base_dir)
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.record_input = record_input
+
+        if compression == 'auto':
+            compression = 'zstd' if zstandard is not None else 'gzip'
+        if compression == 'zstd' and zstandard is None:
+            logger.warning("zstandard not installed - recordings fall back to gzip")
+            compression = 'gzip'
+        self.compression = compression
+        self.level = level if level is not None else (3 if compression == 'zstd' else 6)
+        self.extension = '.cast.zst' if compression == 'zstd' else '.cast.gz'
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_events)
+        self._closing: List[Recording] = []
+        self._closing_lock = threading.Lock()
+        self._active: Dict[str, Recording] = {}
+        self._stop = threading.Event()
+        self.stats = {'recordings': 0, 'events': 0, 'dropped_events': 0, 'bytes_written': 0,
+                      'segments': 0, 'write_errors': 0}
+
+        self._thread = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+        logger.info(f"Session recorder using {compression} (level {self.level}), "
+                    f"{segment_bytes} byte segments, queue {queue_events} events")
+
+    def start(self, window_id: str, owner: Optional[str], kind: str, width: int = 80, height: int = 24,
+              title: Optional[str] = None) -> Optional[Recording]:
+        """Begin recording a window into owner's workspace (None without an owner)"""
+        if not owner:
+            logger.warning(f"Not recording {window_id}: no workspace user to store it under")
+            return None
+
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        recording_id = f"{stamp}-{kind}-{_SAFE_NAME.sub('_', window_id)}"
+        path = recordings_dir(self.base_dir, owner) / recording_id
+
+        recording = Recording(self, recording_id, path, window_id, owner, kind, width, height, title)
+        self._active[recording_id] = recording
+        self.stats['recordings'] += 1
+        logger.info(f"Recording {kind} window {window_id} to {path}")
+        return recording
+
+    def finish(self, recording: Recording):
+        """Stop accepting events; the writer closes the files once queued events are written"""
+        if recording.closed:
+            return
+        recording.closed = True
+        recording.ended_at = time.time()
+        with self._closing_lock:
+            self._closing.append(recording)
+
+    def _enqueue(self, recording: Recording, code: str, data):
+        if recording.closed:
+            return
+        try:
+            self._queue.put_nowait((recording, time.monotonic(), code, data))
+            recording.accepted += 1
+        except queue.Full:
+            recording.dropped += 1
+            self.stats['dropped_events'] += 1
+
+    # --- writer thread ---
+
+    def _run(self):
+        dirty = set()
+        last_flush = time.monotonic()
+        while not self._stop.is_set():
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < 4096:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            for recording, at, code, data in batch:
+                try:
+                    self._write_event(recording, at, code, data)
+                except Exception as e:
+                    self.stats['write_errors'] += 1
+                    logger.error(f"Recording {recording.recording_id} write failed: {e}")
+                recording.processed += 1
+                dirty.add(recording)
+
+            # Flushing per batch would defeat compression under light load
+            now = time.monotonic()
+            if now - last_flush >= self.flush_interval:
+                last_flush = now
+                for recording in dirty:
+                    self._flush(recording)
+                dirty.clear()
+            self._close_finished()
+
+        # Shutdown: write what is queued, then close everything
+        self._drain_remaining()
+
+    def _drain_remaining(self):
+        while True:
+            try:
+                recording, at, code, data = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                self._write_event(recording, at, code, data)
+            except Exception:
+                self.stats['write_errors'] += 1
+            recording.processed += 1
+        for recording in list(self._active.values()):
+            self.finish(recording)
+        self._close_finished(force=True)
+
+    def _write_event(self, recording: Recording, at: float, code: str, data):
+        if recording._file is None:
+            self._open_segment(recording, at)
+
+        elapsed = max(at - recording.started, recording._last_time)
+        recording._last_time = elapsed
+        t = round(elapsed - recording._segment_offset, 6)
+
+        # Mark the gap left by dropped events so audits can see it
+        if recording.dropped > recording.marked_dropped:
+            missing = recording.dropped - recording.marked_dropped
+            recording.marked_dropped = recording.dropped
+            self._write_line(recording, [t, 'm', f"recorder dropped {missing} events"])
+
+        if code == 'r':
+            recording.width, recording.height = (int(v) for v in data.split('x'))
+            text = data
+        else:
+            text = recording._decoders[code].decode(join_input(data))
+            if not text:
+                return
+        self._write_line(recording, [t, code, text])
+        self.stats['events'] += 1
+
+    def _write_line(self, recording: Recording, event):
+        line = json.dumps(event, ensure_ascii=False).encode('utf-8') + b'\n'
+        recording._file.write(line)
+        recording.segments[-1]['events'] += 1
+
+    def _open_segment(self, recording: Recording, at: float):
+        recording.path.mkdir(parents=True, exist_ok=True)
+        index = len(recording.segments)
+        name = f"{index:06d}{self.extension}"
+        offset = round(max(at - recording.started, recording._last_time), 6)
+
+        raw = open(recording.path / name, 'wb')
+        if self.compression == 'zstd':
+            stream = zstandard.ZstdCompressor(level=self.level).stream_writer(raw, closefd=False)
+        else:
+            stream = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=self.level)
+
+        recording._raw = raw
+        recording._file = stream
+        recording._segment_offset = offset
+        recording.segments.append({'file': name, 'offset': offset, 'duration': 0.0, 'events': 0, 'bytes': 0})
+        self.stats['segments'] += 1
+
+        # Every segment is a standalone asciicast v2 file; 'offset' places it in the session
+        header = {
+            'version': 2,
+            'width': recording.width,
+            'height': recording.height,
+            'timestamp': int(recording.started_at + offset),
+            'env': {'TERM': 'xterm-256color'},
+            'velociterm': {'recording_id': recording.recording_id, 'window_id': recording.window_id,
+                           'kind': recording.kind, 'segment': index, 'offset': offset},
+        }
+        if recording.title:
+            header['title'] = recording.title
+        stream.write(json.dumps(header).encode('utf-8') + b'\n')
+        self._write_meta(recording)
+
+    def _flush(self, recording: Recording):
+        if recording._file is None:
+            return
+        try:
+            recording._file.flush()
+            size = recording._raw.tell()
+            segment = recording.segments[-1]
+            self.stats['bytes_written'] += size - segment['bytes']
+            segment['bytes'] = size
+            segment['duration'] = round(recording._last_time - recording._segment_offset, 6)
+            if size >= self.segment_bytes:
+                self._close_segment(recording)
+        except Exception as e:
+            self.stats['write_errors'] += 1
+            logger.error(f"Recording {recording.recording_id} flush failed: {e}")
+
+    def _close_segment(self, recording: Recording):
+        stream, raw = recording._file, recording._raw
+        recording._file = recording._raw = None
+        try:
+            stream.close()
+            segment = recording.segments[-1]
+            self.stats['bytes_written'] += raw.tell() - segment['bytes']
+            segment['bytes'] = raw.tell()
+        finally:
+            raw.close()
+        self._write_meta(recording)
+
+    def _close_finished(self, force: bool = False):
+        with self._closing_lock:
+            ready = [r for r in self._closing if force or r.processed >= r.accepted]
+            self._closing = [r for r in self._closing if r not in ready]
+
+        for recording in ready:
+            try:
+                if recording._file is not None:
+                    self._flush(recording)
+                    if recording._file is not None:
+                        self._close_segment(recording)
+                else:
+                    self._write_meta(recording)
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                logger.error(f"Recording {recording.recording_id} close failed: {e}")
+            self._active.pop(recording.recording_id, None)
+            logger.info(f"Recording {recording.recording_id} closed "
+                        f"({recording.accepted} events, {recording.dropped} dropped)")
+
+    def _write_meta(self, recording: Recording):
+        if not recording.segments:
+            return
+        meta = {
+            'recording_id': recording.recording_id,
+            'window_id': recording.window_id,
+            'owner': recording.owner,
+            'kind': recording.kind,
+            'title': recording.title,
+            'started_at': recording.started_at,
+            'ended_at': recording.ended_at,
+            'duration': round(recording._last_time, 6),
+            'compression': self.compression,
+            'dropped_events': recording.dropped,
+            'segments': recording.segments,
+        }
+        tmp = recording.path / (META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, recording.path / META_FILE)
+
+    # --- queries ---
+
+    def list_recordings(self, owner: str) -> List[Dict]:
+        """Metadata of owner's recordings, newest first"""
+        return list_recordings(self.base_dir, owner)
+
+    def shutdown(self):
+        """Flush and close every recording (process exit)"""
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join(timeout=5)
+
+    def get_stats(self) -> Dict:
+        return {
+            'compression': self.compression,
+            'active': len(self._active),
+            'queued_events': self._queue.qsize(),
+            **self.stats,
+        }
@@ -5,31 +5,247 @@ SSH Client Manager optimized for text-based games like Angband
 
 import paramiko
 import asyncio
-import base64
 import logging
-from typing import Dict, Optional
+import socket
+import time
+from functools import partial
+from typing import Callable, Dict, Optional
 import io
 
+from admission import AdmissionController
+from channel_pump import ChannelPump
+from connect_executor import ConnectExecutor, CancelToken
+from connect_timing import ConnectTiming, ConnectTimingStats
+from host_dialer import DNSCache, HappyEyeballsDialer
+from host_health import HostHealthTracker, HostUnavailable
+from terminal_input import ChannelInputWriter, ResizeDebouncer
+from terminal_output import DetachableOutput, FastForward, OutputCoalescer, OutputQueue
+from transport_pool import TransportPool, PooledTransport
+from scrollback_store import ScrollbackStore, WindowScrollback
+from session_recorder import Recording, SessionRecorder
+from key_cache import PrivateKeyCache
+from ssh_profiles import AlgorithmProfile, AlgorithmProfiles, describe_negotiated
+from screen_model import ScreenModel
+from output_scheduler import OutputFlow, OutputScheduler
+from ssh_workers import SSHWorkerPool
+
 logger = logging.getLogger(__name__)
 
 
 class SSHClientManager:
     """SSH client manager optimized for real-time game performance"""
 
-    def __init__(self):
+    def __init__(self, config: Optional[Dict] = None, detach_config: Optional[Dict] = None,
+                 scrollback: Optional[ScrollbackStore] = None,
+                 key_cache: Optional[PrivateKeyCache] = None,
+                 recorder: Optional[SessionRecorder] = None,
+                 output_scheduler: Optional[OutputScheduler] = None):
+        self.config = config or {}
         self.clients: Dict[str, Dict] = {}
+        self.detached: Dict[str, Dict] = {}
+        self.scrollback = scrollback
+        self.key_cache = key_cache or PrivateKeyCache()
+        self.recorder = recorder
+        self.output_scheduler = output_scheduler or OutputScheduler()
+        self.channel_pump = ChannelPump()
+        self.connect_executor = ConnectExecutor(max_workers=int(self.config.get('connect_workers', 8)))
+
+        self.algorithm_profiles = AlgorithmProfiles(self.config.get('algorithm_profiles'))
+
+        # Per-phase connect histograms (global and per host) and slow-connect logging
+        timing_config = self.config.get('connect_timing', {})
+        self.connect_timing = ConnectTimingStats(
+            slow_phase_ms=timing_config.get('slow_phase_ms'),
+            slow_total_ms=float(timing_config.get('slow_total_ms', 5000)),
+            max_hosts=int(timing_config.get('max_hosts', 512))
+        )
+
+        # Cached name resolution and happy-eyeballs TCP connects ahead of paramiko
+        self.dialer = self._create_dialer(self.config.get('dial', {}))
+
+        # Known-dead hosts fail fast with the cached reason until a probe finds them back
+        self.host_health = self._create_host_health(self.config.get('host_health', {}))
+
+        # Limits on concurrent/new connects so reconnect storms queue instead of stampeding
+        self.admission = self._create_admission(self.config.get('admission', {}))
+
+        multiplex_config = self.config.get('multiplex', {})
+        self.transport_pool = TransportPool(
+            enabled=bool(multiplex_config.get('enabled', True)),
+            max_channels_per_transport=int(multiplex_config.get('max_channels_per_transport', 8)),
+            linger_seconds=float(multiplex_config.get('linger_seconds', 120)),
+            max_lingering=int(multiplex_config.get('max_lingering', 64)),
+            linger_keepalive=int(multiplex_config.get('linger_keepalive_seconds', 15)),
+            linger_open_timeout=float(multiplex_config.get('linger_open_timeout_seconds', 3))
+        )
+
+        # Big pastes are chunked to the channel's SSH window; resizes are debounced
+        input_config = self.config.get('input', {})
+        self.input_chunk_bytes = int(input_config.get('chunk_bytes', 32768))
+        self.paste_threshold = int(input_config.get('paste_threshold', 4096))
+        self.paste_progress_interval = float(input_config.get('progress_interval_ms', 100)) / 1000
+        self.resize_interval = float(input_config.get('resize_interval_ms', 100)) / 1000
+
+        # Server-side screen per window: reattach repaints it instead of replaying output
+        screen_config = self.config.get('screen_model', {})
+        self.screen_model_enabled = bool(screen_config.get('enabled', False))
+        self.screen_scrollback_lines = int(screen_config.get('scrollback_lines', 200))
+
+        # Optional: paramiko transports (and their crypto) live in worker processes
+        self.workers = self._create_worker_pool(self.config.get('workers', {}))
+
+        # Keep sessions alive for a while after their websocket drops (0 = off)
+        detach_config = detach_config or {}
+        self.detach_grace = float(detach_config.get('grace_seconds', 0))
+        self.detach_buffer_bytes = int(detach_config.get('buffer_bytes', 1048576))
+
+        # Called with window_id when a window is created / once its SSH session is closed for good
+        self.on_client_created: Optional[Callable[[str], None]] = None
+        self.on_session_closed: Optional[Callable[[str], None]] = None
+
+    def _create_admission(self, config: Dict) -> AdmissionController:
+        """Build connect admission control from the ssh.admission config"""
+        return AdmissionController(
+            enabled=bool(config.get('enabled', True)),
+            global_limit=int(config.get('max_concurrent_connects', 64)),
+            per_user_limit=int(config.get('max_concurrent_per_user', 16)),
+            per_host_limit=int(config.get('max_concurrent_per_host', 4)),
+            host_rate=float(config.get('host_connects_per_second', 2)),
+            host_burst=float(config.get('host_burst', 4)),
+            global_rate=float(config.get('global_connects_per_second', 0)),
+            global_burst=float(config.get('global_burst', 0)),
+            max_queue=int(config.get('max_queue', 1024)),
+            queue_timeout=float(config.get('queue_timeout_seconds', 120)),
+            status_interval=float(config.get('status_interval_ms', 1000)) / 1000,
+            notify_timeout=float(config.get('status_send_timeout_ms', 2000)) / 1000
+        )
 
-    async def create_client(self, window_id: str):
-        """Create a new SSH client for the window"""
+    def _create_dialer(self, config: Dict) -> Optional[HappyEyeballsDialer]:
+        """Build the TCP dialer from the ssh.dial config (None = paramiko resolves and connects)"""
+        if not config.get('enabled', True):
+            return None
+        resolver = DNSCache(
+            ttl=float(config.get('dns_ttl_seconds', 300)),
+            stale_seconds=float(config.get('dns_stale_seconds', 3600)),
+            negative_ttl=float(config.get('dns_negative_ttl_seconds', 5)),
+            max_entries=int(config.get('dns_max_entries', 1024))
+        )
+        return HappyEyeballsDialer(
+            resolver,
+            attempt_delay=float(config.get('attempt_delay_ms', 250)) / 1000,
+            connect_timeout=float(config.get('connect_timeout_seconds', 15))
+        )
+
+    def _create_host_health(self, config: Dict) -> HostHealthTracker:
+        """Build the per-host circuit breaker from the ssh.host_health config"""
+        return HostHealthTracker(
+            enabled=bool(config.get('enabled', True)),
+            failure_threshold=int(config.get('failure_threshold', 1)),
+            trip_on=config.get('trip_on', ['refused', 'timeout', 'unreachable', 'dns']),
+            base_cooldown=float(config.get('base_cooldown_seconds', 10)),
+            max_cooldown=float(config.get('max_cooldown_seconds', 300)),
+            auth_cooldown=float(config.get('auth_cooldown_seconds', 10)),
+            probe=self._probe_host if config.get('probe', True) else None,
+            probe_timeout=float(config.get('probe_timeout_seconds', 5)),
+            forget_after=float(config.get('forget_after_seconds', 3600)),
+            max_hosts=int(config.get('max_hosts', 4096))
+        )
+
+    async def _probe_host(self, hostname: str, port: int):
+        """Half-open probe: can we open a TCP connection to the host again?"""
+        if self.dialer is not None:
+            sock = await self.dialer.dial(hostname, port)
+            sock.close()
+            return
+        _, writer = await asyncio.open_connection(hostname, port)
+        writer.close()
+
+    def _create_worker_pool(self, config: Dict) -> Optional[SSHWorkerPool]:
+        """Build the SSH worker pool from the ssh.workers config (None = in-process)"""
+        if not config.get('enabled', False):
+            return None
+        pool = SSHWorkerPool(
+            self.config,
+            processes=int(config.get('processes', 0)),
+            window_bytes=int(config.get('window_bytes', 1048576))
+        )
+        logger.info(f"SSH sessions run in {pool.processes} worker process(es)")
+        return pool
+
+    async def create_client(self, window_id: str, stream=None, owner: Optional[str] = None):
+        """Create a new SSH client for the window
+
+        Raises PermissionError when the window's live or detached session
+        belongs to another workspace user, so it cannot be kicked off,
+        reattached or read by them.
+        """
         logger.info(f"Creating SSH client for window {window_id}")
+
+        current = self.clients.get(window_id) or self.detached.get(window_id)
+        if current is not None and current.get('owner') != owner:
+            logger.warning(f"Refused window {window_id} to {owner or 'anonymous'}: "
+                           f"owned by {current.get('owner') or 'anonymous'}")
+            raise PermissionError("Window belongs to another user")
+
+        existing = self.clients.get(window_id)
+        if existing is not None:
+            # A newer websocket for the same window supersedes the old one
+            if not self._detach(window_id, existing):
+                # Replaced in place, so the window stays ours (no on_session_closed)
+                self.clients.pop(window_id, None)
+                await self._close_session(window_id, existing)
+
         self.clients[window_id] = {
             'client': None,
             'channel': None,
-            'connected': False
+            'connected': False,
+            'ready': asyncio.Event(),
+            'handler': stream,
+            'owner': owner,
+            'created_at': time.monotonic(),
+            'last_activity': time.monotonic()
         }
+        if self.on_client_created:
+            self.on_client_created(window_id)
+
+    def start_connect(self, window_id: str, hostname: str, port: int, username: str, password: str, websocket,
+                      ssh_key_path: Optional[str] = None, owner: Optional[str] = None,
+                      profile: Optional[str] = None, device_type: Optional[str] = None) -> asyncio.Task:
+        """Start connect() as a task so the websocket loop keeps receiving
+
+        The task is cancelled by disconnect(), which aborts a queued or
+        in-flight connection attempt when the websocket goes away.
+        """
+        task = asyncio.create_task(
+            self._connect_or_close(window_id, hostname, port, username, password, websocket, ssh_key_path, owner,
+                                   profile, device_type)
+        )
+        task.set_name(f"ssh_connect_{window_id}")
+
+        client_data = self.clients.get(window_id)
+        if client_data is not None:
+            client_data['connect_task'] = task
+        return task
+
+    async def _connect_or_close(self, window_id: str, hostname: str, port: int, username: str, password: str,
+                                websocket, ssh_key_path: Optional[str], owner: Optional[str],
+                                profile: Optional[str] = None, device_type: Optional[str] = None):
+        """Run connect() and close the websocket if it fails (error already reported)"""
+        try:
+            await self.connect(window_id, hostname, port, username, password, websocket,
+                               ssh_key_path=ssh_key_path, owner=owner, profile=profile, device_type=device_type)
+        except asyncio.CancelledError:
+            logger.info(f"SSH connect cancelled for {window_id}")
+            raise
+        except Exception:
+            try:
+                await websocket.close()
+            except Exception:
+                pass
 
     async def connect(self, window_id: str, hostname: str, port: int, username: str, password: str, websocket,
-                      ssh_key_path: Optional[str] = None):
+                      ssh_key_path: Optional[str] = None, owner: Optional[str] = None,
+                      profile: Optional[str] = None, device_type: Optional[str] = None):
         """Connect to SSH host with game-optimized settings"""
         logger.info(f"=== SSH Connect Attempt (Game Optimized) ===")
         logger.info(f"Window: {window_id}")
@@ -37,324 +253,896 @@ class SSHClientManager:
         logger.info(f"Username: {username}")
 
         if window_id not in self.clients:
-            await self.create_client(window_id)
+            await self.create_client(window_id, owner=owner)
 
-        try:
-            # Create SSH client with game-optimized settings
-            ssh_client = paramiko.SSHClient()
-            ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        key = self.transport_pool.make_key(owner, hostname, int(port), username, password, ssh_key_path)
 
-            logger.info("Attempting SSH connection...")
+        # Same window, same target and credentials: pick up the detached session
+        if await self._resume_detached(window_id, key, websocket, hostname, port, username):
+            return
 
-            # Try SSH key authentication first if available
-            pkey = None
-            if ssh_key_path:
-                logger.info(f"SSH key path provided: {ssh_key_path}")
+        algorithms = self.algorithm_profiles.resolve(profile, device_type)
+        logger.info(f"SSH algorithm profile: {algorithms.name}")
 
+        timing = ConnectTiming()
+        try:
+            # A host that just failed is not dialed again until its cool-down ends
+            attempt = await self.host_health.admit(hostname, int(port), key)
+            try:
+                # Wait our turn (position/ETA go to the browser), then hold the slot through the handshake
+                ticket = await self.admission.admit(owner, hostname, partial(self._send_queue_status, websocket))
+                timing.lap('queue')
                 try:
-                    # Load key directly from file - the way Paramiko expects!
-                    key_types = [
-                        (paramiko.RSAKey, "RSA"),
-                        (paramiko.Ed25519Key, "ED25519"),
-                        (paramiko.ECDSAKey, "ECDSA")
-                    ]
-
-                    for key_class, key_type in key_types:
-                        try:
-                            pkey = key_class.from_private_key_file(ssh_key_path)
-                            logger.info(f"✓ Successfully loaded {key_type} key from file!")
-                            break
-                        except paramiko.PasswordRequiredException:
-                            logger.warning(f"{key_type} key at {ssh_key_path} requires passphrase (not supported)")
-                            break
-                        except paramiko.SSHException as e:
-                            logger.debug(f"Not a {key_type} key: {e}")
-                            continue
-                        except Exception as e:
-                            logger.debug(f"Error loading as {key_type}: {e}")
-                            continue
+                    pooled, channel = await self._acquire_shell(window_id, key, hostname, int(port), username,
+                                                                password, ssh_key_path, algorithms, timing)
+                except Exception as e:
+                    attempt.failed(e)
+                    self.connect_timing.record(timing, hostname, port, ok=False, username=username,
+                                               window_id=window_id, profile=algorithms.name)
+                    raise
+                finally:
+                    ticket.release()
+                attempt.succeeded()
+            finally:
+                attempt.release()
+            self.connect_timing.record(timing, hostname, port, username=username, window_id=window_id,
+                                       profile=algorithms.name)
 
-                    if not pkey:
-                        logger.warning(f"Failed to load SSH key from {ssh_key_path}, will try password")
+            client_data = self.clients.get(window_id)
+            if client_data is None:
+                # Window was torn down while we were connecting
+                self._release_shell(window_id, pooled, channel)
+                return
 
-                except Exception as e:
-                    logger.error(f"Error loading SSH key from file: {e}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-            else:
-                logger.info("No SSH key path provided - using password authentication")
+            # Store connection details and wake the output listener
+            client_data.update({
+                'client': pooled.client if pooled else None,
+                'pooled': pooled,
+                'pool_key': key,
+                'channel': channel,
+                'websocket': websocket,
+                'connected': True,
+                'hostname': hostname,
+                'username': username,
+                'owner': owner,
+                'ssh_profile': algorithms.name
+            })
+            client_data['ready'].set()
 
-            # OPTIMIZED: Enhanced connection parameters with key support
-            try:
-                ssh_client.connect(
-                    hostname=hostname,
-                    port=int(port),
-                    username=username,
-                    password=password,  # ✓ GOOD: Always provide password for fallback
-                    pkey=pkey,  # Paramiko tries key first, then password if key fails
-                    timeout=15,
-                    banner_timeout=15,
-                    auth_timeout=15,
-                    look_for_keys=False,
-                    allow_agent=False,
-                    compress=False,
-                    gss_auth=False,
-                    gss_kex=False
-                )
+            # Send success message
+            await websocket.send_json({
+                'type': 'status',
+                'message': f'Connected to {hostname}:{port} as {username}',
+                'timing': timing.summary()
+            })
 
-                # Connection successful
-                logger.info(f"SSH connection established to {hostname}:{port}")
+            logger.info(f"Interactive shell opened for {window_id}")
 
-                if pkey:
-                    logger.info(f"✓ SSH key authentication successful for {username}@{hostname}")
-                else:
-                    logger.info(f"Password authentication successful for {username}@{hostname}")
+        except asyncio.CancelledError:
+            raise
 
-                # Open channel with optimal settings
-                channel = ssh_client.invoke_shell(
-                    term='xterm-256color',
-                    width=80,
-                    height=24
-                )
+        except HostUnavailable as unavailable:
+            # Cached failure: the UI can grey the host out until retry_in_seconds
+            logger.info(f"SSH connect for {window_id} not attempted: {unavailable}")
+            await self._send_connect_error(websocket, f"SSH Connection failed: {unavailable}",
+                                           host_health=unavailable.state)
+            raise
 
-                # Optimize channel settings for game/interactive use
-                channel.settimeout(0.1)  # Non-blocking with minimal timeout
-                channel.set_combine_stderr(True)
-
-                # Store connection details
-                self.clients[window_id] = {
-                    'ssh_client': ssh_client,
-                    'channel': channel,
-                    'websocket': websocket,
-                    'connected': True,
-                    'hostname': hostname,
-                    'username': username
-                }
-
-                # Send success message
-                await websocket.send_json({
-                    'type': 'status',
-                    'message': f'Connected to {hostname}:{port} as {username}'
-                })
-
-                logger.info(f"Interactive shell opened for {window_id}")
-
-            except paramiko.AuthenticationException as auth_error:
-                error_msg = f"SSH Authentication failed: {auth_error}"
-                logger.error(error_msg)
-                await websocket.send_json({
-                    'type': 'error',
-                    'message': error_msg
-                })
-                raise
+        except paramiko.AuthenticationException as auth_error:
+            error_msg = f"SSH Authentication failed: {auth_error}"
+            logger.error(f"Failed to establish SSH connection for {window_id}: {error_msg}")
+            await self._send_connect_error(websocket, error_msg,
+                                           host_health=self.host_health.get_host(hostname, int(port)))
+            raise
+
+        except Exception as conn_error:
+            error_msg = f"SSH Connection failed: {conn_error}"
+            logger.error(f"Failed to establish SSH connection for {window_id}: {error_msg}")
+            await self._send_connect_error(websocket, error_msg,
+                                           host_health=self.host_health.get_host(hostname, int(port)))
+            raise
+
+    async def _resume_detached(self, window_id: str, key, websocket, hostname: str, port: int,
+                               username: str) -> bool:
+        """Swap a detached session back in for this window; its listener replays missed output"""
+        detached = self.detached.get(window_id)
+        fresh = self.clients.get(window_id)
+        if detached is None or fresh is None:
+            return False
+
+        del self.detached[window_id]
+        if detached.get('pool_key') != key:
+            logger.info(f"Detached session for {window_id} does not match this connect - closing it")
+            await self._close_session(window_id, detached)
+            return False
+
+        timer = detached.pop('detach_timer', None)
+        if timer:
+            timer.cancel()
+
+        detached.update({
+            'ready': fresh['ready'],
+            'connect_task': fresh.get('connect_task'),
+            'handler': fresh.get('handler'),
+            'websocket': websocket,
+            'last_activity': time.monotonic()
+        })
+        self.clients[window_id] = detached
+
+        await websocket.send_json({
+            'type': 'status',
+            'message': f'Connected to {hostname}:{port} as {username} (resumed detached session)',
+            'resumed': True
+        })
+        detached['ready'].set()
+
+        logger.info(f"Resumed detached SSH session for {window_id}")
+        return True
 
-            except Exception as conn_error:
-                error_msg = f"SSH Connection failed: {conn_error}"
-                logger.error(error_msg)
-                await websocket.send_json({
-                    'type': 'error',
-                    'message': error_msg
-                })
+    async def _acquire_shell(self, window_id: str, key, hostname: str, port: int, username: str,
+                             password: str, ssh_key_path: Optional[str], algorithms: AlgorithmProfile,
+                             timing: Optional[ConnectTiming] = None):
+        """Open a shell channel, on a pooled transport when one exists for this target"""
+        timing = timing or ConnectTiming()
+        if self.workers is not None:
+            # The worker owning this target does the pooling; we only hold a proxy channel
+            owner = key[0] or None
+            channel = await self.workers.open_shell(window_id, key, owner, hostname, port, username, password,
+                                                    ssh_key_path, algorithms.name, timing)
+            return None, channel
+
+        pool = self.transport_pool
+
+        # A window to the same target may be mid-handshake - share its result
+        await pool.wait_for_handshake(key)
+        timing.lap('queue')
+
+        pooled = pool.lease(key, window_id)
+        if pooled is not None:
+            try:
+                channel = await self.connect_executor.run(self._open_channel, pooled.transport,
+                                                          timeout=pool.open_timeout(pooled))
+                timing.lap('channel')
+                timing.reused = True
+                logger.info(f"Opened channel on shared transport for {window_id}")
+                return pooled, channel
+            except asyncio.CancelledError:
+                pool.release(pooled, window_id)
                 raise
+            except Exception as e:
+                # Many network devices allow one session per connection
+                timing.lap('channel')
+                logger.info(f"Extra channel refused for {window_id} ({e}) - opening a new connection")
+                pool.refuse_multiplex(pooled, window_id)
 
+        pool.begin_handshake(key)
+        sock = None
+        try:
+            # Cached DNS and racing TCP connects happen on the loop; paramiko gets the winning socket
+            if self.dialer is not None:
+                sock = await self.dialer.dial(hostname, port, timing)
+            # Blocking KEX/auth/shell setup runs in the bounded connect pool
+            ssh_client, channel = await self.connect_executor.run(
+                self._open_shell, hostname, port, username, password, ssh_key_path, algorithms, sock=sock,
+                timing=timing
+            )
+        except BaseException:
+            if sock is not None:
+                sock.close()
+            raise
+        finally:
+            pool.end_handshake(key)
+
+        return pool.register(key, ssh_client, window_id), channel
+
+    def _release_shell(self, window_id: str, pooled: Optional[PooledTransport], channel):
+        """Close this window's channel and drop its reference on the transport"""
+        try:
+            if channel and not channel.closed:
+                channel.close()
+                logger.info(f"SSH channel closed for {window_id}")
         except Exception as e:
-            logger.error(f"Failed to establish SSH connection for {window_id}: {e}")
+            logger.error(f"Error closing SSH channel {window_id}: {e}")
 
-            # Send error to terminal
-            error_message = f"SSH Authentication failed: {str(e)}"
-            logger.info(f"Sending error to terminal: {error_message}")
+        if pooled is not None:
+            self.transport_pool.release(pooled, window_id)
 
-            try:
-                await websocket.send_json({
-                    'type': 'error',
-                    'message': error_message
-                })
-            except Exception as send_error:
-                logger.error(f"Failed to send error message: {send_error}")
+    async def _send_queue_status(self, websocket, message: Dict):
+        """Queue position and ETA for a connect waiting on admission"""
+        await websocket.send_json(message)
 
+    async def _send_connect_error(self, websocket, error_msg: str, **details):
+        """Report a failed connect to the terminal"""
+        logger.info(f"Sending error to terminal: {error_msg}")
+        try:
+            await websocket.send_json({
+                'type': 'error',
+                'message': error_msg,
+                **details
+            })
+        except Exception as send_error:
+            logger.error(f"Failed to send error message: {send_error}")
+
+    def _open_shell(self, hostname: str, port: int, username: str, password: str,
+                    ssh_key_path: Optional[str], algorithms: AlgorithmProfile, token: CancelToken,
+                    sock: Optional[socket.socket] = None, timing: Optional[ConnectTiming] = None):
+        """Blocking connection setup - runs on a connect executor thread"""
+        timing = timing or ConnectTiming()
+        # Waiting for a free connect thread
+        timing.lap('queue')
+        # Create SSH client with game-optimized settings
+        ssh_client = paramiko.SSHClient()
+        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        # Closing the client from the loop aborts a hung TCP/KEX/auth step
+        token.add_closer(ssh_client.close)
+
+        try:
+            # Try SSH key authentication first if available
+            pkey = self._load_private_key(ssh_key_path) if ssh_key_path else None
+            if not ssh_key_path:
+                logger.info("No SSH key path provided - using password authentication")
+            else:
+                timing.lap('key')
+
+            token.raise_if_cancelled()
+            logger.info("Attempting SSH connection...")
+
+            # OPTIMIZED: Enhanced connection parameters with key support
+            ssh_client.connect(
+                hostname=hostname,
+                port=port,
+                username=username,
+                password=password,  # ✓ GOOD: Always provide password for fallback
+                pkey=pkey,  # Paramiko tries key first, then password if key fails
+                timeout=15,
+                banner_timeout=15,
+                auth_timeout=15,
+                look_for_keys=False,
+                allow_agent=False,
+                compress=algorithms.compress,
+                gss_auth=False,
+                gss_kex=False,
+                transport_factory=partial(self._timed_transport, algorithms.transport_factory, timing, sock is None),
+                sock=sock
+            )
+            timing.lap('auth')
+
+            # Connection successful
+            logger.info(f"SSH connection established to {hostname}:{port} "
+                        f"(profile {algorithms.name}: {describe_negotiated(ssh_client.get_transport())})")
+
+            if pkey:
+                logger.info(f"✓ SSH key authentication successful for {username}@{hostname}")
+            else:
+                logger.info(f"Password authentication successful for {username}@{hostname}")
+
+            token.raise_if_cancelled()
+
+            channel = self._open_channel(ssh_client.get_transport(), token)
+            timing.lap('shell')
+            return ssh_client, channel
+
+        except Exception:
+            ssh_client.close()
             raise
 
-    async def send_error_to_terminal(self, websocket, window_id, error_message):
+    @staticmethod
+    def _timed_transport(factory: Callable, timing: ConnectTiming, resolved_here: bool, sock, **kwargs):
+        """Transport factory wrapper marking the end of TCP connect and of KEX"""
+        # Without the dialer, paramiko resolved and connected just before calling us
+        timing.lap('tcp' if resolved_here else None)
+        transport = factory(sock, **kwargs)
+        start_client = transport.start_client
+
+        def timed_start_client(*args, **kw):
+            try:
+                return start_client(*args, **kw)
+            finally:
+                timing.lap('kex')
+
+        transport.start_client = timed_start_client
+        return transport
+
+    def _open_channel(self, transport: paramiko.Transport, token: CancelToken, timeout: float = 15):
+        """Blocking shell channel setup on an authenticated transport"""
+        # Open channel with optimal settings
+        channel = transport.open_session(timeout=timeout)
+        token.add_closer(channel.close)
+
+        channel.get_pty(term='xterm-256color', width=80, height=24)
+        channel.invoke_shell()
+
+        # Optimize channel settings for game/interactive use
+        channel.settimeout(0.1)  # Non-blocking with minimal timeout
+        channel.set_combine_stderr(True)
+
+        token.raise_if_cancelled()
+        return channel
+
+    def _load_private_key(self, ssh_key_path: str) -> Optional[paramiko.PKey]:
+        """Parsed private key from the shared cache (parsed once per file version)"""
+        logger.info(f"SSH key path provided: {ssh_key_path}")
+
+        pkey = self.key_cache.load(ssh_key_path)
+        if not pkey:
+            logger.warning(f"Failed to load SSH key from {ssh_key_path}, will try password")
+        return pkey
+
+    async def send_error_to_terminal(self, stream, window_id, error_message):
         """Send error message to terminal"""
         logger.info(f"Sending error to terminal: {error_message}")
 
         # Send as terminal output
         formatted_error = f"\r\n[ERROR] {error_message}\r\n"
-        encoded_data = base64.b64encode(formatted_error.encode('utf-8')).decode('utf-8')
 
         try:
-            await websocket.send_json({
-                'type': 'ssh_output',
-                'data': encoded_data,
-                'tabId': window_id
-            })
-            await websocket.send_json({
+            await stream.send_output(formatted_error.encode('utf-8'))
+            await stream.send_json({
                 'type': 'error',
                 'message': error_message
             })
         except Exception as ws_error:
             logger.error(f"Failed to send error via websocket: {ws_error}")
 
-    async def send_input(self, window_id: str, input_data: str):
-        """Send input to SSH channel with game optimization"""
+    async def send_input(self, window_id: str, input_data):
+        """Send input (str or list of str from JSON frames, bytes from binary frames) to SSH channel"""
         if window_id not in self.clients or not self.clients[window_id]['connected']:
             logger.warning(f"No active SSH connection for window {window_id}")
             return
 
-        channel = self.clients[window_id]['channel']
+        client_data = self.clients[window_id]
+        client_data['last_activity'] = time.monotonic()
+        channel = client_data['channel']
         if channel and not channel.closed:
             try:
-                # OPTIMIZED: Send input immediately without buffering
-                channel.send(input_data)
+                # Let the echo bypass output batching
+                coalescer = client_data.get('coalescer')
+                if coalescer:
+                    coalescer.note_input()
+
+                writer = client_data.get('input_writer')
+                if writer is None or writer.channel is not channel:
+                    writer = client_data['input_writer'] = ChannelInputWriter(
+                        channel,
+                        chunk_bytes=self.input_chunk_bytes,
+                        paste_threshold=self.paste_threshold,
+                        progress=partial(self._send_input_progress, window_id),
+                        progress_interval=self.paste_progress_interval,
+                        pump=self.channel_pump
+                    )
 
-                # Force flush the channel buffer for immediate transmission
-                if hasattr(channel, 'flush'):
-                    channel.flush()
+                recording = client_data.get('recording')
+                if recording:
+                    recording.input(input_data)
 
-                logger.debug(f"Sent {len(input_data)} chars to SSH channel {window_id}: {repr(input_data)}")
+                # Keystrokes go out at once; pastes are chunked to the SSH window
+                await writer.write(input_data)
+                logger.debug(f"Sent {len(input_data)} chars to SSH channel {window_id}")
             except Exception as e:
                 logger.error(f"Failed to send input to SSH channel {window_id}: {e}")
 
+    async def _send_input_progress(self, window_id: str, message: Dict):
+        """Paste progress to whichever websocket the window has now"""
+        client_data = self.clients.get(window_id)
+        if client_data is None:
+            return
+        target = client_data.get('output') or client_data.get('handler')
+        if target is not None:
+            await target.send_json(message)
+
     async def resize_terminal(self, window_id: str, cols: int, rows: int):
-        """Resize the SSH terminal with game-friendly dimensions"""
+        """Resize the SSH terminal with game-friendly dimensions (debounced during drags)"""
         if window_id not in self.clients or not self.clients[window_id]['connected']:
             return
 
-        channel = self.clients[window_id]['channel']
+        client_data = self.clients[window_id]
+        channel = client_data['channel']
         if channel and not channel.closed:
-            try:
-                # Ensure minimum dimensions for games
-                cols = max(cols, 80)
-                rows = max(rows, 24)
+            # Ensure minimum dimensions for games
+            cols = max(cols, 80)
+            rows = max(rows, 24)
 
-                channel.resize_pty(width=cols, height=rows)
-                logger.debug(f"Resized SSH terminal {window_id} to {cols}x{rows}")
-            except Exception as e:
-                logger.error(f"Failed to resize SSH terminal {window_id}: {e}")
+            debouncer = client_data.get('resize')
+            if debouncer is None:
+                debouncer = client_data['resize'] = ResizeDebouncer(
+                    partial(self._apply_resize, window_id), self.resize_interval
+                )
+            debouncer.request(cols, rows)
+
+    def _apply_resize(self, window_id: str, cols: int, rows: int):
+        client_data = self.clients.get(window_id) or self.detached.get(window_id)
+        channel = client_data.get('channel') if client_data else None
+        if channel and not channel.closed:
+            channel.resize_pty(width=cols, height=rows)
+            fast_forward = client_data.get('fast_forward')
+            screen = client_data.get('screen') or (fast_forward.screen if fast_forward else None)
+            if screen:
+                screen.resize(cols, rows)
+            if client_data.get('recording'):
+                client_data['recording'].resize(cols, rows)
+            logger.debug(f"Resized SSH terminal {window_id} to {cols}x{rows}")
 
     async def disconnect(self, window_id: str):
         """Disconnect SSH client"""
         client_data = self.clients.pop(window_id, None)
         if client_data:
             logger.info(f"Disconnecting SSH client for window {window_id}")
+            await self._close_session(window_id, client_data)
+            self._notify_closed(window_id)
 
-            channel = client_data.get('channel')
-            client = client_data.get('client')
+    async def release(self, window_id: str, stream, detach: bool = False):
+        """Called when a terminal websocket goes away - detach the session or disconnect it"""
+        client_data = self.clients.get(window_id)
+        if client_data is None or client_data.get('handler') is not stream:
+            # Already superseded by a newer websocket for this window
+            return
+
+        if detach and self._detach(window_id, client_data):
+            return
+
+        await self.disconnect(window_id)
+
+    def _detach(self, window_id: str, client_data: Dict) -> bool:
+        """Keep a live session running without a websocket for detach_grace seconds"""
+        output = client_data.get('output')
+        pipeline = client_data.get('pipeline')
+        if not self.detach_grace or output is None or pipeline is None or pipeline.done():
+            return False
 
+        self.clients.pop(window_id, None)
+        output.detach()
+        client_data['handler'] = None
+        client_data['detach_timer'] = asyncio.create_task(self._expire_detached(window_id, client_data))
+        self.detached[window_id] = client_data
+
+        logger.info(f"Detached SSH session {window_id} (grace {self.detach_grace:.0f}s)")
+        return True
+
+    async def _expire_detached(self, window_id: str, client_data: Dict):
+        """Close a detached session nobody came back for"""
+        await asyncio.sleep(self.detach_grace)
+        if self.detached.get(window_id) is client_data:
+            del self.detached[window_id]
+            logger.info(f"Detach grace expired for {window_id} - closing SSH session")
+            await self._close_session(window_id, client_data)
+            self._notify_closed(window_id)
+
+    def _notify_closed(self, window_id: str):
+        if self.on_session_closed and window_id not in self.clients and window_id not in self.detached:
             try:
-                if channel and not channel.closed:
-                    channel.close()
-                    logger.info(f"SSH channel closed for {window_id}")
+                self.on_session_closed(window_id)
             except Exception as e:
-                logger.error(f"Error closing SSH channel {window_id}: {e}")
+                logger.error(f"Session close hook failed for {window_id}: {e}")
 
+    async def reap(self, window_id: str, reason: str, notify: bool = True) -> bool:
+        """Close a window the resource reaper found idle, orphaned or ended; tell its websocket why"""
+        client_data = self.clients.pop(window_id, None) or self.detached.pop(window_id, None)
+        if client_data is None:
+            return False
+
+        await self._close_session(window_id, client_data)
+        # An output listener still waiting for connect() finds the window gone
+        client_data['ready'].set()
+        self._notify_closed(window_id)
+
+        handler = client_data.get('handler')
+        if notify and handler is not None:
             try:
-                if client:
-                    client.close()
-                    logger.info(f"SSH client closed for {window_id}")
+                await handler.send_json({'type': 'error', 'message': f'Session closed by server: {reason}'})
+                # A normal close, so the browser does not reconnect straight back
+                await handler.close(code=1000, reason=reason[:120])
             except Exception as e:
-                logger.error(f"Error closing SSH client {window_id}: {e}")
+                logger.debug(f"Could not notify reaped window {window_id}: {e}")
+        return True
+
+    async def _close_session(self, window_id: str, client_data: Dict):
+        """Stop a window's connect attempt and output pipeline, then close its channel"""
+        current = asyncio.current_task()
+        for name in ('connect_task', 'pipeline', 'detach_timer'):
+            task = client_data.get(name)
+            if task and not task.done() and task is not current:
+                # Abort a connection attempt that is still queued or in flight
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
 
-    async def listen_to_ssh_output(self, window_id: str, websocket):
-        """Listen for SSH output optimized for game performance"""
-        logger.info(f"Starting game-optimized SSH output listener for {window_id}")
+        if client_data.get('input_writer'):
+            client_data['input_writer'].cancel()
+        if client_data.get('resize'):
+            client_data['resize'].cancel()
 
-        while window_id in self.clients:
-            try:
-                client_data = self.clients[window_id]
+        if client_data.get('scrollback'):
+            self.scrollback.close(client_data['scrollback'])
+        if client_data.get('recording'):
+            client_data['recording'].close()
 
-                if not client_data.get('connected'):
-                    logger.debug(f"SSH not connected yet for {window_id}, waiting...")
-                    await asyncio.sleep(0.05)  # Reduced sleep for faster connection
-                    continue
+        # The transport itself closes with the last window using it
+        self._release_shell(window_id, client_data.get('pooled'), client_data.get('channel'))
 
-                channel = client_data.get('channel')
-                if not channel or channel.closed:
-                    logger.info(f"SSH channel closed for {window_id}")
-                    break
+    async def listen_to_ssh_output(self, window_id: str, stream):
+        """Attach a websocket to the window's output pipeline (starting it on first connect)
+
+        The pipeline task outlives the websocket while the window is
+        detached; a resumed window replays what it missed before going live.
+        """
+        logger.info(f"Starting event-driven SSH output listener for {window_id}")
+
+        try:
+            client_data = self.clients.get(window_id)
+            if not client_data:
+                return
+
+            # Idle until connect() succeeds - costs nothing while waiting
+            await client_data['ready'].wait()
+
+            # connect() may have swapped in a resumed detached session
+            client_data = self.clients.get(window_id)
+            if not client_data or not client_data.get('channel'):
+                return
+
+            pipeline = client_data.get('pipeline')
+            if pipeline is None:
+                buffer_bytes = self.detach_buffer_bytes if self.detach_grace else 0
+                client_data['output'] = DetachableOutput(stream, buffer_bytes)
+                pipeline = asyncio.create_task(self._run_pipeline(window_id, client_data))
+                pipeline.set_name(f"ssh_pipeline_{window_id}")
+                client_data['pipeline'] = pipeline
+            else:
+                await client_data['output'].attach(stream)
+                logger.info(f"Reattached websocket to SSH session {window_id}")
+
+            await asyncio.shield(pipeline)
+
+        except asyncio.CancelledError:
+            logger.info(f"SSH output listener cancelled for {window_id}")
+        except Exception as e:
+            logger.error(f"Error in SSH output listener for {window_id}: {e}")
+
+        logger.info(f"SSH output listener ended for {window_id}")
+
+    async def _run_pipeline(self, window_id: str, client_data: Dict):
+        """Forward SSH output as soon as the channel becomes readable (no polling)
+
+        A reader drains the channel into a bounded per-window queue and a
+        sender task batches it out to the websocket. When the queue is above
+        its high watermark the reader stops calling recv(), so the SSH window
+        closes and the device itself is throttled.
+        """
+        channel = client_data['channel']
+        output = client_data['output']
+        sender_task = None
 
-                # OPTIMIZED: More aggressive data checking for games
-                data_received = False
+        try:
+            # Tracks exactly what the browser has been sent. Flushes are only queued
+            # on it (cut to the last screenfuls) and emulated when a snapshot,
+            # reattach or fast-forward frame reads it
+            screen = None
+            if self.screen_model_enabled or self.config.get('fast_forward', {}).get('enabled', False):
+                scrollback_lines = self.screen_scrollback_lines if self.screen_model_enabled else 0
+                screen = ScreenModel(80, 24, scrollback=scrollback_lines)
+            if self.screen_model_enabled:
+                client_data['screen'] = screen
+                output.snapshot = partial(self._render_screen, screen)
+
+            # Echo goes out immediately, bulk output is merged into larger frames
+            coalescer = self._create_coalescer(output, window_id, screen)
+            output_queue = self._create_output_queue()
+            client_data['coalescer'] = coalescer
+            client_data['output_queue'] = output_queue
+
+            # Floods are shown as capped-rate screen frames
+            fast_forward = self._create_fast_forward(output, coalescer, screen)
+            client_data['fast_forward'] = fast_forward
+
+            # Fair share of the event loop against every other window's output
+            flow = self.output_scheduler.register(window_id, 'ssh')
+            client_data['output_flow'] = flow
+
+            # Server-side history, searchable over REST/websocket
+            scrollback = None
+            if self.scrollback:
+                scrollback = self.scrollback.open(window_id, client_data.get('owner'))
+                client_data['scrollback'] = scrollback
+
+            # Opt-in audit recording of the raw stream
+            recording = None
+            if self.recorder:
+                recording = self.recorder.start(
+                    window_id, client_data.get('owner'), 'ssh',
+                    title=f"{client_data.get('username')}@{client_data.get('hostname')}"
+                )
+                client_data['recording'] = recording
+
+            sender_task = asyncio.create_task(
+                self._send_queued_output(window_id, output, channel, output_queue, coalescer, scrollback,
+                                         recording, fast_forward, flow)
+            )
+            sender_task.set_name(f"ssh_sender_{window_id}")
+
+            await self._read_channel(window_id, channel, output_queue)
 
-                if channel.recv_ready():
-                    try:
-                        # OPTIMIZED: Larger buffer for game data
-                        data = channel.recv(16384)  # Increased from 4096
-                        if data:
-                            logger.debug(f"Received {len(data)} bytes from SSH for {window_id}")
+            # Reader finished (EOF/close) - let the sender drain and report
+            await sender_task
 
-                            # Encode for WebSocket transmission
-                            encoded_data = base64.b64encode(data).decode('utf-8')
+        except asyncio.CancelledError:
+            logger.info(f"SSH output pipeline cancelled for {window_id}")
+        except Exception as e:
+            logger.error(f"Error in SSH output pipeline for {window_id}: {e}")
+        finally:
+            if sender_task and not sender_task.done():
+                sender_task.cancel()
+                try:
+                    await sender_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            self.output_scheduler.unregister(client_data.get('output_flow'))
 
-                            await websocket.send_json({
-                                'type': 'ssh_output',
-                                'data': encoded_data,
-                                'tabId': window_id
-                            })
+    async def _read_channel(self, window_id: str, channel, output_queue: OutputQueue):
+        """Move channel data into the output queue, pausing at the high watermark"""
+        try:
+            while True:
+                if output_queue.paused:
+                    # Backpressure: stop reading until the sender catches up
+                    await output_queue.wait_writable()
+                    if output_queue.closed:
+                        break
 
-                            data_received = True
-                        else:
-                            logger.debug(f"Empty data received from SSH for {window_id}")
+                await self.channel_pump.wait_readable(channel)
 
-                    except Exception as e:
-                        logger.error(f"Error processing SSH output for {window_id}: {e}")
+                try:
+                    # Drain what is buffered right now, up to the high watermark
+                    while channel.recv_ready() and not output_queue.paused:
+                        data = channel.recv(32768)
+                        if not data:
+                            break
+                        output_queue.put_nowait(data)
 
-                # Check for stderr data too (important for some games)
-                if channel.recv_stderr_ready():
-                    try:
+                    # Check for stderr data too (important for some games)
+                    while channel.recv_stderr_ready() and not output_queue.paused:
                         stderr_data = channel.recv_stderr(4096)
-                        if stderr_data:
-                            logger.debug(f"Received {len(stderr_data)} bytes stderr from SSH for {window_id}")
-
-                            encoded_data = base64.b64encode(stderr_data).decode('utf-8')
-                            await websocket.send_json({
-                                'type': 'ssh_output',
-                                'data': encoded_data,
-                                'tabId': window_id
-                            })
-
-                            data_received = True
-                    except Exception as e:
-                        logger.error(f"Error processing SSH stderr for {window_id}: {e}")
-
-                # Check if SSH session ended
-                if channel.exit_status_ready():
-                    exit_status = channel.recv_exit_status()
-                    logger.info(f"SSH session {window_id} ended with exit status {exit_status}")
-
-                    await websocket.send_json({
-                        'type': 'process_ended',
-                        'message': f'SSH session ended (exit code: {exit_status})'
-                    })
+                        if not stderr_data:
+                            break
+                        output_queue.put_nowait(stderr_data)
+
+                except Exception as e:
+                    logger.error(f"Error processing SSH output for {window_id}: {e}")
+                    break
+
+                # EOF/close leaves the channel permanently readable, so stop here
+                if channel.closed or channel.eof_received or channel.exit_status_ready():
+                    if channel.recv_ready() or channel.recv_stderr_ready():
+                        continue
                     break
+        finally:
+            output_queue.close()
 
-                # OPTIMIZED: Dynamic sleep based on data activity
-                if data_received:
-                    # If we received data, check again quickly for more
-                    await asyncio.sleep(0.001)  # 1ms for high responsiveness
+    async def _send_queued_output(self, window_id: str, output: DetachableOutput, channel, output_queue: OutputQueue,
+                                  coalescer: OutputCoalescer, scrollback: Optional[WindowScrollback] = None,
+                                  recording: Optional[Recording] = None,
+                                  fast_forward: Optional[FastForward] = None,
+                                  flow: Optional[OutputFlow] = None):
+        """Drain the output queue to the websocket through the coalescer (or fast-forward frames)"""
+        try:
+            while True:
+                if fast_forward and fast_forward.active:
+                    timeout = fast_forward.time_until_frame()
                 else:
-                    # If no data, wait a bit longer but still responsive
-                    await asyncio.sleep(0.01)  # 10ms when idle
+                    timeout = coalescer.time_until_flush()
+                data = await output_queue.get(coalescer.max_bytes, timeout=timeout)
+                if data is None:
+                    # Batch or frame deadline reached, or the reader is done and the queue is empty
+                    if fast_forward:
+                        await fast_forward.tick()
+                    await coalescer.flush()
+                    if output_queue.closed and not output_queue.queued_bytes:
+                        break
+                    continue
 
-            except asyncio.CancelledError:
-                logger.info(f"SSH output listener cancelled for {window_id}")
-                break
-            except Exception as e:
-                logger.error(f"Error in SSH output listener for {window_id}: {e}")
-                await asyncio.sleep(0.05)  # Brief pause before retrying
+                # Bulk output waits for its deficit-round-robin turn; echo goes straight through
+                if flow is not None:
+                    await self.output_scheduler.acquire(flow, len(data))
 
-        logger.info(f"SSH output listener ended for {window_id}")
+                # History and audit always get the raw stream
+                if scrollback:
+                    scrollback.append(data)
+                if recording:
+                    recording.output(data)
+                if fast_forward and await fast_forward.feed(data, lagging=output_queue.paused):
+                    continue
+                await coalescer.feed(data)
+
+            if fast_forward and fast_forward.active:
+                # Paint the final screen before reporting the end
+                await fast_forward.cancel()
+                await output.send_output(fast_forward.screen.render_ansi().encode('utf-8'))
+
+            await self._send_process_ended(output, window_id, channel)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending SSH output for {window_id}: {e}")
+            # Unblock a reader paused on this queue
+            output_queue.close()
+
+    def _create_output_queue(self) -> OutputQueue:
+        """Build the per-window output queue from the ssh.output config"""
+        output_config = self.config.get('output', {})
+        return OutputQueue(
+            high_watermark=int(output_config.get('queue_high_watermark', 1048576)),
+            low_watermark=int(output_config.get('queue_low_watermark', 262144))
+        )
+
+    def _create_coalescer(self, output: DetachableOutput, window_id: str,
+                          screen: Optional[ScreenModel] = None) -> OutputCoalescer:
+        """Build the per-window output coalescer from the ssh.output config"""
+        output_config = self.config.get('output', {})
+        return OutputCoalescer(
+            partial(self._send_output, output, window_id, screen=screen),
+            max_bytes=int(output_config.get('coalesce_max_bytes', 65536)),
+            max_delay=float(output_config.get('coalesce_max_delay_ms', 8)) / 1000,
+            interactive_gap=float(output_config.get('interactive_gap_ms', 20)) / 1000,
+            interactive_bytes=int(output_config.get('interactive_max_bytes', 1024))
+        )
+
+    def _create_fast_forward(self, output: DetachableOutput, coalescer: OutputCoalescer,
+                             screen: Optional[ScreenModel]) -> Optional[FastForward]:
+        """Build the per-window overload mode from the ssh.fast_forward config"""
+        config = self.config.get('fast_forward', {})
+        if not config.get('enabled', False) or screen is None:
+            return None
+        return FastForward(
+            screen, output.send_output, coalescer.flush, output.send_json,
+            enter_rate=int(config.get('enter_rate_bytes', 1048576)),
+            enter_seconds=float(config.get('enter_seconds', 2)),
+            exit_rate=int(config.get('exit_rate_bytes', 262144)),
+            exit_seconds=float(config.get('exit_seconds', 1)),
+            max_fps=float(config.get('max_fps', 10)),
+            lag_seconds=float(config.get('lag_seconds', 0.5))
+        )
+
+    async def _send_output(self, output: DetachableOutput, window_id: str, data: bytes,
+                           screen: Optional[ScreenModel] = None):
+        """Send one chunk of terminal output to the browser (or the detach buffer)"""
+        logger.debug(f"Received {len(data)} bytes from SSH for {window_id}")
+        if screen is not None:
+            screen.defer(data)
+        await output.send_output(data)
+
+    def _render_screen(self, screen: ScreenModel) -> bytes:
+        """Repaint for a reattaching viewer: current screen plus recent scrollback"""
+        return screen.render_ansi(self.screen_scrollback_lines).encode('utf-8')
+
+    def get_screen_snapshot(self, window_id: str, owner: Optional[str] = None, scrollback_lines: int = 0,
+                            ansi: bool = False) -> Optional[Dict]:
+        """What is on a window's screen (None without a screen model, or for another owner's window)"""
+        client_data = self.clients.get(window_id) or self.detached.get(window_id)
+        screen = client_data.get('screen') if client_data else None
+        if screen is None or (owner is not None and client_data.get('owner') != owner):
+            return None
+        scrollback_lines = max(0, min(int(scrollback_lines), self.screen_scrollback_lines))
+        return {'window_id': window_id, **screen.snapshot(scrollback_lines, ansi)}
 
-    def get_active_connections(self) -> Dict[str, Dict]:
-        """Get information about active SSH connections"""
+    async def _send_process_ended(self, output: DetachableOutput, window_id: str, channel):
+        """Tell the browser the remote shell has gone away"""
+        transport = channel.get_transport()
+        if not (transport and transport.is_active()):
+            # Every window sharing the transport gets this at the same time
+            logger.info(f"SSH connection lost for {window_id}")
+            message = 'SSH connection lost'
+        elif channel.exit_status_ready():
+            exit_status = channel.recv_exit_status()
+            logger.info(f"SSH session {window_id} ended with exit status {exit_status}")
+            message = f'SSH session ended (exit code: {exit_status})'
+        else:
+            logger.info(f"SSH channel closed for {window_id}")
+            message = 'SSH session closed'
+
+        try:
+            await output.send_json({
+                'type': 'process_ended',
+                'message': message
+            })
+        except Exception as e:
+            logger.debug(f"Could not send process_ended for {window_id}: {e}")
+
+    def get_active_connections(self, owner: Optional[str] = None) -> Dict[str, Dict]:
+        """Get information about active (and detached) SSH connections (all, or just owner's)"""
         active = {}
-        for window_id, client_data in self.clients.items():
+        for window_id, client_data in list(self.clients.items()) + list(self.detached.items()):
+            if owner is not None and client_data.get('owner') != owner:
+                continue
             channel = client_data.get('channel')
-            client = client_data.get('client')
+            transport = channel.get_transport() if channel else None
+
+            coalescer = client_data.get('coalescer')
+            output_queue = client_data.get('output_queue')
+            output = client_data.get('output')
 
             active[window_id] = {
                 'connected': client_data.get('connected', False),
                 'channel_open': channel and not channel.closed if channel else False,
-                'client_connected': client and client.get_transport() and client.get_transport().is_active() if client else False
+                'client_connected': bool(transport and transport.is_active()),
+                'ssh_profile': client_data.get('ssh_profile'),
+                'input': client_data['input_writer'].get_stats() if client_data.get('input_writer') else None,
+                'recording': client_data['recording'].get_stats() if client_data.get('recording') else None,
+                'screen': {'cols': client_data['screen'].cols, 'rows': client_data['screen'].rows,
+                           'alt_screen': client_data['screen'].in_alt_screen,
+                           'skipped_bytes': client_data['screen'].bytes_skipped} if client_data.get('screen') else None,
+                'session': output.get_stats() if output else None,
+                'output': coalescer.get_stats() if coalescer else None,
+                'output_queue': output_queue.get_stats() if output_queue else None,
+                'fast_forward': client_data['fast_forward'].get_stats() if client_data.get('fast_forward') else None,
+                'scheduler': client_data['output_flow'].get_stats() if client_data.get('output_flow') else None
             }
-        return active
\ No newline at end of file
+        return active
+
+    def forget_user(self, owner: str):
+        """owner logged out: close their lingering transports and drop their parsed keys, here and in workers"""
+        self.key_cache.forget_user(owner)
+        self.transport_pool.close_lingering(owner)
+        if self.workers is not None:
+            self.workers.purge_user(owner)
+
+    def get_metrics(self) -> Dict:
+        """SSH layer gauges for the metrics endpoint"""
+        return {
+            'windows': len(self.clients),
+            'connected': sum(1 for c in self.clients.values() if c.get('connected')),
+            'detached': self._get_detached_totals(),
+            'connect_executor': self.connect_executor.get_stats(),
+            'dialer': self.dialer.get_stats() if self.dialer else None,
+            'host_health': self.host_health.get_stats(),
+            'connect_timing': self.connect_timing.get_stats(),
+            'admission': self.admission.get_stats(),
+            'transport_pool': self.transport_pool.get_stats(),
+            'workers': self.workers.get_stats() if self.workers else None,
+            'key_cache': self.key_cache.get_stats(),
+            'algorithm_profiles': self.algorithm_profiles.get_stats(),
+            'recorder': self.recorder.get_stats() if self.recorder else None,
+            'output_scheduler': self.output_scheduler.get_stats(),
+            'output_coalescing': self._get_coalescing_totals(),
+            'output_backpressure': self._get_backpressure_totals()
+        }
+
+    def _get_detached_totals(self) -> Dict:
+        """Detached sessions and the output they are holding"""
+        totals = {'sessions': len(self.detached), 'grace_seconds': self.detach_grace,
+                  'buffered_bytes': 0, 'dropped_bytes': 0}
+        for client_data in self.detached.values():
+            stats = client_data['output'].get_stats()
+            totals['buffered_bytes'] += stats['buffered_bytes']
+            totals['dropped_bytes'] += stats['dropped_bytes']
+        return totals
+
+    def _get_coalescing_totals(self) -> Dict:
+        """Frames saved and added latency summed over live windows"""
+        totals = {'chunks_in': 0, 'frames_out': 0, 'frames_saved': 0, 'bytes': 0, 'max_added_latency_ms': 0.0}
+        for client_data in self.clients.values():
+            coalescer = client_data.get('coalescer')
+            if not coalescer:
+                continue
+            stats = coalescer.get_stats()
+            for key in ('chunks_in', 'frames_out', 'frames_saved', 'bytes'):
+                totals[key] += stats[key]
+            totals['max_added_latency_ms'] = max(totals['max_added_latency_ms'], stats['max_added_latency_ms'])
+        return totals
+
+    def _get_backpressure_totals(self) -> Dict:
+        """Queued bytes and watermark crossings summed over live windows"""
+        totals = {'queued_bytes': 0, 'windows_paused': 0, 'high_watermark_crossings': 0,
+                  'low_watermark_crossings': 0, 'paused_seconds': 0.0}
+        for client_data in self.clients.values():
+            output_queue = client_data.get('output_queue')
+            if not output_queue:
+                continue
+            stats = output_queue.get_stats()
+            totals['queued_bytes'] += stats['queued_bytes']
+            totals['windows_paused'] += 1 if stats['paused'] else 0
+            totals['high_watermark_crossings'] += stats['high_watermark_crossings']
+            totals['low_watermark_crossings'] += stats['low_watermark_crossings']
+            totals['paused_seconds'] += stats['paused_seconds']
+        return totals
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+SSH algorithm profile benchmark
+Measures handshake time and bulk throughput for each profile in ssh_profiles
+
+By default runs against a throwaway in-process paramiko server on 127.0.0.1,
+which isolates client-side crypto cost. Point it at a real device with
+--host/--username/--password (and --command to produce bulk output there).
+
+    python ssh_profile_bench.py
+    python ssh_profile_bench.py --profiles default fast --rounds 20 --bulk-mb 32
+    python ssh_profile_bench.py --host 10.0.0.1 --username admin --password x \\
+        --command "show tech-support" --profiles default legacy
+"""
+
+import argparse
+import logging
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import paramiko
+import yaml
+
+from ssh_profiles import AlgorithmProfiles, describe_negotiated
+
+BULK_CHUNK = b"interface GigabitEthernet0/1 is up, line protocol is up  " * 1024
+
+
+class _BenchServer(paramiko.ServerInterface):
+    """Accepts any password and serves one exec channel with bulk_bytes of output"""
+
+    def __init__(self, bulk_bytes: int):
+        self.bulk_bytes = bulk_bytes
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._send_bulk, args=(channel,), daemon=True).start()
+        return True
+
+    def _send_bulk(self, channel):
+        remaining = self.bulk_bytes
+        try:
+            # paramiko acknowledges the exec request only after this callback returns. Wait for the
+            # client's EOF, which it sends once exec_command has succeeded, so output (and the close)
+            # never overtakes the acknowledgement
+            while channel.recv(4096):
+                pass
+            while remaining > 0:
+                chunk = BULK_CHUNK[:remaining]
+                channel.sendall(chunk)
+                remaining -= len(chunk)
+            channel.send_exit_status(0)
+        finally:
+            channel.close()
+
+
+class LocalServer:
+    """paramiko server on an ephemeral localhost port, one thread per connection"""
+
+    def __init__(self, bulk_bytes: int):
+        self.bulk_bytes = bulk_bytes
+        # RSA and ECDSA host keys (paramiko cannot generate Ed25519 keys)
+        self.host_keys = [paramiko.RSAKey.generate(2048), paramiko.ECDSAKey.generate()]
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        transport = paramiko.Transport(conn)
+        for key in self.host_keys:
+            transport.add_server_key(key)
+        # Let the client's profile decide whether compression is used
+        transport.use_compression(True)
+        try:
+            transport.start_server(server=_BenchServer(self.bulk_bytes))
+            while transport.is_active():
+                time.sleep(0.2)
+        except Exception:
+            pass
+        finally:
+            transport.close()
+
+    def close(self):
+        self.sock.close()
+
+
+def connect(profile, host: str, port: int, username: str, password: str) -> paramiko.SSHClient:
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(
+        hostname=host, port=port, username=username, password=password,
+        timeout=15, banner_timeout=15, auth_timeout=15,
+        look_for_keys=False, allow_agent=False, gss_auth=False, gss_kex=False,
+        compress=profile.compress, transport_factory=profile.transport_factory
+    )
+    return client
+
+
+def bench_profile(profile, args) -> dict:
+    handshakes = []
+    negotiated = None
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        client = connect(profile, args.host, args.port, args.username, args.password)
+        handshakes.append((time.perf_counter() - started) * 1000)
+        negotiated = describe_negotiated(client.get_transport())
+        client.close()
+
+    client = connect(profile, args.host, args.port, args.username, args.password)
+    try:
+        channel = client.get_transport().open_session()
+        started = time.perf_counter()
+        channel.exec_command(args.command)
+        # No input follows; the local server starts sending once it sees this
+        channel.shutdown_write()
+        received = 0
+        while True:
+            data = channel.recv(65536)
+            if not data:
+                break
+            received += len(data)
+        elapsed = time.perf_counter() - started
+    finally:
+        client.close()
+
+    return {
+        'profile': profile.name,
+        'handshake_ms_median': statistics.median(handshakes),
+        'handshake_ms_p90': (statistics.quantiles(handshakes, n=10, method='inclusive')[-1]
+                             if len(handshakes) > 1 else handshakes[0]),
+        'throughput_mb_s': received / elapsed / 1048576 if elapsed else 0.0,
+        'received_bytes': received,
+        'negotiated': negotiated,
+    }
+
+
+def load_profiles(config_path: str) -> AlgorithmProfiles:
+    try:
+        with open(config_path) as f:
+            config = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        config = {}
+    return AlgorithmProfiles((config.get('ssh') or {}).get('algorithm_profiles'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SSH algorithm profiles")
+    parser.add_argument("--config", default="config.yaml", help="Config with ssh.algorithm_profiles")
+    parser.add_argument("--profiles", nargs="*", help="Profiles to run (default: all)")
+    parser.add_argument("--rounds", type=int, default=10, help="Handshakes per profile")
+    parser.add_argument("--bulk-mb", type=float, default=16, help="Bulk output size for the local server")
+    parser.add_argument("--host", help="Benchmark a real device instead of the local server")
+    parser.add_argument("--port", type=int, default=22)
+    parser.add_argument("--username", default="bench")
+    parser.add_argument("--password", default="bench")
+    parser.add_argument("--command", default="bulk", help="Command producing bulk output on --host")
+    args = parser.parse_args()
+
+    # Client closes are abrupt; keep the local server's transport noise out of the table
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+    registry = load_profiles(args.config)
+    names = args.profiles or list(registry.profiles)
+    unknown = [name for name in names if name not in registry.profiles]
+    if unknown:
+        parser.error(f"unknown profiles: {', '.join(unknown)} (have {', '.join(registry.profiles)})")
+
+    server = None
+    if not args.host:
+        server = LocalServer(int(args.bulk_mb * 1048576))
+        args.host, args.port = "127.0.0.1", server.port
+
+    print(f"Target {args.host}:{args.port}, {args.rounds} handshakes per profile")
+    print(f"{'profile':<12} {'hs median':>10} {'hs p90':>9} {'MB/s':>8}  negotiated")
+    try:
+        for name in names:
+            try:
+                result = bench_profile(registry.profiles[name], args)
+            except Exception as e:
+                print(f"{name:<12} failed: {e}")
+                continue
+            n = result['negotiated']
+            print(f"{name:<12} {result['handshake_ms_median']:>8.1f}ms {result['handshake_ms_p90']:>7.1f}ms "
+                  f"{result['throughput_mb_s']:>8.1f}  {n['host_key']} {n['cipher']} "
+                  f"{n['mac']} {n['compression']}")
+    finally:
+        if server:
+            server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Named SSH algorithm profiles
+Preferred KEX, ciphers, MACs, host key types and compression, chosen per device type or per session
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+# Profile fields -> (paramiko preference attribute, algorithm table that defines valid names)
+PREFERENCE_FIELDS = {
+    'kex': ('_preferred_kex', '_kex_info'),
+    'ciphers': ('_preferred_ciphers', '_cipher_info'),
+    'macs': ('_preferred_macs', '_mac_info'),
+    'host_keys': ('_preferred_keys', '_key_info'),
+}
+
+BUILTIN_PROFILES = {
+    'default': {
+        'description': 'paramiko defaults, compression off',
+    },
+    'fast': {
+        'description': 'Cheapest modern handshake and AEAD cipher for fast links and current OpenSSH',
+        'kex': ['curve25519-sha256@libssh.org', 'ecdh-sha2-nistp256'],
+        'ciphers': ['aes128-gcm@openssh.com', 'aes128-ctr'],
+        'macs': ['hmac-sha2-256-etm@openssh.com', 'hmac-sha2-256'],
+        'host_keys': ['ssh-ed25519', 'ecdsa-sha2-nistp256'],
+    },
+    'legacy': {
+        # KEX order only: weak algorithms (group1, CBC, 3DES, SHA-1) must be opted into with a custom profile
+        'description': 'Fixed-group DH ahead of slow group-exchange for old IOS; ciphers and MACs unchanged',
+        'kex': ['curve25519-sha256@libssh.org', 'ecdh-sha2-nistp256', 'ecdh-sha2-nistp384', 'ecdh-sha2-nistp521',
+                'diffie-hellman-group14-sha256'],
+    },
+    'compressed': {
+        'description': 'zlib compression for slow or metered links with text-heavy output',
+        'compress': True,
+    },
+}
+
+class AlgorithmProfile:
+    """Algorithm preferences applied to a transport before its handshake starts
+
+    Listed algorithms are moved to the front of paramiko's defaults rather than
+    replacing them, so a device that supports none of them still negotiates.
+    """
+
+    def __init__(self, name: str, description: str = '', compress: bool = False,
+                 kex: Optional[List[str]] = None, ciphers: Optional[List[str]] = None,
+                 macs: Optional[List[str]] = None, host_keys: Optional[List[str]] = None):
+        self.name = name
+        self.description = description
+        self.compress = bool(compress)
+        self.preferences = {
+            'kex': list(kex or []),
+            'ciphers': list(ciphers or []),
+            'macs': list(macs or []),
+            'host_keys': list(host_keys or []),
+        }
+
+    def apply(self, transport: paramiko.Transport):
+        """Reorder transport's algorithm preferences; unsupported names are skipped"""
+        for field, (preferred_attr, info_attr) in PREFERENCE_FIELDS.items():
+            wanted = self.preferences[field]
+            if not wanted:
+                continue
+
+            defaults = getattr(transport, preferred_attr)
+            known = getattr(transport, info_attr)
+            # Only algorithms this paramiko build both knows and enables by default
+            preferred = [name for name in wanted if name in known and name in defaults]
+            if not preferred:
+                continue
+            setattr(transport, preferred_attr,
+                    tuple(preferred) + tuple(name for name in defaults if name not in preferred))
+
+    def transport_factory(self, sock, **kwargs) -> paramiko.Transport:
+        """SSHClient.connect(transport_factory=...) hook"""
+        transport = paramiko.Transport(sock, **kwargs)
+        self.apply(transport)
+        return transport
+
+    def describe(self) -> Dict:
+        return {
+            'name': self.name,
+            'description': self.description,
+            'compress': self.compress,
+            **{field: names for field, names in self.preferences.items() if names},
+        }
+
+
+def describe_negotiated(transport: paramiko.Transport) -> Dict:
+    """Algorithms a live transport agreed on (paramiko does not keep the KEX name after rekey)"""
+    return {
+        'host_key': transport.host_key_type,
+        'cipher': transport.local_cipher,
+        'mac': transport.local_mac,
+        'compression': transport.local_compression,
+    }
+
+
+class AlgorithmProfiles:
+    """Profile registry: built-ins plus the ssh.algorithm_profiles config section"""
+
+    def __init__(self, config: Optional[Dict] = None):
+        config = config or {}
+        self.profiles: Dict[str, AlgorithmProfile] = {}
+
+        for name, spec in {**BUILTIN_PROFILES, **(config.get('profiles') or {})}.items():
+            try:
+                self.profiles[name] = AlgorithmProfile(name, **(spec or {}))
+            except TypeError as e:
+                logger.error(f"Ignoring SSH algorithm profile '{name}': {e}")
+
+        self.default_profile = config.get('default_profile', 'default')
+        if self.default_profile not in self.profiles:
+            logger.warning(f"Unknown default SSH profile '{self.default_profile}' - using 'default'")
+            self.default_profile = 'default'
+
+        self.device_types = dict(config.get('device_types') or {})
+        self.usage: Dict[str, int] = {}
+
+    def resolve(self, profile: Optional[str] = None, device_type: Optional[str] = None) -> AlgorithmProfile:
+        """Session's explicit profile, else its device type's, else the default"""
+        name = None
+        if profile:
+            if profile in self.profiles:
+                name = profile
+            else:
+                logger.warning(f"Unknown SSH profile '{profile}' requested - falling back")
+
+        if name is None and device_type:
+            name = self.device_types.get(device_type)
+            if name not in self.profiles:
+                name = None
+
+        name = name or self.default_profile
+        self.usage[name] = self.usage.get(name, 0) + 1
+        return self.profiles[name]
+
+    def get_stats(self) -> Dict:
+        return {
+            'default_profile': self.default_profile,
+            'device_types': dict(self.device_types),
+            'profiles': {name: profile.describe() for name, profile in self.profiles.items()},
+            'usage': dict(self.usage),
+        }
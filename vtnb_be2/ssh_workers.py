@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+"""
+SSH worker processes
+Shards paramiko transports (and their crypto) across processes; terminal bytes cross a socketpair
+"""
+
+import asyncio
+import errno
+import json
+import logging
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import paramiko
+
+from connect_timing import ConnectTiming
+from host_health import classify_failure
+
+logger = logging.getLogger(__name__)
+
+# Frame: type (1 byte), channel id (4), payload length (4), payload
+FRAME_HEADER = struct.Struct('!BII')
+
+HELLO = 1       # front -> worker: JSON ssh config
+OPEN = 2        # front -> worker: JSON connect request
+OPENED = 3      # worker -> front: JSON channel info
+ERROR = 4       # worker -> front: JSON {error, message}
+DATA = 5        # worker -> front: terminal output
+DATA_ACK = 6    # front -> worker: output bytes consumed
+INPUT = 7       # front -> worker: keystrokes / paste
+INPUT_ACK = 8   # worker -> front: input bytes handed to the SSH channel
+RESIZE = 9      # front -> worker: JSON {cols, rows}
+CLOSE = 10      # front -> worker: close the channel
+CLOSED = 11     # worker -> front: JSON {exit_status, transport_active}
+PURGE_USER = 12  # front -> worker: JSON {owner} logged out: close lingering transports, drop parsed keys
+
+_ACK = struct.Struct('!Q')
+
+
+def _frame(kind: int, channel_id: int, payload: bytes = b'') -> bytes:
+    return FRAME_HEADER.pack(kind, channel_id, len(payload)) + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader):
+    kind, channel_id, length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    payload = await reader.readexactly(length) if length else b''
+    return kind, channel_id, payload
+
+
+class _WorkerTransport:
+    """Stands in for the paramiko Transport that lives in the worker"""
+
+    def __init__(self):
+        self.active = True
+
+    def is_active(self) -> bool:
+        return self.active
+
+
+class WorkerChannel:
+    """Front-process proxy for a shell channel owned by an SSH worker
+
+    Implements the part of paramiko.Channel the output pipeline and input
+    writer use. Output is credit-based: the worker stops reading the real
+    channel once window_bytes are unacknowledged, so a paused output queue
+    here still closes the device's SSH window.
+    """
+
+    def __init__(self, worker: '_WorkerProcess', channel_id: int, window_id: str, window_bytes: int):
+        self.worker = worker
+        self.channel_id = channel_id
+        self.window_id = window_id
+        self.window_bytes = window_bytes
+        self.closed = False
+        self.eof_received = False
+        self.exit_status: Optional[int] = None
+        self.info: Dict = {}
+        self.opened = asyncio.get_running_loop().create_future()
+        self._transport = _WorkerTransport()
+        self._buffer = bytearray()
+        self._readable = asyncio.Event()
+        self._unacked = 0
+        self._input_in_flight = 0
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+    # --- output (worker -> browser) ---
+
+    def recv_ready(self) -> bool:
+        return bool(self._buffer)
+
+    def recv(self, size: int) -> bytes:
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self._unacked += len(data)
+
+        # Return credit in quarter-window steps (or once drained) to keep frames few
+        if self._unacked and (self._unacked >= self.window_bytes // 4 or not self._buffer):
+            self.worker.send(DATA_ACK, self.channel_id, _ACK.pack(self._unacked))
+            self._unacked = 0
+        if not self._buffer and not self.eof_received:
+            self._readable.clear()
+        return data
+
+    def recv_stderr_ready(self) -> bool:
+        # Workers open channels with combined stderr
+        return False
+
+    def recv_stderr(self, size: int) -> bytes:
+        return b''
+
+    def exit_status_ready(self) -> bool:
+        return self.exit_status is not None
+
+    def recv_exit_status(self) -> int:
+        return self.exit_status if self.exit_status is not None else -1
+
+    async def wait_readable(self, timeout: Optional[float] = None) -> bool:
+        """Readiness without a file descriptor (used by ChannelPump)"""
+        if timeout is None:
+            await self._readable.wait()
+            return True
+        try:
+            await asyncio.wait_for(self._readable.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # --- input (browser -> worker) ---
+
+    def send_ready(self) -> bool:
+        return not self.closed and self._input_in_flight < self.window_bytes
+
+    def send(self, data: bytes) -> int:
+        if self.closed:
+            return 0
+        data = bytes(data[:self.window_bytes - self._input_in_flight])
+        if data:
+            self._input_in_flight += len(data)
+            self.worker.send(INPUT, self.channel_id, data)
+            if self._input_in_flight >= self.window_bytes:
+                self._writable.clear()
+        return len(data)
+
+    async def wait_writable(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the worker to acknowledge input (used by ChannelPump)"""
+        if timeout is None:
+            await self._writable.wait()
+            return True
+        try:
+            await asyncio.wait_for(self._writable.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def resize_pty(self, width: int = 80, height: int = 24):
+        if not self.closed:
+            self.worker.send(RESIZE, self.channel_id, json.dumps({'cols': width, 'rows': height}).encode())
+
+    def get_transport(self) -> _WorkerTransport:
+        return self._transport
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._readable.set()
+        self._writable.set()
+        self.worker.close_channel(self)
+
+    # --- frames from the worker ---
+
+    def _on_data(self, data: bytes):
+        self._buffer += data
+        self._readable.set()
+
+    def _on_input_ack(self, count: int):
+        self._input_in_flight = max(0, self._input_in_flight - count)
+        if self._input_in_flight < self.window_bytes:
+            self._writable.set()
+
+    def _on_closed(self, exit_status: Optional[int], transport_active: bool):
+        self.exit_status = exit_status
+        self._transport.active = transport_active
+        self.eof_received = True
+        self.closed = True
+        self._readable.set()
+        self._writable.set()
+
+
+class _WorkerProcess:
+    """One SSH worker process and the channels it owns"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[subprocess.Popen] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.channels: Dict[int, WorkerChannel] = {}
+        # pool key -> when its last channel here closed; the worker may keep that transport lingering
+        self.released: Dict = {}
+        self.reader_task: Optional[asyncio.Task] = None
+        self.started_at = 0.0
+        self.stats = {'starts': 0, 'channels_opened': 0, 'bytes_out': 0, 'bytes_in': 0, 'frames_in': 0}
+
+    @property
+    def alive(self) -> bool:
+        return self.writer is not None and self.process is not None and self.process.poll() is None
+
+    async def start(self, config: Dict):
+        parent_sock, child_sock = socket.socketpair()
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--fd', str(child_sock.fileno()),
+                 '--index', str(self.index)],
+                pass_fds=(child_sock.fileno(),),
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+        finally:
+            child_sock.close()
+
+        reader, self.writer = await asyncio.open_connection(sock=parent_sock)
+        self.send(HELLO, 0, json.dumps(config).encode())
+        self.started_at = time.time()
+        self.stats['starts'] += 1
+        self.reader_task = asyncio.create_task(self._read_frames(reader))
+        self.reader_task.set_name(f"ssh_worker_{self.index}")
+        logger.info(f"Started SSH worker {self.index} (pid {self.process.pid})")
+
+    def send(self, kind: int, channel_id: int, payload: bytes = b''):
+        if self.writer is None or self.writer.is_closing():
+            return
+        self.stats['bytes_in'] += len(payload)
+        self.writer.write(_frame(kind, channel_id, payload))
+
+    def close_channel(self, channel: WorkerChannel):
+        if self.channels.pop(channel.channel_id, None) is not None:
+            self.send(CLOSE, channel.channel_id)
+            if channel.opened.done():
+                self._note_released(channel)
+        if not channel.opened.done():
+            channel.opened.cancel()
+
+    def _note_released(self, channel: WorkerChannel):
+        key = channel.info.get('key')
+        if key is not None and not any(c.info.get('key') == key for c in self.channels.values()):
+            self.released[key] = time.monotonic()
+
+    async def _read_frames(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                kind, channel_id, payload = await _read_frame(reader)
+                self.stats['frames_in'] += 1
+                channel = self.channels.get(channel_id)
+                if channel is None:
+                    continue
+
+                if kind == DATA:
+                    self.stats['bytes_out'] += len(payload)
+                    channel._on_data(payload)
+                elif kind == INPUT_ACK:
+                    channel._on_input_ack(_ACK.unpack(payload)[0])
+                elif kind == OPENED:
+                    channel.info = json.loads(payload)
+                    if not channel.opened.done():
+                        channel.opened.set_result(channel)
+                elif kind == ERROR:
+                    self.channels.pop(channel_id, None)
+                    error = json.loads(payload)
+                    if not channel.opened.done():
+                        channel.opened.set_exception(_rebuild_error(error))
+                elif kind == CLOSED:
+                    self.channels.pop(channel_id, None)
+                    info = json.loads(payload)
+                    if info.get('transport_active'):
+                        self._note_released(channel)
+                    channel._on_closed(info.get('exit_status'), info.get('transport_active', False))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            logger.error(f"SSH worker {self.index} went away: {e!r}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"SSH worker {self.index} frame error: {e}")
+        finally:
+            self._fail_channels()
+
+    def _fail_channels(self):
+        """The worker is gone: every session it held lost its connection"""
+        channels, self.channels = self.channels, {}
+        self.released.clear()
+        for channel in channels.values():
+            if not channel.opened.done():
+                channel.opened.set_exception(ConnectionError("SSH worker process exited"))
+            channel._on_closed(None, False)
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+
+    def stop(self):
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def get_stats(self) -> Dict:
+        return {
+            'index': self.index,
+            'pid': self.process.pid if self.process else None,
+            'alive': self.alive,
+            'channels': len(self.channels),
+            'uptime_seconds': round(time.time() - self.started_at, 1) if self.alive else 0,
+            **self.stats,
+        }
+
+
+def _rebuild_error(error: Dict) -> Exception:
+    """Worker-side connect failure as the exception connect() reports (same host_health category)"""
+    message = error.get('message')
+    category = error.get('error')
+    if category == 'auth':
+        return paramiko.AuthenticationException(message)
+    if category == 'refused':
+        return ConnectionRefusedError(message)
+    if category == 'timeout':
+        return socket.timeout(message)
+    if category == 'unreachable':
+        return OSError(errno.EHOSTUNREACH, message)
+    if category == 'dns':
+        return socket.gaierror(message)
+    if category == 'protocol':
+        return paramiko.SSHException(message)
+    return ConnectionError(message)
+
+
+class SSHWorkerPool:
+    """Process pool that owns SSH transports on behalf of the front process
+
+    Windows to the same target (owner, host, port, user, auth identity)
+    stick to one worker while any of them is open, so channel multiplexing
+    keeps working. For linger_seconds after the last one closes they still
+    go to that worker, which may hold the transport lingering; other new
+    targets go to the worker with the fewest channels.
+    The front process keeps everything above the channel: coalescing,
+    screen model, scrollback, recording and the websockets.
+    """
+
+    def __init__(self, config: Dict, processes: int = 0, window_bytes: int = 1048576):
+        self.config = config
+        self.processes = processes or os.cpu_count() or 1
+        self.window_bytes = window_bytes
+        self.linger_seconds = float((config.get('multiplex') or {}).get('linger_seconds', 120))
+        self.workers: List[_WorkerProcess] = [_WorkerProcess(i) for i in range(self.processes)]
+        self.linger_routed = 0
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._next_channel_id = 1
+
+    async def _pick_worker(self, key) -> _WorkerProcess:
+        worker = next((w for w in self.workers if w.alive
+                       and any(c.info.get('key') == key for c in w.channels.values())), None)
+        if worker is None:
+            worker = self._lingering_worker(key)
+        if worker is None:
+            worker = min(self.workers, key=lambda w: (not w.alive, len(w.channels)))
+
+        if not worker.alive:
+            if self._start_lock is None:
+                self._start_lock = asyncio.Lock()
+            async with self._start_lock:
+                if not worker.alive:
+                    await worker.start(self.config)
+        return worker
+
+    def _lingering_worker(self, key) -> Optional[_WorkerProcess]:
+        """Worker whose transport for key may still be lingering (most recently released)"""
+        now = time.monotonic()
+        best, best_at = None, 0.0
+        for worker in self.workers:
+            released_at = worker.released.get(key)
+            if released_at is None:
+                continue
+            if now - released_at >= self.linger_seconds:
+                del worker.released[key]
+            elif worker.alive and released_at > best_at:
+                best, best_at = worker, released_at
+        if best is not None:
+            self.linger_routed += 1
+        return best
+
+    async def open_shell(self, window_id: str, key, owner: Optional[str], hostname: str, port: int,
+                         username: str, password: str, ssh_key_path: Optional[str],
+                         profile: str, timing: Optional[ConnectTiming] = None) -> WorkerChannel:
+        """Connect (or open a channel on a shared transport) inside a worker"""
+        worker = await self._pick_worker(key)
+        channel_id = self._next_channel_id
+        self._next_channel_id += 1
+
+        channel = WorkerChannel(worker, channel_id, window_id, self.window_bytes)
+        channel.info = {'key': key}
+        worker.channels[channel_id] = channel
+        worker.stats['channels_opened'] += 1
+        worker.send(OPEN, channel_id, json.dumps({
+            'window_id': window_id, 'owner': owner, 'hostname': hostname, 'port': port,
+            'username': username, 'password': password, 'ssh_key_path': ssh_key_path, 'profile': profile
+        }).encode())
+
+        try:
+            await channel.opened
+        except BaseException:
+            # Cancelled or failed: make sure the worker drops the half-open channel
+            worker.close_channel(channel)
+            raise
+
+        if timing is not None:
+            # The worker's own phase laps; the rest of the round trip is process/IPC overhead
+            worker_timing = channel.info.get('timing') or {}
+            timing.merge(worker_timing.get('phases', {}), 'worker')
+            timing.reused = bool(worker_timing.get('reused'))
+
+        channel.info['key'] = key
+        logger.info(f"SSH window {window_id} runs in worker {worker.index} ({channel.info.get('negotiated')})")
+        return channel
+
+    def purge_user(self, owner: str):
+        """Owner logged out: every running worker drops its lingering transports and parsed keys"""
+        payload = json.dumps({'owner': owner}).encode()
+        for worker in self.workers:
+            for key in [k for k in worker.released if k[0] == (owner or '')]:
+                del worker.released[key]
+            if worker.alive:
+                worker.send(PURGE_USER, 0, payload)
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def get_stats(self) -> Dict:
+        return {
+            'processes': self.processes,
+            'window_bytes': self.window_bytes,
+            'channels': sum(len(w.channels) for w in self.workers),
+            'linger_routed': self.linger_routed,
+            'workers': [w.get_stats() for w in self.workers],
+        }
+
+
+# --- worker process side ---
+
+class _WorkerServer:
+    """Runs inside a worker process: a plain SSHClientManager plus the frame protocol"""
+
+    def __init__(self, index: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, config: Dict):
+        from ssh_manager import SSHClientManager
+
+        self.index = index
+        self.reader = reader
+        self.writer = writer
+        self.window_bytes = int(config.get('workers', {}).get('window_bytes', 1048576))
+        # Workers never nest: this manager talks to paramiko directly
+        # The front process runs the host circuit breaker
+        self.manager = SSHClientManager({**config, 'workers': {'enabled': False}, 'host_health': {'enabled': False}})
+        self.channels: Dict[int, Dict] = {}
+
+    def send(self, kind: int, channel_id: int, payload: bytes = b''):
+        self.writer.write(_frame(kind, channel_id, payload))
+
+    async def serve(self):
+        try:
+            while True:
+                kind, channel_id, payload = await _read_frame(self.reader)
+                entry = self.channels.get(channel_id)
+
+                if kind == OPEN:
+                    entry = self.channels[channel_id] = {'input': deque(), 'unacked': 0,
+                                                         'credit': asyncio.Event()}
+                    entry['task'] = asyncio.create_task(self._run_channel(channel_id, entry, json.loads(payload)))
+                elif kind == PURGE_USER:
+                    self.manager.forget_user(json.loads(payload)['owner'])
+                elif entry is None:
+                    continue
+                elif kind == DATA_ACK:
+                    entry['unacked'] = max(0, entry['unacked'] - _ACK.unpack(payload)[0])
+                    entry['credit'].set()
+                elif kind == INPUT:
+                    entry['input'].append(payload)
+                    if entry.get('writer') is None or entry['writer'].done():
+                        entry['writer'] = asyncio.create_task(self._write_input(channel_id, entry))
+                elif kind == RESIZE:
+                    channel = entry.get('channel')
+                    size = json.loads(payload)
+                    if channel is not None and not channel.closed:
+                        channel.resize_pty(width=size['cols'], height=size['rows'])
+                elif kind == CLOSE:
+                    entry['task'].cancel()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Front process is gone - nothing left to serve
+            pass
+        finally:
+            for entry in list(self.channels.values()):
+                entry['task'].cancel()
+
+    async def _run_channel(self, channel_id: int, entry: Dict, request: Dict):
+        manager = self.manager
+        window_id = request['window_id']
+        pooled = channel = None
+        try:
+            key = manager.transport_pool.make_key(request['owner'], request['hostname'], int(request['port']),
+                                                  request['username'], request['password'], request['ssh_key_path'])
+            algorithms = manager.algorithm_profiles.resolve(request.get('profile'))
+            timing = ConnectTiming()
+            try:
+                pooled, channel = await manager._acquire_shell(
+                    window_id, key, request['hostname'], int(request['port']), request['username'],
+                    request['password'], request['ssh_key_path'], algorithms, timing
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = classify_failure(e)
+                self.send(ERROR, channel_id, json.dumps({'error': error, 'message': str(e)}).encode())
+                return
+
+            entry['channel'] = channel
+            self.send(OPENED, channel_id, json.dumps({
+                'worker': self.index,
+                'negotiated': f"worker {self.index}, pid {os.getpid()}",
+                'timing': {'phases': timing.phases, 'reused': timing.reused}
+            }).encode())
+
+            await self._pump_output(channel_id, entry, channel)
+
+            transport = channel.get_transport()
+            self.send(CLOSED, channel_id, json.dumps({
+                'exit_status': channel.recv_exit_status() if channel.exit_status_ready() else None,
+                'transport_active': bool(transport and transport.is_active())
+            }).encode())
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"SSH worker {self.index} channel {window_id} failed: {e}")
+            self.send(CLOSED, channel_id, json.dumps({'exit_status': None, 'transport_active': False}).encode())
+        finally:
+            self.channels.pop(channel_id, None)
+            if entry.get('writer') is not None:
+                entry['writer'].cancel()
+            manager._release_shell(window_id, pooled, channel)
+
+    async def _pump_output(self, channel_id: int, entry: Dict, channel):
+        """Forward channel output within the front process's credit window"""
+        while True:
+            while entry['unacked'] >= self.window_bytes:
+                # Front is behind (its output queue paused) - stop reading, the SSH window fills
+                entry['credit'].clear()
+                await entry['credit'].wait()
+
+            await self.manager.channel_pump.wait_readable(channel)
+
+            while channel.recv_ready() and entry['unacked'] < self.window_bytes:
+                data = channel.recv(32768)
+                if not data:
+                    break
+                entry['unacked'] += len(data)
+                self.send(DATA, channel_id, data)
+            await self.writer.drain()
+
+            if channel.closed or channel.eof_received or channel.exit_status_ready():
+                if channel.recv_ready():
+                    continue
+                return
+
+    async def _write_input(self, channel_id: int, entry: Dict):
+        """Hand queued input to the SSH channel as its window allows, acknowledging each write"""
+        channel = entry.get('channel')
+        pending = entry['input']
+        while pending and channel is not None and not channel.closed:
+            if not channel.send_ready():
+                # Woken by the device's window adjust (or the channel closing)
+                await self.manager.channel_pump.wait_writable(channel, timeout=1.0)
+                continue
+            data = pending[0]
+            sent = channel.send(data[:32768])
+            if sent < len(data):
+                pending[0] = data[sent:]
+            else:
+                pending.popleft()
+            self.send(INPUT_ACK, channel_id, _ACK.pack(sent))
+
+
+async def _worker_main(fd: int, index: int):
+    sock = socket.socket(fileno=fd)
+    reader, writer = await asyncio.open_connection(sock=sock)
+    kind, _, payload = await _read_frame(reader)
+    if kind != HELLO:
+        raise RuntimeError("SSH worker expected HELLO")
+    server = _WorkerServer(index, reader, writer, json.loads(payload))
+    await server.serve()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="VelociTerm SSH worker process")
+    parser.add_argument('--fd', type=int, required=True)
+    parser.add_argument('--index', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s ssh-worker-{args.index} %(name)s %(levelname)s %(message)s')
+    asyncio.run(_worker_main(args.fd, args.index))
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Pluggable state store for login sessions and window ownership
+In-process dicts for a single worker, SQLite (WAL) shared by several uvicorn workers
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(ABC):
+    """Namespaced key/value store with optional per-entry TTL
+
+    Values are JSON-compatible. Expired entries are never returned and are
+    purged lazily. Namespaces in use: sessions, window_sessions,
+    windows, window_workers, secrets. Private key material never goes here.
+    """
+
+    backend = 'none'
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def setdefault(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> Any:
+        """Store value unless the key is already set; return whichever value is stored"""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        ...
+
+    @abstractmethod
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        ...
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        ...
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def get_stats(self) -> Dict:
+        ...
+
+
+class MemoryStateStore(StateStore):
+    """Plain dicts - state lives and dies with this process (single worker)"""
+
+    backend = 'memory'
+
+    def __init__(self):
+        # namespace -> key -> (value, expires_at or None)
+        self._data: Dict[str, Dict[str, Tuple[Any, Optional[float]]]] = {}
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        entry = self._data.get(namespace, {}).get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[namespace][key]
+            return None
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        self._data.setdefault(namespace, {})[key] = (value, expires_at)
+
+    def setdefault(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> Any:
+        current = self.get(namespace, key)
+        if current is not None:
+            return current
+        self.set(namespace, key, value, ttl)
+        return value
+
+    def delete(self, namespace: str, key: str):
+        self._data.get(namespace, {}).pop(key, None)
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        now = time.time()
+        return [(key, value) for key, (value, expires_at) in list(self._data.get(namespace, {}).items())
+                if expires_at is None or expires_at > now]
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        purged = 0
+        for entries in self._data.values():
+            expired = [key for key, (_, expires_at) in entries.items() if expires_at is not None and expires_at <= now]
+            for key in expired:
+                del entries[key]
+            purged += len(expired)
+        return purged
+
+    def get_stats(self) -> Dict:
+        return {'backend': self.backend, 'entries': {ns: len(entries) for ns, entries in self._data.items()}}
+
+
+class SQLiteStateStore(StateStore):
+    """One SQLite file in WAL mode shared by every worker on this host
+
+    WAL lets readers proceed while a writer commits, so the cookie check
+    on each request stays a sub-millisecond indexed read. Expired rows are
+    filtered on read and deleted at most once per purge_interval.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path: Path, purge_interval: float = 60.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'reads': 0, 'writes': 0, 'purged': 0}
+
+        # Session ids and the JWT secret live here. SQLite gives the -wal and
+        # -shm files the database file's mode, so create that owner-only first.
+        os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(self.path, 0o600)
+        self._db = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS state_expiry ON state (expires_at)")
+        # Sidecars left by an older, more permissive file
+        for suffix in ('-wal', '-shm'):
+            sidecar = Path(f"{self.path}{suffix}")
+            if sidecar.exists():
+                os.chmod(sidecar, 0o600)
+        logger.info(f"Shared state store: {self.path} (SQLite WAL)")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            self.stats['reads'] += 1
+            row = self._db.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self.stats['writes'] += 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires_at)
+            )
+        self._maybe_purge()
+
+    def setdefault(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> Any:
+        # One statement per step, so concurrent workers all end up with the first writer's value
+        with self._lock:
+            self.stats['writes'] += 1
+            now = time.time()
+            self._db.execute("DELETE FROM state WHERE namespace = ? AND key = ? AND expires_at <= ?",
+                             (namespace, key, now))
+            self._db.execute(
+                "INSERT OR IGNORE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl if ttl else None)
+            )
+            row = self._db.execute("SELECT value FROM state WHERE namespace = ? AND key = ?",
+                                   (namespace, key)).fetchone()
+        return json.loads(row[0])
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self.stats['writes'] += 1
+            self._db.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        with self._lock:
+            self.stats['reads'] += 1
+            rows = self._db.execute(
+                "SELECT key, value FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, time.time())
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def _maybe_purge(self):
+        if time.time() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            self._last_purge = time.time()
+            purged = self._db.execute(
+                "DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (self._last_purge,)
+            ).rowcount
+            self.stats['purged'] += purged
+        return purged
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            rows = self._db.execute("SELECT namespace, COUNT(*) FROM state GROUP BY namespace").fetchall()
+        return {'backend': self.backend, 'path': str(self.path), 'entries': dict(rows), **self.stats}
+
+
+def process_alive(pid: int) -> bool:
+    """True if a process with this pid exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def create_state_store(config: Dict, base_dir: Path) -> StateStore:
+    """State backend from the state config section (memory unless configured)"""
+    backend = config.get('backend', 'memory')
+    if backend == 'sqlite':
+        return SQLiteStateStore(
+            Path(config.get('path') or Path(base_dir) / 'state.db'),
+            purge_interval=float(config.get('purge_interval_seconds', 60))
+        )
+    if backend != 'memory':
+        logger.warning(f"Unknown state backend '{backend}' - using in-memory state")
+    return MemoryStateStore()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Terminal input path helpers
+Ordered, window-aware SSH input writer and resize debouncing
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from channel_pump import ChannelPump
+
+logger = logging.getLogger(__name__)
+
+
+def join_input(data) -> bytes:
+    """Input payload as bytes; batched frames may carry a list of keystroke strings"""
+    if isinstance(data, (list, tuple)):
+        return b''.join(join_input(part) for part in data)
+    if isinstance(data, str):
+        return data.encode('utf-8')
+    return bytes(data or b'')
+
+
+class ChannelInputWriter:
+    """Writes one window's input to its SSH channel without blocking the event loop
+
+    Keystrokes go straight to the channel. Input larger than paste_threshold,
+    or anything arriving while earlier input is still queued, is written in
+    chunks by a background task that only sends while the channel's SSH
+    window has room (waiting for the window adjust when it is full) and
+    reports progress for big pastes.
+    """
+
+    def __init__(self, channel, chunk_bytes: int = 32768, paste_threshold: int = 4096,
+                 progress: Optional[Callable[[Dict], Awaitable[None]]] = None,
+                 progress_interval: float = 0.1, pump: Optional[ChannelPump] = None):
+        self.channel = channel
+        self.pump = pump or ChannelPump()
+        self.chunk_bytes = chunk_bytes
+        self.paste_threshold = paste_threshold
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self._pending = deque()
+        self._pending_bytes = 0
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {'writes': 0, 'bytes': 0, 'queued_writes': 0, 'window_waits': 0}
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._pending_bytes
+
+    async def write(self, data):
+        """Queue input for the channel, preserving order"""
+        data = join_input(data)
+        if not data:
+            return
+
+        self.stats['writes'] += 1
+        self.stats['bytes'] += len(data)
+
+        # Fast path: interactive input with nothing ahead of it
+        if self._task is None and len(data) <= self.paste_threshold:
+            data = self._send_available(data)
+            if not data:
+                return
+
+        self.stats['queued_writes'] += 1
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+
+    def _send_available(self, data: bytes) -> bytes:
+        """Send as much as the channel's SSH window takes right now; return the rest"""
+        channel = self.channel
+        while data and not channel.closed and channel.send_ready():
+            sent = channel.send(data[:self.chunk_bytes])
+            if sent <= 0:
+                break
+            data = data[sent:]
+        return data
+
+    async def _drain(self):
+        total = self._pending_bytes
+        sent_total = 0
+        report = total > self.paste_threshold
+        last_report = 0.0
+
+        try:
+            while self._pending:
+                if self.channel.closed:
+                    logger.info(f"SSH channel closed with {self._pending_bytes} input bytes queued")
+                    break
+
+                data = self._pending[0]
+                remaining = self._send_available(data)
+                sent = len(data) - len(remaining)
+
+                if sent:
+                    self._pending_bytes -= sent
+                    sent_total += sent
+                    if remaining:
+                        self._pending[0] = remaining
+                    else:
+                        self._pending.popleft()
+                else:
+                    # Remote window is full - wait for the device to consume input
+                    self.stats['window_waits'] += 1
+                    await self.pump.wait_writable(self.channel, timeout=1.0)
+                    continue
+
+                # More input may have arrived behind the paste
+                total = max(total, sent_total + self._pending_bytes)
+                report = report or total > self.paste_threshold
+
+                now = time.monotonic()
+                if report and self._pending and now - last_report >= self.progress_interval:
+                    last_report = now
+                    await self._report(sent_total, total, done=False)
+
+                # Give other windows a turn between chunks
+                await asyncio.sleep(0)
+
+            if report:
+                await self._report(sent_total, total, done=True)
+        except Exception as e:
+            logger.error(f"SSH input writer failed: {e}")
+        finally:
+            self._pending.clear()
+            self._pending_bytes = 0
+            self._task = None
+
+    async def _report(self, sent: int, total: int, done: bool):
+        if self.progress is None:
+            return
+        try:
+            await self.progress({'type': 'input_progress', 'sent': sent, 'total': total, 'done': done})
+        except Exception as e:
+            logger.debug(f"Could not report input progress: {e}")
+
+    def cancel(self):
+        """Drop queued input (window closing)"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._pending.clear()
+        self._pending_bytes = 0
+
+    def get_stats(self) -> Dict:
+        return {'pending_bytes': self._pending_bytes, **self.stats}
+
+
+class ResizeDebouncer:
+    """Applies the first resize at once, then at most the latest one per interval"""
+
+    def __init__(self, apply: Callable[[int, int], None], interval: float = 0.1):
+        self.apply = apply
+        self.interval = interval
+        self._applied = None
+        self._latest = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {'requested': 0, 'applied': 0}
+
+    def request(self, cols: int, rows: int):
+        self.stats['requested'] += 1
+        self._latest = (cols, rows)
+        if self._timer is None:
+            self._flush()
+
+    def _flush(self):
+        self._timer = None
+        if self._latest is None or self._latest == self._applied:
+            return
+
+        self._applied = self._latest
+        self.stats['applied'] += 1
+        try:
+            self.apply(*self._applied)
+        except Exception as e:
+            logger.error(f"Terminal resize failed: {e}")
+
+        # Later requests in this interval collapse into one trailing resize
+        self._timer = asyncio.get_running_loop().call_later(self.interval, self._flush)
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Terminal output path helpers - per-window output queueing, frame batching and detach buffering
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OutputCoalescer:
+    """Adaptive per-window output batching
+
+    Interactive traffic (small writes after a quiet gap or right after user
+    input, e.g. keystroke echo) is flushed immediately. Sustained output is merged into larger frames
+    until max_bytes is buffered or the oldest buffered byte is max_delay old.
+    """
+
+    def __init__(self, flush: Callable[[bytes], Awaitable[None]], max_bytes: int = 65536,
+                 max_delay: float = 0.008, interactive_gap: float = 0.02, interactive_bytes: int = 1024):
+        self._flush = flush
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.interactive_gap = interactive_gap
+        self.interactive_bytes = interactive_bytes
+
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self._pending_since: Optional[float] = None
+        self._last_feed = 0.0
+        self._input_seen = False
+
+        self.stats = {
+            'chunks_in': 0,
+            'frames_out': 0,
+            'bytes': 0,
+            'immediate_flushes': 0,
+            'batched_flushes': 0,
+            'added_latency_total': 0.0,
+            'added_latency_max': 0.0,
+        }
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._pending_bytes
+
+    def time_until_flush(self) -> Optional[float]:
+        """Seconds until buffered output must go out (None when nothing is buffered)"""
+        if self._pending_since is None:
+            return None
+        return max(0.0, self._pending_since + self.max_delay - time.monotonic())
+
+    def note_input(self):
+        """User typed something - the next small output is most likely its echo"""
+        self._input_seen = True
+
+    async def feed(self, data: bytes):
+        """Accept a chunk read from the channel; flushes when the policy says so"""
+        now = time.monotonic()
+        interactive = (
+            not self._pending
+            and len(data) <= self.interactive_bytes
+            and (self._input_seen or now - self._last_feed >= self.interactive_gap)
+        )
+        self._last_feed = now
+        self._input_seen = False
+        self.stats['chunks_in'] += 1
+
+        if interactive:
+            # Keystroke echo and prompts: no added latency
+            self.stats['immediate_flushes'] += 1
+            await self._send([data], len(data), now)
+            return
+
+        if self._pending_since is None:
+            self._pending_since = now
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+
+        if self._pending_bytes >= self.max_bytes:
+            await self.flush()
+
+    async def flush(self):
+        """Send whatever is buffered as one frame"""
+        if not self._pending:
+            return
+
+        chunks, size, since = self._pending, self._pending_bytes, self._pending_since
+        self._pending = []
+        self._pending_bytes = 0
+        self._pending_since = None
+
+        self.stats['batched_flushes'] += 1
+        await self._send(chunks, size, since)
+
+    async def _send(self, chunks: List[bytes], size: int, since: float):
+        added_latency = time.monotonic() - since
+        self.stats['frames_out'] += 1
+        self.stats['bytes'] += size
+        self.stats['added_latency_total'] += added_latency
+        self.stats['added_latency_max'] = max(self.stats['added_latency_max'], added_latency)
+
+        await self._flush(chunks[0] if len(chunks) == 1 else b''.join(chunks))
+
+    def get_stats(self) -> Dict:
+        """Frames saved and latency added by batching"""
+        frames_out = self.stats['frames_out']
+        return {
+            'chunks_in': self.stats['chunks_in'],
+            'frames_out': frames_out,
+            'frames_saved': self.stats['chunks_in'] - len(self._pending) - frames_out,
+            'bytes': self.stats['bytes'],
+            'immediate_flushes': self.stats['immediate_flushes'],
+            'batched_flushes': self.stats['batched_flushes'],
+            'avg_added_latency_ms': round(self.stats['added_latency_total'] / frames_out * 1000, 3) if frames_out else 0.0,
+            'max_added_latency_ms': round(self.stats['added_latency_max'] * 1000, 3),
+        }
+
+
+class OutputQueue:
+    """Bounded per-window output queue with high/low watermarks
+
+    The channel reader stops reading once the queue holds high_watermark
+    bytes and resumes when the sender has drained it to low_watermark, so a
+    slow websocket pushes back on the device through SSH window flow control.
+    """
+
+    def __init__(self, high_watermark: int = 1048576, low_watermark: int = 262144):
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+
+        self._chunks: Deque[bytes] = deque()
+        self._bytes = 0
+        self._closed = False
+        self._paused_at: Optional[float] = None
+        self._data_ready = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+
+        self.stats = {
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'max_queued_bytes': 0,
+            'high_watermark_crossings': 0,
+            'low_watermark_crossings': 0,
+            'paused_seconds': 0.0,
+        }
+
+    @property
+    def queued_bytes(self) -> int:
+        return self._bytes
+
+    @property
+    def paused(self) -> bool:
+        return self._paused_at is not None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put_nowait(self, data: bytes):
+        """Queue output from the reader (never blocks; check paused afterwards)"""
+        if self._closed or not data:
+            return
+
+        self._chunks.append(data)
+        self._bytes += len(data)
+        self.stats['bytes_in'] += len(data)
+        self.stats['max_queued_bytes'] = max(self.stats['max_queued_bytes'], self._bytes)
+        self._data_ready.set()
+
+        if self._bytes >= self.high_watermark and self._paused_at is None:
+            self._paused_at = time.monotonic()
+            self._writable.clear()
+            self.stats['high_watermark_crossings'] += 1
+            logger.debug(f"Output queue above high watermark ({self._bytes} bytes) - pausing reader")
+
+    async def wait_writable(self):
+        """Wait until the reader may read again (queue drained below low watermark)"""
+        await self._writable.wait()
+
+    async def get(self, max_bytes: int = 65536, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Take up to max_bytes of queued output (None on timeout or once closed and empty)"""
+        if not self._chunks and not self._closed:
+            self._data_ready.clear()
+            try:
+                if timeout is None:
+                    await self._data_ready.wait()
+                else:
+                    await asyncio.wait_for(self._data_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        if not self._chunks:
+            return None
+
+        parts = [self._chunks.popleft()]
+        size = len(parts[0])
+        while self._chunks and size + len(self._chunks[0]) <= max_bytes:
+            chunk = self._chunks.popleft()
+            parts.append(chunk)
+            size += len(chunk)
+
+        self._bytes -= size
+        self.stats['bytes_out'] += size
+
+        if self._paused_at is not None and self._bytes <= self.low_watermark:
+            self.stats['paused_seconds'] += time.monotonic() - self._paused_at
+            self._paused_at = None
+            self._writable.set()
+            self.stats['low_watermark_crossings'] += 1
+            logger.debug(f"Output queue below low watermark ({self._bytes} bytes) - resuming reader")
+
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+    def close(self):
+        """No more output will be queued; wake the sender and any paused reader"""
+        self._closed = True
+        self._data_ready.set()
+        self._writable.set()
+
+    def get_stats(self) -> Dict:
+        paused_seconds = self.stats['paused_seconds']
+        if self._paused_at is not None:
+            paused_seconds += time.monotonic() - self._paused_at
+        return {
+            'queued_bytes': self._bytes,
+            'high_watermark': self.high_watermark,
+            'low_watermark': self.low_watermark,
+            'paused': self.paused,
+            'bytes_in': self.stats['bytes_in'],
+            'bytes_out': self.stats['bytes_out'],
+            'max_queued_bytes': self.stats['max_queued_bytes'],
+            'high_watermark_crossings': self.stats['high_watermark_crossings'],
+            'low_watermark_crossings': self.stats['low_watermark_crossings'],
+            'paused_seconds': round(paused_seconds, 3),
+        }
+
+
+class DetachBuffer:
+    """Bounded buffer for output produced while no websocket is attached
+
+    Keeps the newest max_bytes; older output is dropped and counted.
+    """
+
+    def __init__(self, max_bytes: int = 1048576):
+        self.max_bytes = max_bytes
+        self._chunks: Deque[bytes] = deque()
+        self._bytes = 0
+        self.dropped_bytes = 0
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._bytes
+
+    def append(self, data: bytes):
+        if not data:
+            return
+        self._chunks.append(data)
+        self._bytes += len(data)
+
+        while self._bytes > self.max_bytes:
+            excess = self._bytes - self.max_bytes
+            oldest = self._chunks[0]
+            if len(oldest) <= excess:
+                self._chunks.popleft()
+                self._bytes -= len(oldest)
+                self.dropped_bytes += len(oldest)
+            else:
+                self._chunks[0] = oldest[excess:]
+                self._bytes -= excess
+                self.dropped_bytes += excess
+
+    def take(self, max_bytes: int = 65536) -> bytes:
+        """Remove and return up to max_bytes of the oldest buffered output"""
+        parts = []
+        size = 0
+        while self._chunks and size < max_bytes:
+            chunk = self._chunks.popleft()
+            room = max_bytes - size
+            if len(chunk) > room:
+                self._chunks.appendleft(chunk[room:])
+                chunk = chunk[:room]
+            parts.append(chunk)
+            size += len(chunk)
+        self._bytes -= size
+        return b''.join(parts)
+
+
+class DetachableOutput:
+    """Routes a window's output to its websocket, or into a DetachBuffer while detached
+
+    A failed send (websocket already gone) detaches instead of raising when
+    buffer_bytes is set, so the SSH channel or TUI process survives until
+    the window is reattached or its detach grace period runs out.
+
+    With a snapshot callable (a server-side screen model) nothing is buffered
+    while detached: attach() sends one repaint of the current screen instead,
+    so reattaching costs the same however long the window was away.
+    """
+
+    def __init__(self, stream, buffer_bytes: int = 0, snapshot: Optional[Callable[[], bytes]] = None):
+        self.stream = stream
+        self.buffer_bytes = buffer_bytes
+        self.snapshot = snapshot
+        self.buffer: Optional[DetachBuffer] = None
+        self._pending_control: List[Dict] = []
+        self.detached_at: Optional[float] = None
+
+    @property
+    def detached(self) -> bool:
+        return self.stream is None
+
+    def detach(self):
+        """Stop sending; buffer output until attach()"""
+        if self.stream is None:
+            return
+        self.stream = None
+        self.detached_at = time.time()
+        if self.buffer is None and self.snapshot is None:
+            self.buffer = DetachBuffer(self.buffer_bytes)
+
+    async def attach(self, stream, replay_chunk: int = 65536):
+        """Replay what was missed (or repaint the screen) to stream, then send new output to it"""
+        if self.snapshot is not None:
+            # Output arriving while the repaint is sent queues up behind it
+            screen = self.snapshot()
+            self.buffer = DetachBuffer(self.buffer_bytes)
+            await stream.send_output(screen)
+
+        buffer = self.buffer
+        if buffer is not None:
+            if buffer.dropped_bytes:
+                notice = f"\r\n[{buffer.dropped_bytes} bytes of output dropped while detached]\r\n"
+                await stream.send_output(notice.encode('utf-8'))
+            # Output may keep arriving while we replay - drain until empty
+            while buffer.buffered_bytes:
+                await stream.send_output(buffer.take(replay_chunk))
+
+        self.stream = stream
+        self.buffer = None
+        self.detached_at = None
+
+        pending, self._pending_control = self._pending_control, []
+        for message in pending:
+            await stream.send_json(message)
+
+    async def send_output(self, data: bytes):
+        if self.stream is not None:
+            try:
+                await self.stream.send_output(data)
+                return
+            except Exception as e:
+                if not self.buffer_bytes:
+                    raise
+                logger.info(f"Output send failed for {self.stream.window_id} ({e}) - detaching")
+                self.detach()
+        if self.buffer is not None:
+            self.buffer.append(data)
+
+    async def send_json(self, message: Dict):
+        """Send a control message; held (newest 16) while detached"""
+        if self.stream is not None:
+            try:
+                await self.stream.send_json(message)
+                return
+            except Exception:
+                if not self.buffer_bytes:
+                    raise
+                self.detach()
+        self._pending_control = (self._pending_control + [message])[-16:]
+
+    def get_stats(self) -> Dict:
+        return {
+            'detached': self.detached,
+            'detached_seconds': round(time.time() - self.detached_at, 1) if self.detached_at else 0.0,
+            'buffered_bytes': self.buffer.buffered_bytes if self.buffer else 0,
+            'dropped_bytes': self.buffer.dropped_bytes if self.buffer else 0,
+        }
+
+
+class FastForward:
+    """Per-window overload mode: screen snapshots at a capped frame rate instead of the raw stream
+
+    Entered when output stays above enter_rate bytes/s for enter_seconds, or
+    when the browser lags (the output queue stays at its high watermark) for
+    lag_seconds.
+    While active the raw stream is only queued on the screen model, which
+    drops what scrolls off before emulating it, so a flood drains at the
+    speed of the queue rather than of the emulator. At most max_fps
+    repaints are sent, skipping a frame while the previous one is still in
+    flight. Left again, with a final repaint, once the rate has stayed below
+    exit_rate for exit_seconds.
+    """
+
+    def __init__(self, screen, send: Callable[[bytes], Awaitable[None]], flush_pending: Callable[[], Awaitable[None]],
+                 notify: Callable[[Dict], Awaitable[None]], enter_rate: int = 1048576, enter_seconds: float = 2.0,
+                 exit_rate: int = 262144, exit_seconds: float = 1.0, max_fps: float = 10.0,
+                 lag_seconds: float = 0.5):
+        self.screen = screen
+        self._send = send
+        self._flush_pending = flush_pending
+        self._notify = notify
+        self.enter_rate = enter_rate
+        self.enter_seconds = enter_seconds
+        self.exit_rate = exit_rate
+        self.exit_seconds = exit_seconds
+        self.frame_interval = 1.0 / max_fps
+        self.lag_seconds = lag_seconds
+
+        self.active = False
+        self._bucket_start = time.monotonic()
+        self._bucket_bytes = 0
+        self.rate = 0.0
+        self._above_since: Optional[float] = None
+        self._below_since: Optional[float] = None
+        self._lagging_since: Optional[float] = None
+        self._activated_at = 0.0
+        self._last_frame = 0.0
+        self._dirty = False
+        self._frame_task: Optional[asyncio.Task] = None
+
+        self.stats = {'activations': 0, 'frames': 0, 'frames_skipped': 0, 'bytes_fast_forwarded': 0,
+                      'active_seconds': 0.0}
+
+    def time_until_frame(self) -> Optional[float]:
+        """While active, when the sender should wake up to paint or check for the end of the flood"""
+        if not self.active:
+            return None
+        return max(0.0, min(self._last_frame + self.frame_interval - time.monotonic(), self.exit_seconds / 4))
+
+    def _measure(self, size: int, now: float):
+        # Rate over quarter-second buckets; thresholds need the rate held, not a single spike
+        self._bucket_bytes += size
+        elapsed = now - self._bucket_start
+        if elapsed < 0.25:
+            return
+        self.rate = self._bucket_bytes / elapsed
+        self._bucket_start, self._bucket_bytes = now, 0
+
+        if self.rate >= self.enter_rate:
+            self._above_since = self._above_since or now
+        else:
+            self._above_since = None
+        if self.rate < self.exit_rate:
+            self._below_since = self._below_since or now
+        else:
+            self._below_since = None
+
+    async def feed(self, data: bytes, lagging: bool = False) -> bool:
+        """Account for a chunk of output; True when it was consumed here instead of sent raw"""
+        now = time.monotonic()
+        self._measure(len(data), now)
+
+        if not self.active:
+            # Bursts briefly fill the queue even for a healthy browser
+            self._lagging_since = (self._lagging_since or now) if lagging else None
+            held = self._above_since is not None and now - self._above_since >= self.enter_seconds
+            lagged = self._lagging_since is not None and now - self._lagging_since >= self.lag_seconds
+            if not (held or lagged):
+                return False
+            await self._enter(now, 'sustained output' if held else 'browser lagging')
+
+        self.screen.defer(data)
+        self._dirty = True
+        self.stats['bytes_fast_forwarded'] += len(data)
+        await self.tick()
+        return True
+
+    async def tick(self):
+        """Paint a frame when due; leave fast-forward once the flood is over"""
+        if not self.active:
+            return
+        now = time.monotonic()
+        self._measure(0, now)
+
+        if self._below_since is not None and now - self._below_since >= self.exit_seconds:
+            await self._exit(now)
+            return
+
+        if self._dirty and now - self._last_frame >= self.frame_interval:
+            if self._frame_task is not None and not self._frame_task.done():
+                # Browser still busy with the last frame - paint the next one later
+                self.stats['frames_skipped'] += 1
+                return
+            self._last_frame = now
+            self._dirty = False
+            self.stats['frames'] += 1
+            self._frame_task = asyncio.create_task(self._send_frame(self._render()))
+
+    def _render(self) -> bytes:
+        return self.screen.render_ansi().encode('utf-8')
+
+    async def _send_frame(self, frame: bytes):
+        try:
+            await self._send(frame)
+        except Exception as e:
+            logger.debug(f"Fast-forward frame send failed: {e}")
+
+    async def _enter(self, now: float, reason: str):
+        # The screen model must match the browser before frames replace the raw stream
+        await self._flush_pending()
+        self.active = True
+        self._activated_at = now
+        self._last_frame = 0.0
+        self._below_since = None
+        self._lagging_since = None
+        self.stats['activations'] += 1
+        logger.info(f"Output fast-forward on ({reason}, {self.rate / 1048576:.1f} MB/s)")
+        await self._notify({'type': 'fast_forward', 'active': True, 'reason': reason, 'rate': round(self.rate)})
+
+    async def _exit(self, now: float):
+        await self.cancel()
+        self.active = False
+        self._above_since = None
+        self.stats['active_seconds'] += now - self._activated_at
+        # Final repaint so the raw stream continues from the exact model state
+        await self._send(self._render())
+        self.stats['frames'] += 1
+        self._dirty = False
+        logger.info(f"Output fast-forward off after {now - self._activated_at:.1f}s")
+        await self._notify({'type': 'fast_forward', 'active': False})
+
+    async def cancel(self):
+        """Wait out an in-flight frame"""
+        task, self._frame_task = self._frame_task, None
+        if task is not None:
+            await task
+
+    def get_stats(self) -> Dict:
+        active_seconds = self.stats['active_seconds']
+        if self.active:
+            active_seconds += time.monotonic() - self._activated_at
+        return {
+            'active': self.active,
+            'rate_bytes_per_second': round(self.rate),
+            **self.stats,
+            'active_seconds': round(active_seconds, 3),
+        }
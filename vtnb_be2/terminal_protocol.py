@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Terminal WebSocket framing - JSON (v1) and binary (v2) protocols
+
+v1 (legacy): every message is a JSON text frame, output is base64 in 'data'.
+v2 (negotiated with the 'velociterm.v2' subprotocol): terminal bytes travel in
+binary frames with a one-byte opcode header; JSON text frames are kept for
+control messages (connect, status, error, process_ended, ...).
+
+    server -> client   0x01 OUTPUT  | raw output bytes
+    client -> server   0x01 INPUT   | UTF-8 keystroke bytes
+    client -> server   0x02 RESIZE  | cols:uint16be rows:uint16be
+"""
+
+import base64
+import json
+import logging
+import struct
+from typing import Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_V2 = "velociterm.v2"
+
+OP_OUTPUT = 0x01
+OP_INPUT = 0x01
+OP_RESIZE = 0x02
+
+_OUTPUT_HEADER = bytes([OP_OUTPUT])
+_RESIZE = struct.Struct(">HH")
+
+
+def decode_binary_frame(frame: bytes) -> Optional[Dict]:
+    """Translate a v2 client frame into the same dict shape as a v1 JSON message"""
+    if not frame:
+        return None
+
+    opcode = frame[0]
+    if opcode == OP_INPUT:
+        return {'type': 'input', 'data': frame[1:]}
+
+    if opcode == OP_RESIZE and len(frame) >= 1 + _RESIZE.size:
+        cols, rows = _RESIZE.unpack_from(frame, 1)
+        return {'type': 'resize', 'cols': cols, 'rows': rows}
+
+    logger.warning(f"Unknown binary terminal opcode 0x{opcode:02x} ({len(frame)} bytes)")
+    return None
+
+
+class TerminalStream:
+    """Websocket wrapper that speaks v1 JSON or v2 binary framing for one window"""
+
+    def __init__(self, websocket: WebSocket, output_type: str = 'ssh_output', window_id: Optional[str] = None):
+        self.websocket = websocket
+        self.output_type = output_type
+        self.window_id = window_id
+        self.binary = False
+
+    @property
+    def protocol(self) -> str:
+        return PROTOCOL_V2 if self.binary else "json"
+
+    async def accept(self):
+        """Accept the websocket, selecting v2 when the client offers it"""
+        offered = self.websocket.scope.get('subprotocols') or []
+        subprotocol = PROTOCOL_V2 if PROTOCOL_V2 in offered else None
+
+        await self.websocket.accept(subprotocol=subprotocol)
+        self.binary = subprotocol == PROTOCOL_V2
+        logger.info(f"Terminal stream {self.window_id} using {self.protocol} framing")
+
+    async def send_output(self, data: bytes):
+        """Send raw terminal output bytes"""
+        if self.binary:
+            await self.websocket.send_bytes(_OUTPUT_HEADER + data)
+            return
+
+        message = {
+            'type': self.output_type,
+            'data': base64.b64encode(data).decode('ascii')
+        }
+        if self.window_id is not None and self.output_type == 'ssh_output':
+            message['tabId'] = self.window_id
+        await self.websocket.send_json(message)
+
+    async def send_json(self, message: Dict):
+        """Send a control message (always JSON)"""
+        await self.websocket.send_json(message)
+
+    async def receive(self) -> Optional[Dict]:
+        """Receive the next client message as a dict (None for unusable frames)"""
+        message = await self.websocket.receive()
+
+        if message['type'] == 'websocket.disconnect':
+            raise WebSocketDisconnect(message.get('code', 1000), message.get('reason'))
+
+        frame = message.get('bytes')
+        if frame is not None:
+            return decode_binary_frame(frame)
+
+        text = message.get('text')
+        if text is None:
+            return None
+        return json.loads(text)
+
+    async def close(self, code: int = 1000, reason: Optional[str] = None):
+        await self.websocket.close(code=code, reason=reason)
+
+    @property
+    def client_state(self):
+        return self.websocket.client_state
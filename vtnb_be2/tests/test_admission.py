@@ -0,0 +1,96 @@
+import asyncio
+
+from admission import AdmissionController
+
+
+def test_cancel_during_queue_report_releases_waiter_and_slot():
+    async def run():
+        controller = AdmissionController(global_limit=1, host_rate=0, status_interval=60)
+        first = await controller.admit('alice', 'r1')
+        reporting = asyncio.Event()
+
+        async def slow_notify(message):
+            reporting.set()
+            await asyncio.sleep(60)
+
+        queued = asyncio.create_task(controller.admit('bob', 'r2', slow_notify))
+        await reporting.wait()
+        # The slot frees up and goes to the waiter while its first report is still being sent
+        first.release()
+        queued.cancel()
+        try:
+            await queued
+        except asyncio.CancelledError:
+            pass
+        return controller
+
+    controller = asyncio.run(run())
+    stats = controller.get_stats()
+    assert stats['queued_now'] == 0
+    assert stats['active'] == 0
+    assert stats['cancelled'] == 1
+
+
+def test_cancel_during_queue_report_while_still_blocked():
+    async def run():
+        controller = AdmissionController(global_limit=1, host_rate=0, status_interval=60)
+        first = await controller.admit('alice', 'r1')
+        reporting = asyncio.Event()
+
+        async def slow_notify(message):
+            reporting.set()
+            await asyncio.sleep(60)
+
+        queued = asyncio.create_task(controller.admit('bob', 'r2', slow_notify))
+        await reporting.wait()
+        queued.cancel()
+        try:
+            await queued
+        except asyncio.CancelledError:
+            pass
+        queued_after_cancel = controller.get_stats()['queued_now']
+        first.release()
+        return controller, queued_after_cancel
+
+    controller, queued_after_cancel = asyncio.run(run())
+    assert queued_after_cancel == 0
+    assert controller.get_stats()['active'] == 0
+
+
+def test_stalled_websocket_does_not_hold_up_other_queue_updates():
+    async def run():
+        controller = AdmissionController(global_limit=1, host_rate=0, status_interval=0.01, notify_timeout=30)
+        first = await controller.admit('alice', 'r1')
+        never = asyncio.Event()
+        updated = asyncio.Event()
+        received = []
+
+        async def noop(message):
+            pass
+
+        async def stalled(message):
+            await never.wait()
+
+        async def recorder(message):
+            received.append(message)
+            if len(received) > 1:
+                updated.set()
+
+        ahead = asyncio.create_task(controller.admit('carol', 'r2', noop))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(controller.admit('mallory', 'r3', stalled)),
+                 asyncio.create_task(controller.admit('bob', 'r4', recorder))]
+        await asyncio.sleep(0.05)
+        assert len(received) == 1
+
+        # Everyone moves up; the stalled websocket is asked first but must not delay bob
+        ahead.cancel()
+        await asyncio.wait_for(updated.wait(), 1)
+        assert received[-1]['position'] == 2
+
+        for task in [ahead] + tasks:
+            task.cancel()
+        await asyncio.gather(ahead, *tasks, return_exceptions=True)
+        first.release()
+
+    asyncio.run(run())
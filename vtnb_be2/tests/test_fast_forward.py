@@ -0,0 +1,87 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import terminal_output
+from screen_model import ScreenModel
+from terminal_output import FastForward
+
+CHUNK = b'y\r\n' * 10923  # ~32 KB, what the SSH reader hands over per read
+
+
+def _fast_forward(monkeypatch, **kwargs):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(terminal_output, 'time', SimpleNamespace(monotonic=lambda: clock.now, time=time.time))
+    frames, notices = [], []
+
+    async def send(frame):
+        frames.append(frame)
+
+    async def flush_pending():
+        pass
+
+    async def notify(message):
+        notices.append(message)
+
+    screen = ScreenModel(80, 24, scrollback=200)
+    return FastForward(screen, send, flush_pending, notify, **kwargs), frames, notices, clock
+
+
+async def _stream(fast_forward, clock, seconds, chunk, interval, lagging=False):
+    """Feed chunk every interval seconds of fake time; True for each chunk consumed"""
+    consumed = []
+    for _ in range(round(seconds / interval)):
+        clock.now += interval
+        consumed.append(await fast_forward.feed(chunk, lagging))
+        await asyncio.sleep(0)
+    return consumed
+
+
+def test_sustained_flood_switches_to_capped_snapshots_and_back(monkeypatch):
+    fast_forward, frames, notices, clock = _fast_forward(monkeypatch, enter_seconds=2.0, exit_seconds=1.0,
+                                                         max_fps=10.0)
+
+    async def run():
+        # ~3.2 MB/s for five seconds
+        consumed = await _stream(fast_forward, clock, 5.0, CHUNK, 0.01)
+        await fast_forward.cancel()
+        frames_while_active = len(frames)
+        # Back to a trickle; the sender's tick notices the end of the flood
+        for _ in range(20):
+            clock.now += 0.1
+            await fast_forward.tick()
+        await fast_forward.cancel()
+        return consumed, frames_while_active
+
+    consumed, frames_while_active = asyncio.run(run())
+    # Raw until the rate has been held for enter_seconds (measured over quarter-second buckets)
+    entered = consumed.index(True)
+    assert 2.0 <= entered * 0.01 <= 2.5
+    assert all(consumed[entered:])
+    assert notices[0]['type'] == 'fast_forward' and notices[0]['active']
+    assert notices[0]['reason'] == 'sustained output'
+    # Repaints keep coming while active, at most max_fps of them
+    active_seconds = (len(consumed) - entered) * 0.01
+    assert active_seconds * 5 <= frames_while_active <= active_seconds * 10 + 1
+    assert notices[-1] == {'type': 'fast_forward', 'active': False}
+    assert not fast_forward.active
+    # A frame still due for the flood's tail, then the final repaint the raw stream continues from
+    assert frames_while_active < len(frames) <= frames_while_active + 2
+    assert b'y' in frames[-1]
+
+
+def test_lagging_browser_gets_snapshots_without_emulating_every_byte(monkeypatch):
+    fast_forward, frames, notices, clock = _fast_forward(monkeypatch, lag_seconds=0.5)
+
+    async def run():
+        return await _stream(fast_forward, clock, 19.2, CHUNK, 0.1, lagging=True)  # ~6 MB
+
+    consumed = asyncio.run(run())
+    assert not any(consumed[:5])
+    assert all(consumed[5:])
+    assert notices[0]['reason'] == 'browser lagging'
+    assert fast_forward.stats['bytes_fast_forwarded'] == (len(consumed) - 5) * len(CHUNK)
+    assert fast_forward.screen.text()[:23] == ['y'] * 23
+    assert fast_forward.screen.bytes_skipped > 5000000
+    assert 0 < len(frames) <= 19.2 * 10
+    assert b'y' in frames[-1]
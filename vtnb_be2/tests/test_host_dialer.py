@@ -0,0 +1,152 @@
+import asyncio
+import socket
+from types import SimpleNamespace
+
+import host_dialer
+from host_dialer import DNSCache, HappyEyeballsDialer, interleave
+
+V4 = (socket.AF_INET, ('192.0.2.1', 22))
+V4_B = (socket.AF_INET, ('192.0.2.2', 22))
+V6 = (socket.AF_INET6, ('2001:db8::1', 22, 0, 0))
+V6_B = (socket.AF_INET6, ('2001:db8::2', 22, 0, 0))
+
+
+class _Resolver:
+    """Stands in for loop.getaddrinfo; answers are released one query at a time"""
+
+    def __init__(self, addresses):
+        self.addresses = addresses
+        self.queries = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def getaddrinfo(self, host, port, type=0):
+        self.queries += 1
+        await self.release.wait()
+        if isinstance(self.addresses, Exception):
+            raise self.addresses
+        return [(family, type, 6, '', sockaddr) for family, sockaddr in self.addresses]
+
+
+def _dns(monkeypatch, addresses, **kwargs):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(host_dialer, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    resolver = _Resolver(addresses)
+    return DNSCache(**kwargs), resolver, clock
+
+
+def test_concurrent_lookups_share_one_query_and_are_cached(monkeypatch):
+    cache, resolver, clock = _dns(monkeypatch, [V6, V4, V4])
+
+    async def run():
+        asyncio.get_running_loop().getaddrinfo = resolver.getaddrinfo
+        resolver.release.clear()
+        lookups = [asyncio.create_task(cache.resolve('Example.COM', 22)) for _ in range(5)]
+        await asyncio.sleep(0)
+        resolver.release.set()
+        answers = await asyncio.gather(*lookups)
+        return answers, await cache.resolve('example.com', 22)
+
+    answers, cached = asyncio.run(run())
+    assert answers == [[V6, V4]] * 5
+    assert cached == [V6, V4]
+    assert resolver.queries == 1
+    assert cache.get_stats()['hits'] == 1
+
+
+def test_expired_answer_is_served_while_refreshing(monkeypatch):
+    cache, resolver, clock = _dns(monkeypatch, [V4], ttl=60, stale_seconds=600)
+
+    async def run():
+        asyncio.get_running_loop().getaddrinfo = resolver.getaddrinfo
+        await cache.resolve('example.com', 22)
+        clock.now += 61
+        resolver.addresses = [V4_B]
+        resolver.release.clear()
+        stale = await cache.resolve('example.com', 22)
+        resolver.release.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return stale, await cache.resolve('example.com', 22)
+
+    stale, refreshed = asyncio.run(run())
+    assert stale == [V4]
+    assert refreshed == [V4_B]
+    assert resolver.queries == 2
+    assert cache.get_stats()['stale_hits'] == 1
+
+
+def test_failed_lookup_is_cached_for_negative_ttl(monkeypatch):
+    cache, resolver, clock = _dns(monkeypatch, socket.gaierror(-2, 'Name or service not known'), negative_ttl=5)
+
+    async def run():
+        asyncio.get_running_loop().getaddrinfo = resolver.getaddrinfo
+        errors = []
+        for step in (0, 1, 5):
+            clock.now += step
+            try:
+                await cache.resolve('nowhere.invalid', 22)
+            except socket.gaierror as e:
+                errors.append(e)
+        return errors
+
+    errors = asyncio.run(run())
+    assert len(errors) == 3
+    # The second attempt was answered from the cache, the third queried again
+    assert resolver.queries == 2
+    assert cache.get_stats()['negative_hits'] == 1
+
+
+def test_literal_addresses_skip_the_resolver():
+    assert asyncio.run(DNSCache().resolve('127.0.0.1', 22)) == [(socket.AF_INET, ('127.0.0.1', 22))]
+    assert asyncio.run(DNSCache().resolve('[::1]', 22)) == [(socket.AF_INET6, ('::1', 22, 0, 0))]
+
+
+def test_interleave_alternates_families_and_puts_last_winner_first():
+    assert interleave([V6, V6_B, V4, V4_B]) == [V6, V4, V6_B, V4_B]
+    assert interleave([V6, V6_B, V4]) == [V6, V4, V6_B]
+    assert interleave([V6, V6_B, V4, V4_B], preferred=V4_B[1]) == [V4_B, V6, V4, V6_B]
+    assert interleave([]) == []
+
+
+def test_dial_falls_back_after_attempt_delay_and_remembers_the_winner():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    working = (socket.AF_INET, listener.getsockname())
+    broken = (socket.AF_INET6, ('2001:db8::1', working[1][1], 0, 0))
+
+    class _DualStack:
+        max_entries = 16
+
+        async def resolve(self, host, port):
+            return [broken, working]
+
+        def get_stats(self):
+            return {}
+
+    async def run():
+        dialer = HappyEyeballsDialer(_DualStack(), attempt_delay=0.05, connect_timeout=5)
+        tried = []
+        attempt = dialer._attempt
+
+        async def black_hole(loop, address):
+            tried.append(address)
+            if address == broken:
+                await asyncio.sleep(60)
+            return await attempt(loop, address)
+
+        dialer._attempt = black_hole
+        first = await dialer.dial('dual.example', working[1][1])
+        second = await dialer.dial('dual.example', working[1][1])
+        first.close()
+        second.close()
+        return dialer, tried
+
+    try:
+        dialer, tried = asyncio.run(run())
+    finally:
+        listener.close()
+    assert tried == [broken, working, working]
+    assert dialer.get_stats()['fallback_wins'] == 1
+    assert dialer.get_stats()['connected'] == 2
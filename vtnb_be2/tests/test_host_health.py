@@ -0,0 +1,118 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import paramiko
+import pytest
+
+import host_health
+from host_health import CLOSED, HALF_OPEN, OPEN, HostHealthTracker, HostUnavailable
+
+
+def _tracker(monkeypatch, **kwargs):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(host_health, 'time', SimpleNamespace(monotonic=lambda: clock.now, time=time.time))
+    return HostHealthTracker(**kwargs), clock
+
+
+def test_refused_connects_open_the_breaker_with_growing_cooldown(monkeypatch):
+    tracker, clock = _tracker(monkeypatch, failure_threshold=2, base_cooldown=10, max_cooldown=25)
+
+    async def run():
+        for _ in range(2):
+            attempt = await tracker.admit('Box', 22)
+            attempt.failed(ConnectionRefusedError(111, 'Connection refused'))
+        with pytest.raises(HostUnavailable) as refused:
+            await tracker.admit('box', 22)
+        first_cooldown = tracker.get_host('box', 22)['cooldown_seconds']
+
+        # Cool-down over: the next connect probes, and fails again
+        clock.now += 10
+        probe = await tracker.admit('box', 22)
+        assert probe.probe and tracker.get_host('box', 22)['state'] == HALF_OPEN
+        probe.failed(ConnectionRefusedError(111, 'Connection refused'))
+        second_cooldown = tracker.get_host('box', 22)['cooldown_seconds']
+
+        clock.now += 20
+        probe = await tracker.admit('box', 22)
+        probe.failed(ConnectionRefusedError(111, 'Connection refused'))
+        return refused.value, first_cooldown, second_cooldown
+
+    refused, first_cooldown, second_cooldown = asyncio.run(run())
+    assert refused.state['state'] == OPEN
+    assert 'refused' in str(refused)
+    assert (first_cooldown, second_cooldown) == (10, 20)
+    assert tracker.get_host('box', 22)['cooldown_seconds'] == 25
+    assert tracker.get_stats()['fast_failures'] == 1
+
+
+def test_connects_during_half_open_wait_for_the_probe(monkeypatch):
+    tracker, clock = _tracker(monkeypatch, base_cooldown=10)
+
+    async def run():
+        attempt = await tracker.admit('box', 22)
+        attempt.failed(TimeoutError())
+        clock.now += 10
+        probe = await tracker.admit('box', 22)
+
+        waiting = asyncio.create_task(tracker.admit('box', 22))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        probe.succeeded()
+        return await asyncio.wait_for(waiting, 1)
+
+    admitted = asyncio.run(run())
+    assert not admitted.probe
+    assert tracker.get_host('box', 22)['state'] == CLOSED
+    stats = tracker.get_stats()
+    assert stats['probe_waits'] == 1
+    assert stats['opened'] == 1 and stats['closed'] == 1
+
+
+def test_abandoned_probe_hands_over_to_the_next_connect(monkeypatch):
+    tracker, clock = _tracker(monkeypatch, base_cooldown=10)
+
+    async def run():
+        attempt = await tracker.admit('box', 22)
+        attempt.failed(ConnectionRefusedError())
+        clock.now += 10
+        probe = await tracker.admit('box', 22)
+        waiting = asyncio.create_task(tracker.admit('box', 22))
+        await asyncio.sleep(0)
+        probe.release()
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(run()).probe
+
+
+def test_rejected_login_blocks_only_those_credentials(monkeypatch):
+    tracker, clock = _tracker(monkeypatch, auth_cooldown=10)
+
+    async def run():
+        attempt = await tracker.admit('box', 22, credential_key=('alice', 'box'))
+        attempt.failed(paramiko.AuthenticationException('Authentication failed.'))
+        with pytest.raises(HostUnavailable):
+            await tracker.admit('box', 22, credential_key=('alice', 'box'))
+        other = await tracker.admit('box', 22, credential_key=('bob', 'box'))
+        clock.now += 10
+        again = await tracker.admit('box', 22, credential_key=('alice', 'box'))
+        return other, again
+
+    other, again = asyncio.run(run())
+    assert other is not None and again is not None
+    assert tracker.get_host('box', 22)['state'] == CLOSED
+    assert tracker.get_stats()['auth_fast_failures'] == 1
+
+
+def test_reset_closes_an_open_breaker(monkeypatch):
+    tracker, clock = _tracker(monkeypatch)
+
+    async def run():
+        attempt = await tracker.admit('box', 22)
+        attempt.failed(ConnectionRefusedError())
+        assert tracker.reset('BOX', 22)
+        return await tracker.admit('box', 22)
+
+    assert not asyncio.run(run()).probe
+    assert tracker.get_hosts(unhealthy_only=True) == []
+    assert not tracker.reset('box', 22)
@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from host_health import OPEN, HostHealthTracker
+from routes.hosts import create_hosts_routes
+
+
+def _client(admin_users=None):
+    tracker = HostHealthTracker(base_cooldown=60)
+
+    async def trip():
+        attempt = await tracker.admit('box', 22)
+        attempt.failed(ConnectionRefusedError())
+
+    asyncio.run(trip())
+    handlers = SimpleNamespace(ssh_manager=SimpleNamespace(host_health=tracker))
+
+    def current_user(request: Request):
+        return request.headers['x-user']
+
+    app = FastAPI()
+    app.include_router(create_hosts_routes(handlers, current_user, admin_users))
+    return TestClient(app), tracker
+
+
+def test_only_admins_reset_a_host_breaker():
+    client, tracker = _client(admin_users=['root'])
+
+    refused = client.delete('/api/hosts/health/box', headers={'x-user': 'alice'})
+    assert refused.status_code == 403
+    assert tracker.get_host('box', 22)['state'] == OPEN
+    # Reading the state stays open to everyone
+    assert client.get('/api/hosts/health/box', headers={'x-user': 'alice'}).json()['state'] == OPEN
+
+    reset = client.delete('/api/hosts/health/box', headers={'x-user': 'root'})
+    assert reset.json() == {'success': True, 'reset': True}
+    assert tracker.get_hosts(unhealthy_only=True) == []
+
+
+def test_nobody_resets_without_configured_admins():
+    client, tracker = _client()
+    assert client.delete('/api/hosts/health/box', headers={'x-user': 'alice'}).status_code == 403
@@ -0,0 +1,65 @@
+import os
+
+import paramiko
+
+from key_cache import PrivateKeyCache
+
+
+def _write_key(path, bits):
+    key = paramiko.RSAKey.generate(bits)
+    key.write_private_key_file(str(path))
+    return key
+
+
+def test_key_is_parsed_once_and_reparsed_when_the_file_changes(tmp_path):
+    key_dir = tmp_path / 'alice' / 'ssh_key'
+    key_dir.mkdir(parents=True)
+    path = key_dir / 'id_rsa'
+    original = _write_key(path, 1024)
+
+    cache = PrivateKeyCache(str(tmp_path))
+    assert cache.find_user_key('alice') == str(path)
+    assert cache.load(str(path)) == original
+    assert cache.load(str(path)) == original
+    assert cache.get_stats()['hits'] == 1
+
+    rotated = _write_key(path, 2048)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+    assert cache.load(str(path)) == rotated
+    stats = cache.get_stats()
+    assert stats['invalidations'] == 1
+    assert stats['misses'] == 2
+
+
+def test_key_dir_is_rescanned_when_it_changes(tmp_path):
+    key_dir = tmp_path / 'alice' / 'ssh_key'
+    key_dir.mkdir(parents=True)
+    cache = PrivateKeyCache(str(tmp_path))
+    assert cache.find_user_key('alice') is None
+
+    _write_key(key_dir / 'id_rsa', 1024)
+    stat = os.stat(key_dir)
+    os.utime(key_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+    assert cache.find_user_key('alice') == str(key_dir / 'id_rsa')
+    assert cache.find_user_key('bob') is None
+
+
+def test_forget_user_only_drops_that_users_keys(tmp_path):
+    paths = {}
+    for user in ('alice', 'alice2'):
+        key_dir = tmp_path / user / 'ssh_key'
+        key_dir.mkdir(parents=True)
+        paths[user] = str(key_dir / 'id_rsa')
+        _write_key(paths[user], 1024)
+
+    cache = PrivateKeyCache(str(tmp_path))
+    for path in paths.values():
+        cache.load(path)
+    cache.forget_user('alice')
+    assert cache.get_stats()['keys'] == 1
+
+    cache.load(paths['alice2'])
+    assert cache.get_stats()['hits'] == 1
+    cache.load(paths['alice'])
+    assert cache.get_stats()['misses'] == 3
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from output_scheduler import OutputScheduler
+from routes.connection_handlers import ConnectionHandlers
+from routes.metrics import create_metrics_routes
+from ssh_manager import SSHClientManager
+
+
+def _client(admin_users=None):
+    manager = SSHClientManager({})
+    manager.clients['alice-w'] = {'owner': 'alice', 'hostname': 'r1', 'username': 'admin'}
+    manager.detached['bob-w'] = {'owner': 'bob', 'hostname': 'r2', 'username': 'admin'}
+    scheduler = OutputScheduler()
+    for window_id in ('alice-w', 'bob-w', 'bob-tui'):
+        scheduler.register(window_id, 'ssh')
+    handlers = SimpleNamespace(ssh_manager=manager, output_scheduler=scheduler,
+                               tui_processes={'bob-tui': {'owner': 'bob', 'tool': 'htop'}})
+    handlers.user_window_ids = lambda username: ConnectionHandlers.user_window_ids(handlers, username)
+
+    def current_user(request: Request):
+        return request.headers['x-user']
+
+    app = FastAPI()
+    app.include_router(create_metrics_routes(handlers, current_user, admin_users))
+    return TestClient(app)
+
+
+def _windows(client, user):
+    ssh = client.get('/api/metrics/ssh/windows', headers={'x-user': user}).json()
+    output = client.get('/api/metrics/output', headers={'x-user': user}).json()
+    return set(ssh), {window['window_id'] for window in output['windows']}
+
+
+def test_window_metrics_only_show_own_windows():
+    client = _client()
+    assert _windows(client, 'alice') == ({'alice-w'}, {'alice-w'})
+    assert _windows(client, 'bob') == ({'bob-w'}, {'bob-w', 'bob-tui'})
+    assert _windows(client, 'mallory') == (set(), set())
+
+
+def test_admins_see_every_window():
+    client = _client(['root'])
+    assert _windows(client, 'root') == ({'alice-w', 'bob-w'}, {'alice-w', 'bob-w', 'bob-tui'})
+    assert _windows(client, 'alice') == ({'alice-w'}, {'alice-w'})
@@ -0,0 +1,87 @@
+import asyncio
+
+from output_scheduler import OutputScheduler
+
+
+def _backlog(scheduler, flow, size, granted, count):
+    async def send():
+        for _ in range(count):
+            await scheduler.acquire(flow, size)
+            granted.append((flow.window_id, size))
+    return asyncio.create_task(send())
+
+
+def test_busy_windows_get_equal_byte_shares():
+    async def run():
+        scheduler = OutputScheduler(quantum=16384)
+        big = scheduler.register('big')
+        small = scheduler.register('small')
+        granted = []
+        # 'big' asks for 64 KB chunks, 'small' for 4 KB ones; both stay backlogged
+        tasks = [_backlog(scheduler, big, 65536, granted, 50), _backlog(scheduler, small, 4096, granted, 400)]
+        while len(granted) < 200:
+            await asyncio.sleep(0)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        scheduler._task.cancel()
+        return granted
+
+    granted = asyncio.run(run())
+    shares = {'big': 0, 'small': 0}
+    for window_id, size in granted[:200]:
+        shares[window_id] += size
+    # Equal bytes within one chunk plus one quantum, not equal grant counts
+    assert abs(shares['big'] - shares['small']) <= 65536 + 16384
+    assert shares['big'] > 0
+
+
+def test_small_write_from_quiet_window_skips_the_queue():
+    async def run():
+        scheduler = OutputScheduler(quantum=16384)
+        bulk = scheduler.register('bulk')
+        quiet = scheduler.register('quiet')
+        granted = []
+        task = _backlog(scheduler, bulk, 65536, granted, 1000)
+        while len(granted) < 5:
+            await asyncio.sleep(0)
+
+        # Granted without suspending, so without waiting for the scheduler task
+        acquire = scheduler.acquire(quiet, 64)
+        try:
+            acquire.send(None)
+        except StopIteration:
+            pass
+        else:
+            raise AssertionError("interactive write was queued")
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        scheduler._task.cancel()
+        return scheduler, quiet
+
+    scheduler, quiet = asyncio.run(run())
+    assert quiet.stats['interactive_grants'] == 1
+    assert scheduler.get_stats()['interactive_grants'] == 1
+
+
+def test_unregister_wakes_a_waiting_sender():
+    async def run():
+        scheduler = OutputScheduler(quantum=1024)
+        flow = scheduler.register('w1')
+        flow.rate = 1e9
+        # Keep the scheduler task from running before the unregister
+        waiter = asyncio.create_task(scheduler.acquire(flow, 1 << 20))
+        await asyncio.sleep(0)
+        scheduler.unregister(flow)
+        try:
+            await asyncio.wait_for(waiter, 1)
+        except asyncio.CancelledError:
+            pass
+        scheduler._task.cancel()
+        return scheduler, waiter
+
+    scheduler, waiter = asyncio.run(run())
+    assert waiter.done()
+    assert scheduler.get_stats()['windows'] == 0
+    assert scheduler.get_stats()['backlogged'] == 0
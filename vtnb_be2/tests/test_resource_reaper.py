@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import resource_reaper
+from resource_reaper import TimerWheel
+
+
+def _wheel(monkeypatch, tick=1.0, slots=8):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(resource_reaper, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return TimerWheel(tick, slots), clock
+
+
+def _fired_at(wheel, clock, until, step=0.25):
+    """Advance in small steps and note when each key came due"""
+    fired = {}
+    while clock.now < until:
+        clock.now += step
+        for key in wheel.advance(clock.now):
+            fired[key] = clock.now
+    return fired
+
+
+def test_timers_fire_in_order_never_early_at_most_one_tick_late(monkeypatch):
+    wheel, clock = _wheel(monkeypatch)
+    start = clock.now
+    for delay in (0.5, 1.0, 2.5, 7.0):
+        wheel.schedule(('ssh', delay), delay)
+
+    fired = _fired_at(wheel, clock, start + 10)
+    for delay in (0.5, 1.0, 2.5, 7.0):
+        assert start + delay <= fired[('ssh', delay)] <= start + delay + 1.0
+    assert len(wheel) == 0
+
+
+def test_timer_beyond_one_revolution_waits_out_its_rounds(monkeypatch):
+    wheel, clock = _wheel(monkeypatch, slots=8)
+    start = clock.now
+    wheel.schedule('far', 20)
+    wheel.schedule('near', 4)
+
+    fired = _fired_at(wheel, clock, start + 25)
+    assert start + 20 <= fired['far'] <= start + 21
+    assert start + 4 <= fired['near'] <= start + 5
+
+
+def test_cancel_and_reschedule(monkeypatch):
+    wheel, clock = _wheel(monkeypatch)
+    start = clock.now
+    wheel.schedule('cancelled', 2)
+    wheel.schedule('moved', 2)
+    wheel.cancel('cancelled')
+    wheel.schedule('moved', 5)
+    assert 'cancelled' not in wheel and 'moved' in wheel
+
+    fired = _fired_at(wheel, clock, start + 10)
+    assert 'cancelled' not in fired
+    assert start + 5 <= fired['moved'] <= start + 6
+
+
+def test_late_advance_catches_up_on_every_slot(monkeypatch):
+    wheel, clock = _wheel(monkeypatch, slots=8)
+    for delay in range(1, 12):
+        wheel.schedule(delay, delay)
+    # The loop was blocked past all of them
+    clock.now += 30
+    assert sorted(wheel.advance(clock.now)) == list(range(1, 12))
@@ -0,0 +1,35 @@
+import asyncio
+from types import SimpleNamespace
+
+from routes.connection_handlers import ConnectionHandlers
+from screen_model import ScreenModel
+from ssh_manager import SSHClientManager
+
+
+class _Stream:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+def test_websocket_screen_snapshot_is_owner_only():
+    manager = SSHClientManager({'screen_model': {'enabled': True}})
+    screen = ScreenModel(80, 24)
+    screen.feed(b'secret prompt$ ')
+    manager.detached['w1'] = {'screen': screen, 'owner': 'alice'}
+    handlers = SimpleNamespace(ssh_manager=manager)
+
+    def ask(username):
+        stream = _Stream()
+        asyncio.run(ConnectionHandlers.answer_screen_request(handlers, stream, 'w1', {'id': 1}, username))
+        return stream.sent[0]
+
+    reply = ask('alice')
+    assert reply['type'] == 'screen'
+    assert 'secret prompt$' in reply['lines'][0]
+    for username in ('mallory', None):
+        reply = ask(username)
+        assert reply['type'] == 'screen_error'
+        assert 'secret' not in str(reply)
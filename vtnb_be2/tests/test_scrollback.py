@@ -0,0 +1,108 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+from routes.connection_handlers import ConnectionHandlers
+from scrollback_store import ScrollbackStore
+
+
+class _Stream:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+def _ask(store, request, username):
+    handlers = SimpleNamespace(scrollback=store)
+    stream = _Stream()
+    asyncio.run(ConnectionHandlers.answer_scrollback_request(handlers, stream, 'w1', request, username))
+    return stream.sent[0]
+
+
+def test_websocket_scrollback_is_owner_only(tmp_path):
+    store = ScrollbackStore(tmp_path)
+    store.open('w1', 'alice').append(b'secret line\r\n')
+
+    fetch = {'type': 'scrollback_fetch', 'id': 1}
+    search = {'type': 'scrollback_search', 'id': 2, 'pattern': 'secret'}
+    for request, answer in ((fetch, 'scrollback_lines'), (search, 'scrollback_results')):
+        reply = _ask(store, request, 'alice')
+        assert reply['type'] == answer
+        assert 'secret' in str(reply)
+    for username in ('mallory', None):
+        for request in (fetch, search):
+            reply = _ask(store, request, username)
+            assert reply['type'] == 'scrollback_error'
+            assert 'secret' not in str(reply)
+
+
+def test_spill_path_stays_in_workspace(tmp_path):
+    store = ScrollbackStore(tmp_path / 'workspaces')
+    for owner in ('../../x', '..', '/etc'):
+        window = store.open('../w1', owner)
+        assert window._spill_path.resolve().is_relative_to((tmp_path / 'workspaces').resolve())
+
+
+def test_startup_only_clears_rings_of_dead_processes(tmp_path):
+    live = tmp_path / 'alice' / 'scrollback' / str(os.getppid())
+    dead = tmp_path / 'alice' / 'scrollback' / '999999999'
+    for directory in (live, dead):
+        directory.mkdir(parents=True)
+        (directory / 'w1.ring').write_bytes(b'ring')
+
+    ScrollbackStore(tmp_path)
+    assert (live / 'w1.ring').exists()
+    assert not dead.exists()
+
+
+def _history(store, lines):
+    window = store.open('w1', 'alice')
+    for number in range(lines):
+        window.append(f"\x1b[32mline {number}\x1b[0m\r\n".encode())
+    return window
+
+
+def test_fetch_reads_across_sealed_spilled_and_open_output(tmp_path):
+    store = ScrollbackStore(tmp_path, memory_budget_bytes=1024, segment_bytes=4096)
+    window = _history(store, 5000)
+    assert window.get_stats()['spilled_segments'] > 0
+
+    newest = window.fetch(count=3)
+    assert newest['lines'] == ['line 4997', 'line 4998', 'line 4999']
+    assert newest['total_lines'] == 5000
+
+    oldest = window.fetch(start=0, count=2)
+    assert oldest['lines'] == ['line 0', 'line 1']
+    middle = window.fetch(start=2500, count=2, ansi=True)
+    assert middle['lines'] == ['\x1b[32mline 2500\x1b[0m\r', '\x1b[32mline 2501\x1b[0m\r']
+
+
+def test_search_maps_hits_to_line_numbers(tmp_path):
+    store = ScrollbackStore(tmp_path, memory_budget_bytes=1024, segment_bytes=4096)
+    window = _history(store, 5000)
+
+    result = window.search(r'line 4\d99$')
+    assert [m['line'] for m in result['matches']] == [4099, 4199, 4299, 4399, 4499, 4599, 4699, 4799, 4899, 4999]
+    assert result['matches'][0]['text'] == 'line 4099'
+    assert result['matches'][0]['span'] == [0, 9]
+
+    limited = window.search(r'line \d+', max_matches=5, start=100)
+    assert [m['line'] for m in limited['matches']] == [100, 101, 102, 103, 104]
+    assert limited['truncated']
+
+    ranged = window.search('LINE 12', ignore_case=True, start=1200, end=1210)
+    assert [m['line'] for m in ranged['matches']] == list(range(1200, 1210))
+
+
+def test_history_without_workspace_drops_oldest_lines(tmp_path):
+    store = ScrollbackStore(tmp_path, memory_budget_bytes=1024, segment_bytes=4096)
+    window = store.open('w1', None)
+    for number in range(5000):
+        window.append(f"line {number}\r\n".encode())
+
+    assert window.first_line > 0
+    assert window.get_stats()['spilled_segments'] == 0
+    assert window.fetch(start=0, count=1)['lines'] == [f"line {window.first_line}"]
+    assert window.search('line 0$')['matches'] == []
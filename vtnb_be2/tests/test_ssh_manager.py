@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from ssh_manager import SSHClientManager
+
+
+def test_window_cannot_be_taken_over_by_another_user():
+    async def run():
+        manager = SSHClientManager({})
+        await manager.create_client('w1', 'alice-stream', 'alice')
+        with pytest.raises(PermissionError):
+            await manager.create_client('w1', 'mallory-stream', 'mallory')
+        with pytest.raises(PermissionError):
+            await manager.create_client('w1', 'anonymous-stream', None)
+        assert manager.clients['w1']['handler'] == 'alice-stream'
+
+        # The owner's own new websocket supersedes the old one
+        await manager.create_client('w1', 'alice-stream-2', 'alice')
+        assert manager.clients['w1']['handler'] == 'alice-stream-2'
+
+        # A detached session is just as protected
+        manager.detached['w2'] = manager.clients.pop('w1')
+        with pytest.raises(PermissionError):
+            await manager.create_client('w2', 'mallory-stream', 'mallory')
+        assert manager.detached['w2']['owner'] == 'alice'
+
+    asyncio.run(run())
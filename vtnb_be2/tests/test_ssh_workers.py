@@ -0,0 +1,83 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from ssh_workers import INPUT, SSHWorkerPool, WorkerChannel
+from terminal_input import ChannelInputWriter
+
+
+def test_logout_purges_every_worker(capfd):
+    async def run():
+        pool = SSHWorkerPool({}, processes=2)
+        for worker in pool.workers:
+            await worker.start({})
+        try:
+            pool.purge_user('alice')
+            deadline = time.monotonic() + 10
+            seen = ''
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+                seen += capfd.readouterr().err
+                if seen.count('Dropped cached SSH keys for alice') == 2:
+                    break
+            return seen, [w.process.pid for w in pool.workers]
+        finally:
+            pool.close()
+
+    seen, pids = asyncio.run(run())
+    # Each worker process purged its own key cache and lingering transports
+    for index in range(len(pids)):
+        assert f'ssh-worker-{index} key_cache INFO Dropped cached SSH keys for alice' in seen
+
+
+def test_reopen_goes_to_worker_with_lingering_transport():
+    async def run():
+        pool = SSHWorkerPool({}, processes=2)
+        for worker in pool.workers:
+            await worker.start({})
+        try:
+            key = ('alice', 'r1', 22, 'admin', 'identity')
+            holder = pool.workers[1]
+            channel = WorkerChannel(holder, 1, 'w1', pool.window_bytes)
+            channel.info = {'key': key}
+            channel.opened.set_result(channel)
+            holder.channels[1] = channel
+            assert await pool._pick_worker(key) is holder
+
+            # Last window closed: the least-loaded worker would be worker 0, but 1 may hold the transport
+            channel.close()
+            assert not holder.channels
+            assert await pool._pick_worker(key) is holder
+            assert await pool._pick_worker(('alice', 'r2', 22, 'admin', 'identity')) is pool.workers[0]
+
+            # Logout: nothing of alice's lingers any more
+            pool.purge_user('alice')
+            assert await pool._pick_worker(key) is pool.workers[0]
+        finally:
+            pool.close()
+
+    asyncio.run(run())
+
+
+def test_input_waits_for_worker_acks_instead_of_polling():
+    async def run():
+        frames = []
+        worker = SimpleNamespace(send=lambda kind, channel_id, data: frames.append((kind, data)))
+        channel = WorkerChannel(worker, 1, 'w1', 100)
+        writer = ChannelInputWriter(channel, paste_threshold=10)
+        await writer.write(b'x' * 250)
+        await asyncio.sleep(0.1)
+        sent_before_ack = sum(len(data) for _, data in frames)
+
+        for _ in range(2):
+            channel._on_input_ack(100)
+            await asyncio.sleep(0.1)
+        return frames, sent_before_ack, writer
+
+    frames, sent_before_ack, writer = asyncio.run(run())
+    assert sent_before_ack == 100
+    assert [kind for kind, _ in frames] == [INPUT] * 3
+    assert b''.join(data for _, data in frames) == b'x' * 250
+    assert writer.pending_bytes == 0
+    # Woken by each ack: one wait per full window
+    assert writer.get_stats()['window_waits'] == 2
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+import paramiko
+from paramiko.message import Message
+
+from terminal_input import ChannelInputWriter
+
+
+class _Channel(paramiko.Channel):
+    """A paramiko channel with no transport: send() only spends the send window"""
+
+    def __init__(self):
+        super().__init__(1)
+        self.sent = bytearray()
+
+    def send(self, data):
+        with self.lock:
+            size = min(len(data), self.out_window_size)
+            self.out_window_size -= size
+        self.sent += data[:size]
+        return size
+
+    def grow_window(self, size):
+        """What the transport thread does on WINDOW_ADJUST"""
+        message = Message()
+        message.add_int(size)
+        message.rewind()
+        self._window_adjust(message)
+
+
+async def _until(condition, timeout=1.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met")
+
+
+def test_paste_resumes_on_window_adjust_without_polling():
+    channel = _Channel()
+    paste = bytes(range(256)) * 384  # 96 KB against a closed send window
+
+    async def run():
+        writer = ChannelInputWriter(channel)
+        await writer.write(paste)
+        await asyncio.sleep(0.2)
+        assert channel.sent == b''
+
+        # Three window adjusts from the transport thread, far apart
+        for adjust in range(1, 4):
+            threading.Thread(target=channel.grow_window, args=(32768,)).start()
+            await _until(lambda: len(channel.sent) == 32768 * adjust)
+            await asyncio.sleep(0.2)
+        await _until(lambda: writer.pending_bytes == 0)
+        return writer
+
+    writer = asyncio.run(run())
+    assert channel.sent == paste
+    # One wait per closed window, not a backoff loop re-checking send_ready()
+    assert writer.get_stats()['window_waits'] == 3
+
+
+def test_closing_the_channel_wakes_a_waiting_writer():
+    channel = _Channel()
+
+    async def run():
+        writer = ChannelInputWriter(channel)
+        await writer.write(b'x' * 10000)
+        await asyncio.sleep(0.05)
+        with channel.lock:
+            channel._set_closed()
+        await _until(lambda: writer.pending_bytes == 0)
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.pending_bytes == 0
+    assert writer.get_stats()['window_waits'] == 1
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import terminal_output
+from terminal_output import OutputCoalescer, OutputQueue
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def _coalescer(monkeypatch, **kwargs):
+    clock = _Clock()
+    monkeypatch.setattr(terminal_output, 'time', SimpleNamespace(monotonic=clock.monotonic, time=time.time))
+    frames = []
+
+    async def flush(data):
+        frames.append(data)
+
+    return OutputCoalescer(flush, **kwargs), frames, clock
+
+
+def test_small_write_after_quiet_gap_goes_out_at_once(monkeypatch):
+    coalescer, frames, clock = _coalescer(monkeypatch)
+    asyncio.run(coalescer.feed(b'$ '))
+    assert frames == [b'$ ']
+    assert coalescer.pending_bytes == 0
+    assert coalescer.time_until_flush() is None
+
+
+def test_sustained_output_is_batched_until_max_bytes(monkeypatch):
+    coalescer, frames, clock = _coalescer(monkeypatch, max_bytes=4096)
+
+    async def run():
+        await coalescer.feed(b'a' * 2048)
+        clock.now += 0.001
+        await coalescer.feed(b'b' * 1024)
+        assert frames == []
+        assert coalescer.pending_bytes == 3072
+        clock.now += 0.001
+        await coalescer.feed(b'c' * 1024)
+
+    asyncio.run(run())
+    assert frames == [b'a' * 2048 + b'b' * 1024 + b'c' * 1024]
+    assert coalescer.get_stats()['frames_saved'] == 2
+
+
+def test_buffered_output_is_due_after_max_delay(monkeypatch):
+    coalescer, frames, clock = _coalescer(monkeypatch, max_delay=0.008)
+
+    async def run():
+        await coalescer.feed(b'x' * 2048)
+        clock.now += 0.005
+        assert abs(coalescer.time_until_flush() - 0.003) < 1e-9
+        clock.now += 0.005
+        assert coalescer.time_until_flush() == 0.0
+        await coalescer.flush()
+
+    asyncio.run(run())
+    assert frames == [b'x' * 2048]
+    assert coalescer.get_stats()['max_added_latency_ms'] == 10.0
+
+
+def test_echo_after_input_skips_batching(monkeypatch):
+    coalescer, frames, clock = _coalescer(monkeypatch, interactive_gap=0.02)
+
+    async def run():
+        await coalescer.feed(b'prompt$ ')
+        clock.now += 0.001
+        # Within the quiet gap a small write is held...
+        await coalescer.feed(b'l')
+        await coalescer.flush()
+        clock.now += 0.001
+        # ...unless the user just typed
+        coalescer.note_input()
+        await coalescer.feed(b's')
+
+    asyncio.run(run())
+    assert frames == [b'prompt$ ', b'l', b's']
+    stats = coalescer.get_stats()
+    assert stats['immediate_flushes'] == 2
+    assert stats['batched_flushes'] == 1
+
+
+def test_queue_pauses_reader_at_high_watermark_and_resumes_at_low():
+    async def run():
+        queue = OutputQueue(high_watermark=4096, low_watermark=1024)
+        queue.put_nowait(b'a' * 2048)
+        assert not queue.paused
+        queue.put_nowait(b'b' * 2048)
+        assert queue.paused
+
+        writable = asyncio.create_task(queue.wait_writable())
+        await asyncio.sleep(0)
+        assert not writable.done()
+
+        # Down to 2048 bytes: still above the low watermark
+        assert await queue.get(max_bytes=2048) == b'a' * 2048
+        await asyncio.sleep(0)
+        assert queue.paused and not writable.done()
+
+        assert await queue.get(max_bytes=2048) == b'b' * 2048
+        await asyncio.wait_for(writable, 1)
+        return queue
+
+    queue = asyncio.run(run())
+    stats = queue.get_stats()
+    assert stats['high_watermark_crossings'] == 1
+    assert stats['low_watermark_crossings'] == 1
+    assert stats['queued_bytes'] == 0
+
+
+def test_queue_get_merges_chunks_up_to_max_bytes():
+    async def run():
+        queue = OutputQueue()
+        for chunk in (b'a' * 100, b'b' * 100, b'c' * 100):
+            queue.put_nowait(chunk)
+        return await queue.get(max_bytes=250), await queue.get(max_bytes=250)
+
+    first, second = asyncio.run(run())
+    assert first == b'a' * 100 + b'b' * 100
+    assert second == b'c' * 100
+
+
+def test_queue_close_wakes_sender_and_paused_reader():
+    async def run():
+        queue = OutputQueue(high_watermark=10, low_watermark=5)
+        getter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        assert await queue.get(timeout=0.01) is None
+
+        queue.put_nowait(b'x' * 10)
+        await getter
+        queue.put_nowait(b'y' * 10)
+        assert queue.paused
+        writable = asyncio.create_task(queue.wait_writable())
+        queue.close()
+        await asyncio.wait_for(writable, 1)
+        queue.put_nowait(b'ignored')
+        return queue, await queue.get(), await queue.get()
+
+    queue, rest, end = asyncio.run(run())
+    assert rest == b'y' * 10
+    assert end is None
+    assert queue.closed
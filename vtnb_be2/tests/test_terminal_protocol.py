@@ -0,0 +1,83 @@
+import asyncio
+import base64
+import json
+import struct
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from terminal_protocol import PROTOCOL_V2, TerminalStream, decode_binary_frame
+
+
+class _WebSocket:
+    def __init__(self, subprotocols=(), incoming=()):
+        self.scope = {'subprotocols': list(subprotocols)}
+        self.incoming = list(incoming)
+        self.accepted = None
+        self.sent = []
+
+    async def accept(self, subprotocol=None):
+        self.accepted = subprotocol
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def receive(self):
+        return self.incoming.pop(0)
+
+
+def _stream(websocket, **kwargs):
+    stream = TerminalStream(websocket, window_id='w1', **kwargs)
+    asyncio.run(stream.accept())
+    return stream
+
+
+def test_decode_client_frames():
+    assert decode_binary_frame(b'\x01ls\r') == {'type': 'input', 'data': b'ls\r'}
+    assert decode_binary_frame(b'\x02' + struct.pack('>HH', 132, 43)) == {'type': 'resize', 'cols': 132, 'rows': 43}
+    assert decode_binary_frame(b'\x02\x00') is None
+    assert decode_binary_frame(b'\x7f') is None
+    assert decode_binary_frame(b'') is None
+
+
+def test_v2_is_used_only_when_offered():
+    assert _stream(_WebSocket([PROTOCOL_V2])).protocol == PROTOCOL_V2
+    websocket = _WebSocket(['other'])
+    assert _stream(websocket).protocol == 'json'
+    assert websocket.accepted is None
+
+
+def test_output_framing():
+    binary = _WebSocket([PROTOCOL_V2])
+    asyncio.run(_stream(binary).send_output(b'\x1b[1mhi'))
+    assert binary.sent == [b'\x01\x1b[1mhi']
+
+    legacy = _WebSocket()
+    asyncio.run(_stream(legacy).send_output(b'\x1b[1mhi'))
+    assert legacy.sent == [{'type': 'ssh_output', 'data': base64.b64encode(b'\x1b[1mhi').decode(), 'tabId': 'w1'}]
+
+    tui = _WebSocket()
+    asyncio.run(_stream(tui, output_type='tui_output').send_output(b'x'))
+    assert 'tabId' not in tui.sent[0]
+
+
+def test_receive_translates_both_framings():
+    websocket = _WebSocket([PROTOCOL_V2], incoming=[
+        {'type': 'websocket.receive', 'bytes': b'\x01q'},
+        {'type': 'websocket.receive', 'text': json.dumps({'type': 'resize', 'cols': 80, 'rows': 24})},
+        {'type': 'websocket.disconnect', 'code': 1001},
+    ])
+    stream = _stream(websocket)
+
+    async def run():
+        received = [await stream.receive(), await stream.receive()]
+        with pytest.raises(WebSocketDisconnect) as disconnect:
+            await stream.receive()
+        return received, disconnect.value.code
+
+    received, code = asyncio.run(run())
+    assert received == [{'type': 'input', 'data': b'q'}, {'type': 'resize', 'cols': 80, 'rows': 24}]
+    assert code == 1001
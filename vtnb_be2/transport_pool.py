@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Refcounted pool of authenticated SSH transports
+Lets several terminal windows share one TCP/KEX/auth session per device
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+import paramiko
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, str, int, str, str]
+
+
+class PooledTransport:
+    """One authenticated SSHClient and the windows holding channels on it"""
+
+    def __init__(self, key: PoolKey, client: paramiko.SSHClient):
+        self.key = key
+        self.client = client
+        self.windows: Set[str] = set()
+        self.multiplex_ok = True
+        self.created_at = time.time()
+        self.last_used = time.time()
+        # Set while the transport lingers with no windows, waiting to be reused
+        self.linger_timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def lingering(self) -> bool:
+        return self.linger_timer is not None
+
+    @property
+    def transport(self) -> Optional[paramiko.Transport]:
+        return self.client.get_transport()
+
+    @property
+    def refcount(self) -> int:
+        return len(self.windows)
+
+    def is_alive(self) -> bool:
+        transport = self.transport
+        return bool(transport and transport.is_active())
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled transport {self.describe()}: {e}")
+
+    def describe(self) -> str:
+        owner, host, port, username, _ = self.key
+        return f"{username}@{host}:{port} (owner {owner or '-'})"
+
+
+class TransportPool:
+    """Authenticated transports keyed by (workspace user, host, port, ssh user, auth identity)
+
+    New windows to the same target open an extra channel on an existing
+    transport instead of paying a full handshake. Devices that refuse a
+    second session channel are remembered and get dedicated transports.
+
+    When its last window closes, a transport lingers for linger_seconds so
+    closing and reopening a device tab costs one channel open instead of
+    TCP, KEX and auth. At most max_lingering transports linger (least
+    recently used closed first); while lingering they send keepalives, and
+    a dead one is dropped before reuse.
+    """
+
+    def __init__(self, enabled: bool = True, max_channels_per_transport: int = 8,
+                 linger_seconds: float = 0.0, max_lingering: int = 64, linger_keepalive: int = 15,
+                 linger_open_timeout: float = 3.0):
+        self.enabled = enabled
+        self.max_channels_per_transport = max_channels_per_transport
+        self.linger_seconds = linger_seconds
+        self.max_lingering = max_lingering
+        self.linger_keepalive = linger_keepalive
+        self.linger_open_timeout = linger_open_timeout
+        self._entries: Dict[PoolKey, PooledTransport] = {}
+        # Transports with no windows, least recently released first
+        self._lingering: 'OrderedDict[int, PooledTransport]' = OrderedDict()
+        self._pending: Dict[PoolKey, asyncio.Future] = {}
+        # Per-process secret so auth identities never hold plaintext passwords
+        self._identity_secret = secrets.token_bytes(32)
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'handshake_waits': 0,
+            'multiplex_refused': 0,
+            'dead_evictions': 0,
+            'closed': 0,
+            'linger_hits': 0,
+            'linger_expired': 0,
+            'linger_lru_evictions': 0,
+            'linger_failures': 0,
+        }
+
+    def make_key(self, owner: Optional[str], hostname: str, port: int, username: str,
+                 password: Optional[str], ssh_key_path: Optional[str]) -> PoolKey:
+        """Build the pool key; the auth identity is an HMAC of key path and password"""
+        material = f"{ssh_key_path or ''}\0{password or ''}".encode('utf-8')
+        identity = hmac.new(self._identity_secret, material, hashlib.sha256).hexdigest()
+        return (owner or '', hostname, int(port), username or '', identity)
+
+    def lease(self, key: PoolKey, window_id: str) -> Optional[PooledTransport]:
+        """Reserve a live transport with spare capacity for window_id"""
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if not entry.is_alive():
+            self._evict(entry, dead=True)
+            if entry.lingering:
+                self._close_lingering(entry, 'dead')
+            return None
+
+        if entry.lingering:
+            # No channel is open on it, so even a one-session device can take this one
+            self._stop_lingering(entry)
+            entry.windows.add(window_id)
+            entry.last_used = time.time()
+            self.stats['linger_hits'] += 1
+            logger.info(f"Reusing lingering SSH transport {entry.describe()} for {window_id}")
+            return entry
+
+        if not entry.multiplex_ok or entry.refcount >= self.max_channels_per_transport:
+            return None
+
+        entry.windows.add(window_id)
+        entry.last_used = time.time()
+        self.stats['hits'] += 1
+        logger.info(f"Reusing SSH transport {entry.describe()} for {window_id} ({entry.refcount} windows)")
+        return entry
+
+    def open_timeout(self, entry: PooledTransport) -> float:
+        """Channel-open timeout on entry: short for a transport that was idle (it may be dead)"""
+        return self.linger_open_timeout if entry.refcount == 1 and self.linger_seconds else 15.0
+
+    async def wait_for_handshake(self, key: PoolKey):
+        """If another window is already authenticating to key, wait for it to finish"""
+        future = self._pending.get(key)
+        if future is not None and not future.done():
+            self.stats['handshake_waits'] += 1
+            await asyncio.shield(future)
+
+    def begin_handshake(self, key: PoolKey):
+        """Mark a new transport for key as being established"""
+        if self.enabled and key not in self._pending:
+            self._pending[key] = asyncio.get_running_loop().create_future()
+
+    def end_handshake(self, key: PoolKey):
+        future = self._pending.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def register(self, key: PoolKey, client: paramiko.SSHClient, window_id: str) -> PooledTransport:
+        """Track a freshly authenticated client; the first window holds the first reference"""
+        self.stats['misses'] += 1
+        entry = PooledTransport(key, client)
+        entry.windows.add(window_id)
+
+        if self.enabled:
+            existing = self._entries.get(key)
+            if existing is None or not existing.is_alive() or not existing.multiplex_ok:
+                self._entries[key] = entry
+                if existing is not None and existing.lingering:
+                    self._close_lingering(existing)
+        return entry
+
+    def refuse_multiplex(self, entry: PooledTransport, window_id: str):
+        """The device rejected an extra channel - stop sharing this transport"""
+        if entry.refcount == 1:
+            # Nothing else was open on it: a reused idle transport that has gone bad
+            self.stats['linger_failures'] += 1
+            logger.info(f"Idle SSH transport {entry.describe()} could not open a channel - closing it")
+            self._evict(entry)
+            self.release(entry, window_id, linger=False)
+            return
+        entry.multiplex_ok = False
+        self.stats['multiplex_refused'] += 1
+        logger.info(f"SSH transport {entry.describe()} does not allow extra channels")
+        self.release(entry, window_id)
+
+    def release(self, entry: PooledTransport, window_id: str, linger: bool = True):
+        """Drop window_id's reference; with no windows left the transport lingers or closes"""
+        entry.windows.discard(window_id)
+        entry.last_used = time.time()
+
+        if entry.refcount:
+            return
+        if (linger and self.linger_seconds and self.max_lingering > 0
+                and self._entries.get(entry.key) is entry and entry.is_alive()):
+            self._start_lingering(entry)
+            return
+
+        self._evict(entry)
+        entry.close()
+        self.stats['closed'] += 1
+        logger.info(f"Closed SSH transport {entry.describe()} (no windows left)")
+
+    def _start_lingering(self, entry: PooledTransport):
+        while len(self._lingering) >= self.max_lingering:
+            _, oldest = self._lingering.popitem(last=False)
+            self.stats['linger_lru_evictions'] += 1
+            self._close_lingering(oldest, 'lingering pool full')
+
+        # Notice a device that went away while nobody is using the transport
+        try:
+            entry.transport.set_keepalive(self.linger_keepalive)
+        except Exception:
+            pass
+        entry.linger_timer = asyncio.get_running_loop().call_later(self.linger_seconds, self._expire, entry)
+        self._lingering[id(entry)] = entry
+        logger.info(f"SSH transport {entry.describe()} lingering for {self.linger_seconds:.0f}s")
+
+    def _stop_lingering(self, entry: PooledTransport):
+        if entry.linger_timer is not None:
+            entry.linger_timer.cancel()
+            entry.linger_timer = None
+        self._lingering.pop(id(entry), None)
+        try:
+            entry.transport.set_keepalive(0)
+        except Exception:
+            pass
+
+    def _expire(self, entry: PooledTransport):
+        entry.linger_timer = None
+        self.stats['linger_expired'] += 1
+        self._close_lingering(entry, f'idle {self.linger_seconds:.0f}s')
+
+    def _close_lingering(self, entry: PooledTransport, reason: str = 'replaced'):
+        self._stop_lingering(entry)
+        self._evict(entry)
+        entry.close()
+        self.stats['closed'] += 1
+        logger.info(f"Closed lingering SSH transport {entry.describe()} ({reason})")
+
+    def close_lingering(self, owner: Optional[str] = None):
+        """Close idle transports (all, or just owner's - e.g. on logout)"""
+        for entry in list(self._lingering.values()):
+            if owner is None or entry.key[0] == owner:
+                self._close_lingering(entry, 'owner logged out' if owner else 'shutdown')
+
+    def _evict(self, entry: PooledTransport, dead: bool = False):
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        if dead:
+            self.stats['dead_evictions'] += 1
+            logger.info(f"Evicted dead SSH transport {entry.describe()} ({entry.refcount} windows)")
+
+    def get_stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'transports': len(self._entries),
+            'channels': sum(entry.refcount for entry in self._entries.values()),
+            'lingering': len(self._lingering),
+            'linger_seconds': self.linger_seconds,
+            'pending_handshakes': len(self._pending),
+            **self.stats,
+        }
@@ -252,7 +252,7 @@ class WorkspaceManager:
 
         # Copy direct fields
         direct_fields = ['display_name', 'host', 'platform', 'id', 'status', 'created_at', 'last_sync', 'netbox_id',
-                         'site']
+                         'site', 'ssh_profile']
         for field in direct_fields:
             if field in session_data:
                 normalized[field] = session_data[field]
@@ -352,6 +352,10 @@ class WorkspaceManager:
             if field in session_dict:
                 legacy[field] = session_dict[field]
 
+        # Only written when set, so legacy session files stay unchanged
+        if session_dict.get('ssh_profile'):
+            legacy['ssh_profile'] = session_dict['ssh_profile']
+
         # Convert port back to string to maintain compatibility
         if 'port' in session_dict:
             legacy['port'] = str(session_dict['port'])
@@ -14,7 +14,11 @@ import { useDebounce } from '../hooks/useDebounce';
 import {
   buildWebSocketUrl,
   safeJSONStringify,
-  debounce
+  debounce,
+  TERMINAL_PROTOCOL_V2,
+  TERMINAL_OPCODES,
+  encodeInputFrame,
+  encodeResizeFrame
 } from '../utils/windowHelpers';
 
 // Enhanced terminal themes with CSS-derived support
@@ -289,6 +293,9 @@ const getThemeConfig = (themeKey) => {
   return theme;
 };
 
+// Hold keystrokes while the websocket has this much unsent data
+const INPUT_BACKLOG_BYTES = 65536;
+
 // Terminal theme storage utilities
 const getTerminalTheme = (windowId) => {
   const stored = localStorage.getItem(`terminal-theme-${windowId}`);
@@ -363,6 +370,12 @@ const TerminalWindow = React.memo(({
     bytesSent: 0
   });
   const [contextMenu, setContextMenu] = useState(null);
+  const [pasteProgress, setPasteProgress] = useState(null);
+  const [playback, setPlayback] = useState(null);
+  const [fastForward, setFastForward] = useState(false);
+  const playbackId = sessionData?.playback_id;
+  const pendingInputRef = useRef('');
+  const inputFlushRef = useRef(null);
 
   // Handle context menu
   // Fixed handleContextMenu function with debugging
@@ -545,12 +558,16 @@ const handleContextMenuContainerRelative = useCallback((e) => {
     const rows = term.rows || 24;
 
     try {
-      ws.send(safeJSONStringify({
-        type: 'resize',
-        cols,
-        rows,
-        windowId
-      }));
+      if (ws.protocol === TERMINAL_PROTOCOL_V2) {
+        ws.send(encodeResizeFrame(cols, rows));
+      } else {
+        ws.send(safeJSONStringify({
+          type: 'resize',
+          cols,
+          rows,
+          windowId
+        }));
+      }
 
       setTerminalStats(prev => ({ ...prev, rows, cols }));
       console.log(`[Terminal ${windowId}] Resize sent: ${cols}x${rows}`);
@@ -627,17 +644,26 @@ const handleContextMenuContainerRelative = useCallback((e) => {
       return;
     }
 
-    const url = buildWebSocketUrl(windowId, 'terminal');
+    // Recorded sessions replay over their own endpoint; keys there control playback
+    const url = playbackId
+      ? buildWebSocketUrl(encodeURIComponent(playbackId), 'playback')
+      : buildWebSocketUrl(windowId, 'terminal');
     console.log('[Terminal] Opening WebSocket:', url);
 
     try {
-      const ws = new WebSocket(url);
+      // Offer the binary protocol; servers that don't know it fall back to JSON
+      const ws = new WebSocket(url, [TERMINAL_PROTOCOL_V2]);
+      ws.binaryType = 'arraybuffer';
       wsRef.current = ws;
 
       ws.onopen = () => {
         console.log('[Terminal] WebSocket connected');
         setConnectionStatus('connecting');
 
+        if (playbackId) {
+          return;
+        }
+
         // Get VelociTerm username for SSH key lookup
         const velociTermUser = localStorage.getItem('velociterm_user');
 
@@ -657,6 +683,8 @@ const handleContextMenuContainerRelative = useCallback((e) => {
           username: debouncedCredentials.username,
           password: debouncedCredentials.password || '',
           velociterm_user: velociTermUser || null,  // Required for SSH key lookup
+          device_type: sessionData.device_type || null,  // Picks the SSH algorithm profile
+          ssh_profile: sessionData.ssh_profile || null,
           windowId
         };
 
@@ -669,7 +697,9 @@ const handleContextMenuContainerRelative = useCallback((e) => {
       };
 
       ws.onmessage = (event) => {
-        if (typeof event.data === 'string') {
+        if (event.data instanceof ArrayBuffer) {
+          handleBinaryFrame(event.data);
+        } else if (typeof event.data === 'string') {
           try {
             const message = JSON.parse(event.data);
             handleWebSocketMessage(message);
@@ -688,6 +718,12 @@ const handleContextMenuContainerRelative = useCallback((e) => {
           onStatusChange('disconnected');
         }
 
+        // Another backend worker holds this window's SSH session (multi-worker server) - the
+        // error message has been shown, reconnecting would not reach that worker either
+        if (event.code === 4409) {
+          return;
+        }
+
         // Auto-reconnect on unexpected close
         if (event.code !== 1000 && event.code !== 1001) {
           setTimeout(() => {
@@ -712,7 +748,33 @@ const handleContextMenuContainerRelative = useCallback((e) => {
       console.error('[Terminal] Failed to create WebSocket:', error);
       setConnectionStatus('error');
     }
-  }, [windowId, sessionData, debouncedCredentials, fitTerminal, onStatusChange]);
+  }, [windowId, sessionData, playbackId, debouncedCredentials, fitTerminal, onStatusChange]);
+
+  // Binary (v2) output frames: raw bytes go straight to xterm, no base64/atob
+  const handleBinaryFrame = useCallback((buffer) => {
+    const frame = new Uint8Array(buffer);
+    if (frame.length === 0 || frame[0] !== TERMINAL_OPCODES.OUTPUT) {
+      console.warn('[Terminal] Unknown binary frame opcode:', frame[0]);
+      return;
+    }
+
+    const bytes = frame.subarray(1);
+    if (termRef.current) {
+      termRef.current.write(bytes);
+      setTerminalStats(prev => ({
+        ...prev,
+        bytesReceived: prev.bytesReceived + bytes.length
+      }));
+    }
+
+    if (!isConnected) {
+      setIsConnected(true);
+      setConnectionStatus('connected');
+      if (onStatusChange) {
+        onStatusChange('connected');
+      }
+    }
+  }, [isConnected, onStatusChange]);
 
   // OPTIMIZED: Enhanced message handler for better game performance
   const handleWebSocketMessage = useCallback((message) => {
@@ -771,6 +833,14 @@ const handleContextMenuContainerRelative = useCallback((e) => {
         }
         break;
 
+      case 'connect_queued':
+        // Backend admission control: connect waits for a free slot to this host/user
+        if (message.initial && termRef.current) {
+          termRef.current.writeln(`\r\n[Connection queued (${message.waiting_for} limit)]\r\n`);
+        }
+        setConnectionStatus(`queued #${message.position} ~${Math.ceil(message.eta_seconds)}s`);
+        break;
+
       case 'error':
         console.error('[Terminal] Server error:', message.message);
         if (termRef.current) {
@@ -779,6 +849,39 @@ const handleContextMenuContainerRelative = useCallback((e) => {
         setConnectionStatus('error');
         break;
 
+      case 'input_progress':
+        // Server-side progress of a large paste into the SSH channel
+        setPasteProgress(message.done ? null : { sent: message.sent, total: message.total });
+        break;
+
+      case 'fast_forward':
+        // Server sends screen frames instead of the raw stream during output floods
+        setFastForward(message.active);
+        break;
+
+      case 'playback_info':
+        if (termRef.current) {
+          termRef.current.writeln(`[Playback: ${message.title || message.recording_id} - space pause, +/- speed, ←/→ seek]`);
+        }
+        setIsConnected(true);
+        setConnectionStatus('connected');
+        break;
+
+      case 'playback_resize':
+        // Replay at the recorded size so full-screen apps render as they did
+        if (termRef.current) {
+          termRef.current.resize(message.cols, message.rows);
+        }
+        break;
+
+      case 'playback_status':
+        setPlayback(message);
+        break;
+
+      case 'playback_marker':
+        console.warn('[Terminal] Recording marker:', message.message);
+        break;
+
       case 'process_ended':
         console.log('[Terminal] Process ended');
         if (termRef.current) {
@@ -954,19 +1057,43 @@ const handleContextMenuContainerRelative = useCallback((e) => {
 
     fitTerminal();
 
-    // OPTIMIZED: Enhanced input handling for games
+    // Input events from the same task (fast typing, IME, key repeat) go out
+    // as one frame; while the socket is backed up, input keeps accumulating
+    const flushInput = () => {
+      inputFlushRef.current = null;
+      const ws = wsRef.current;
+      const data = pendingInputRef.current;
+      if (!data || !ws || ws.readyState !== WebSocket.OPEN) {
+        return;
+      }
+      if (ws.bufferedAmount > INPUT_BACKLOG_BYTES) {
+        inputFlushRef.current = setTimeout(flushInput, 10);
+        return;
+      }
+
+      pendingInputRef.current = '';
+      try {
+        if (ws.protocol === TERMINAL_PROTOCOL_V2) {
+          ws.send(encodeInputFrame(data));
+        } else {
+          ws.send(safeJSONStringify({ type: 'input', data }));
+        }
+        setTerminalStats(prev => ({
+          ...prev,
+          bytesSent: prev.bytesSent + data.length
+        }));
+      } catch (error) {
+        console.error('[Terminal] Failed to send input:', error);
+      }
+    };
+
     terminal.onData((data) => {
       const ws = wsRef.current;
       if (ws && ws.readyState === WebSocket.OPEN) {
-        try {
-          // Send input immediately without buffering
-          ws.send(safeJSONStringify({ type: 'input', data }));
-          setTerminalStats(prev => ({
-            ...prev,
-            bytesSent: prev.bytesSent + data.length
-          }));
-        } catch (error) {
-          console.error('[Terminal] Failed to send input:', error);
+        pendingInputRef.current += data;
+        if (!inputFlushRef.current) {
+          inputFlushRef.current = true;
+          queueMicrotask(flushInput);
         }
       }
     });
@@ -1125,6 +1252,17 @@ const handleContextMenuContainerRelative = useCallback((e) => {
               <span>{terminalStats.cols}×{terminalStats.rows}</span>
               <span>↓{(terminalStats.bytesReceived / 1024).toFixed(1)}KB</span>
               <span>↑{(terminalStats.bytesSent / 1024).toFixed(1)}KB</span>
+              {fastForward && (
+                <span title="Output flood - showing screen updates only; full output is in scrollback">⏩ fast-forward</span>
+              )}
+              {playback && (
+                <span>
+                  {playback.ended ? '■' : playback.paused ? '❚❚' : '▶'} {playback.time.toFixed(0)}/{playback.duration.toFixed(0)}s {playback.speed}x
+                </span>
+              )}
+              {pasteProgress && (
+                <span>paste {Math.floor(pasteProgress.sent * 100 / pasteProgress.total)}%</span>
+              )}
             </div>
           )}
         </div>
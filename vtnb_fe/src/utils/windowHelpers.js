@@ -82,3 +82,32 @@ export const safeJSONStringify = (obj) => {
     return '"<unserializable>"';
   }
 };
+
+// Binary terminal protocol (v2) - negotiated via WebSocket subprotocol.
+// Output/input bytes travel in binary frames with a one-byte opcode header;
+// JSON text frames remain for control messages.
+export const TERMINAL_PROTOCOL_V2 = 'velociterm.v2';
+
+export const TERMINAL_OPCODES = {
+  OUTPUT: 0x01,
+  INPUT: 0x01,
+  RESIZE: 0x02
+};
+
+const textEncoder = new TextEncoder();
+
+export const encodeInputFrame = (data) => {
+  const payload = textEncoder.encode(data);
+  const frame = new Uint8Array(payload.length + 1);
+  frame[0] = TERMINAL_OPCODES.INPUT;
+  frame.set(payload, 1);
+  return frame;
+};
+
+export const encodeResizeFrame = (cols, rows) => {
+  const frame = new DataView(new ArrayBuffer(5));
+  frame.setUint8(0, TERMINAL_OPCODES.RESIZE);
+  frame.setUint16(1, cols);
+  frame.setUint16(3, rows);
+  return frame.buffer;
+};